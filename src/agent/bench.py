@@ -0,0 +1,420 @@
+"""Offline load test: drive N concurrent simulated calls through ShopAgent and its tools.
+
+Run with ``python -m agent.bench --calls 200 --concurrency 50``. STT, LLM and TTS
+are replaced by deterministic local stand-ins with configurable latency, and a
+scripted customer walks the full shopping flow (name, category, product, email,
+OTP, order). Exits non-zero when --max-p95-ms or --min-throughput is violated.
+
+Provider requests go through the same deadlines, circuit breakers and hedging
+as a live call. --stt-faults, --llm-faults and --tts-faults inject errors,
+stalls or an outage into the primary stand-ins (e.g. ``--tts-faults down``),
+and --no-secondary removes the hedge targets so TTS falls back to cached audio.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import re
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass, field
+from email.mime.text import MIMEText
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from livekit.agents.llm.tool_context import get_raw_function_info
+
+from . import mailer
+from .catalog import get_catalog
+from .config import get_settings
+from .constants import get_script_variables
+from .core import ShopAgent
+from .orders import OrderLedger
+from .phrase_cache import PhraseAudioCache, static_script_lines
+from .providers.fake import FakeLLM, FakeSTT, FakeTTS, FaultProfile, LatencyProfile
+from .providers.resilience import ProviderUnavailable, get_route
+from .session import SessionRegistry
+
+
+class CaptureTransport:
+    """Email transport that keeps messages in memory so the customer can read the OTP."""
+
+    def __init__(self):
+        self.inbox: Dict[str, List[str]] = {}
+
+    def send_batch(self, messages: List[MIMEText]) -> List[Optional[Exception]]:
+        for msg in messages:
+            self.inbox.setdefault(msg["To"], []).append(msg.get_payload())
+        return [None] * len(messages)
+
+    def warm(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    async def wait_for_otp(self, email: str, timeout: float = 5.0) -> str:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for body in reversed(self.inbox.get(email, [])):
+                match = re.search(r"verification code is: (\d+)", body)
+                if match:
+                    return match.group(1)
+            await asyncio.sleep(0.005)
+        raise TimeoutError(f"No OTP email delivered to {email}")
+
+
+class SimulatedSession:
+    """Minimal stand-in for the AgentSession seen by tools through RunContext.session."""
+
+    def __init__(self):
+        self.spoken: List[str] = []
+
+    def say(self, text: str, **kwargs: Any):
+        self.spoken.append(text)
+
+
+@dataclass
+class ScriptedCustomer:
+    name: str
+    category: str
+    product: str
+    email: str
+
+
+@dataclass
+class BenchReport:
+    calls: int
+    concurrency: int
+    completed_calls: int
+    failed_calls: int
+    turns: int
+    wall_seconds: float
+    calls_per_second: float
+    turns_per_second: float
+    turn_p50_ms: float
+    turn_p95_ms: float
+    turn_p99_ms: float
+    cpu_ms_per_call: float
+    rss_kb_per_call: float
+    peak_rss_kb: int
+    peak_active_calls: int
+    prefetch_hit_rate: float
+    fast_path_ratio: float
+    hedged_requests: int = 0
+    provider_failovers: int = 0
+    provider_timeouts: int = 0
+    breaker_trips: int = 0
+    cached_audio_fallbacks: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _rss_kb() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class SimulatedCall:
+    """Plays both sides of one call: the scripted customer and an LLM-like tool planner."""
+
+    def __init__(self, agent: ShopAgent, call_id: str, customer: ScriptedCustomer, providers: SimpleNamespace, transport: CaptureTransport, sample_rate: int):
+        self.agent = agent
+        self.customer = customer
+        self.providers = providers
+        self.transport = transport
+        self.sample_rate = sample_rate
+        self.call = agent.sessions.open(call_id, f"bench-room-{call_id}")
+        self.tools = {get_raw_function_info(tool).name: tool for tool in agent.build_tools(self.call)}
+        self.session = SimulatedSession()
+        self.context = SimpleNamespace(session=self.session)
+        self.turn_latencies: List[float] = []
+        self.cached_audio_fallbacks = 0
+
+    async def _transcribe(self, utterance: str) -> str:
+        p, audio = self.providers, utterance.encode("utf-8")
+        secondary = p.stt_secondary
+        return await get_route("stt").call(
+            lambda: p.stt.transcribe(audio, self.sample_rate),
+            (lambda: secondary.transcribe(audio, self.sample_rate)) if secondary else None,
+        )
+
+    async def _generate(self, text: str) -> str:
+        p = self.providers
+        secondary = p.llm_secondary
+        return await get_route("llm").call(
+            lambda: p.llm.generate(text),
+            (lambda: secondary.generate(text)) if secondary else None,
+        )
+
+    async def _speak(self, text: str):
+        p = self.providers
+        secondary = p.tts_secondary
+        try:
+            await get_route("tts").call(
+                lambda: p.tts.synthesize(text, self.sample_rate),
+                (lambda: secondary.synthesize(text, self.sample_rate)) if secondary else None,
+            )
+        except ProviderUnavailable:
+            # What a live call does with TTS down: the script line, or the apology, from cached audio
+            if p.phrases.get(text) is None and p.phrases.get(get_script_variables().provider_apology) is None:
+                raise
+            self.cached_audio_fallbacks += 1
+
+    async def _turn(self, utterance: str, plan: List[tuple[str, Dict[str, Any]]], reply: str) -> List[str]:
+        """One customer turn: STT, an LLM round, the planned tools, a follow-up LLM round, TTS."""
+        started = time.perf_counter()
+        text = await self._transcribe(utterance)
+        self.call.prefetcher.observe_transcript(text)
+        await self._generate(text)
+        outputs = []
+        for name, arguments in plan:
+            outputs.append(await self.tools[name](arguments, self.context))
+        # Fast-path tools speak their line themselves and return nothing, which skips the LLM reply
+        if plan and any(output is not None for output in outputs):
+            await self._generate(text)
+        await self._speak(reply)
+        self.turn_latencies.append((time.perf_counter() - started) * 1000)
+        return outputs
+
+    async def run(self):
+        script = get_script_variables()
+        c = self.customer
+        try:
+            await self._speak(script.intro_greeting)
+            await self._turn(
+                f"Hi, I'm {c.name}",
+                [("collect_data", {"customer_name": c.name, "script_stage": "needs_assessment"})],
+                script.needs_assessment.format(customer_name=c.name),
+            )
+            outputs = await self._turn(
+                f"I'm looking for a {c.category}",
+                [("get_product_options", {"category": c.category})],
+                script.product_selection_prompt,
+            )
+            if c.product not in (outputs[0] or ""):
+                raise AssertionError(f"{c.product} missing from product options")
+            # Customers name the product loosely ("the stealth bomber one"); find_product pins it down
+            spoken = " ".join(w for w in c.product.split()[1:] if w.lower() != c.category.lower())
+            outputs = await self._turn(
+                f"I'll take the {spoken} one",
+                [
+                    ("find_product", {"query": spoken, "category": c.category}),
+                    ("collect_data", {"product_selection": c.product, "script_stage": "email_collection"}),
+                ],
+                script.email_request.format(product_name=c.product),
+            )
+            if not str(outputs[0]).startswith(f"Match: {c.product}"):
+                raise AssertionError(f"find_product did not resolve {spoken!r}: {outputs[0]}")
+            outputs = await self._turn(
+                f"My email is {c.email}",
+                [("collect_data", {"email": c.email}), ("send_otp", {"email": c.email})],
+                script.otp_request,
+            )
+            otp_code = await self.transport.wait_for_otp(c.email)
+            outputs = await self._turn(
+                otp_code,
+                [
+                    ("verify_otp", {"email": c.email, "otp_code": otp_code}),
+                    ("generate_order", {"customer_name": c.name, "product": c.product, "email": c.email}),
+                ],
+                script.order_confirmation.format(email=c.email),
+            )
+            if outputs[0] != "OTP verified successfully" or not (outputs[1] is None or str(outputs[1]).startswith("Order generated")):
+                raise AssertionError(f"Order flow failed: {outputs}")
+            if not self.call.session_manager.is_summary_provided():
+                await self.tools["collect_data"]({"summary": f"{c.name} ordered {c.product}"}, self.context)
+        finally:
+            await self.agent.sessions.close(self.call.call_id)
+
+
+def build_customers(count: int) -> List[ScriptedCustomer]:
+    products = get_catalog().products()
+    return [
+        ScriptedCustomer(
+            name=f"Customer {i}",
+            category=products[i % len(products)].category,
+            product=products[i % len(products)].name,
+            email=f"customer{i}@bench.local",
+        )
+        for i in range(count)
+    ]
+
+
+async def run_bench(args: argparse.Namespace) -> BenchReport:
+    settings = get_settings()
+    settings.smtp_auth = False
+    settings.dialog_fast_path = not args.no_fast_path
+    # Per-call info logs would dominate the measurement
+    logging.getLogger("shop_agent").setLevel(logging.WARNING)
+    transport = CaptureTransport()
+    mailer.set_transport(transport)
+
+    workdir = tempfile.mkdtemp(prefix="shop-bench-")
+    ledger = OrderLedger(os.path.join(workdir, "orders.db"))
+    agent = ShopAgent()
+    agent.sessions = SessionRegistry(ledger)
+
+    stt_latency = LatencyProfile(args.stt_ms, args.stt_ms * args.jitter)
+    llm_latency = LatencyProfile(args.llm_ms, args.llm_ms * args.jitter, per_unit_ms=args.llm_token_ms)
+    tts_latency = LatencyProfile(args.tts_ms, args.tts_ms * args.jitter)
+    # Faults go to the primaries only; the secondaries are the healthy hedge targets
+    secondaries = not args.no_secondary
+    providers = SimpleNamespace(
+        stt=FakeSTT(stt_latency, seed=args.seed, faults=args.stt_faults),
+        llm=FakeLLM(llm_latency, seed=args.seed + 1, faults=args.llm_faults),
+        tts=FakeTTS(tts_latency, seed=args.seed + 2, faults=args.tts_faults),
+        stt_secondary=FakeSTT(stt_latency, seed=args.seed + 3) if secondaries else None,
+        llm_secondary=FakeLLM(llm_latency, seed=args.seed + 4) if secondaries else None,
+        tts_secondary=FakeTTS(tts_latency, seed=args.seed + 5) if secondaries else None,
+        phrases=PhraseAudioCache(os.path.join(workdir, "phrases"), "bench", "fake", settings.sample_rate_hz),
+    )
+    for line in static_script_lines(get_script_variables()):
+        providers.phrases.put(line, await FakeTTS().synthesize(line, settings.sample_rate_hz))
+    customers = build_customers(args.calls)
+    slots = asyncio.Semaphore(args.concurrency)
+    simulated: List[SimulatedCall] = []
+    errors: List[str] = []
+    active = peak_active = 0
+
+    async def run_one(i: int, customer: ScriptedCustomer) -> bool:
+        nonlocal active, peak_active
+        async with slots:
+            sim = SimulatedCall(agent, f"call-{i}", customer, providers, transport, settings.sample_rate_hz)
+            simulated.append(sim)
+            active += 1
+            peak_active = max(peak_active, active)
+            try:
+                await sim.run()
+                return True
+            except Exception as e:
+                errors.append(f"call-{i}: {e!r}")
+                return False
+            finally:
+                active -= 1
+
+    rss_before = peak_rss = _rss_kb()
+
+    async def sample_rss():
+        # Calls hold their memory only while open, so per-call RSS is measured at the peak, not after the run
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, _rss_kb())
+            await asyncio.sleep(0.02)
+
+    sampler = asyncio.create_task(sample_rss())
+    cpu_before = time.process_time()
+    started = time.perf_counter()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = await asyncio.gather(*[run_one(i, c) for i, c in enumerate(customers)])
+        await mailer.get_mailer().close()
+    wall = time.perf_counter() - started
+    cpu = time.process_time() - cpu_before
+    sampler.cancel()
+    peak_rss = max(peak_rss, _rss_kb())
+    ledger.close()
+
+    latencies = [latency for sim in simulated for latency in sim.turn_latencies]
+    completed = sum(results)
+    routes = [get_route(name) for name in ("stt", "llm", "tts")]
+    return BenchReport(
+        calls=args.calls,
+        concurrency=args.concurrency,
+        completed_calls=completed,
+        failed_calls=args.calls - completed,
+        turns=len(latencies),
+        wall_seconds=round(wall, 3),
+        calls_per_second=round(completed / wall, 2) if wall else 0.0,
+        turns_per_second=round(len(latencies) / wall, 2) if wall else 0.0,
+        turn_p50_ms=round(statistics.median(latencies), 2) if latencies else 0.0,
+        turn_p95_ms=round(_percentile(latencies, 95), 2),
+        turn_p99_ms=round(_percentile(latencies, 99), 2),
+        cpu_ms_per_call=round(cpu * 1000 / max(1, args.calls), 3),
+        rss_kb_per_call=round(max(0, peak_rss - rss_before) / max(1, peak_active), 1),
+        peak_rss_kb=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        peak_active_calls=peak_active,
+        prefetch_hit_rate=round(agent.sessions.prefetch_stats.hit_rate, 3),
+        fast_path_ratio=round(agent.sessions.dialog_stats.fast_ratio, 3),
+        hedged_requests=sum(r.stats.hedged for r in routes),
+        provider_failovers=sum(r.stats.failovers for r in routes),
+        provider_timeouts=sum(r.stats.timeouts for r in routes),
+        breaker_trips=sum(b.trips for r in routes for b in r.breakers),
+        cached_audio_fallbacks=sum(sim.cached_audio_fallbacks for sim in simulated),
+        errors=errors[:20],
+    )
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline capacity benchmark for the shop agent.")
+    parser.add_argument("--calls", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--stt-ms", type=float, default=150.0, help="Simulated STT finalization latency")
+    parser.add_argument("--llm-ms", type=float, default=350.0, help="Simulated LLM time to first token")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0, help="Simulated LLM per-token latency")
+    parser.add_argument("--tts-ms", type=float, default=120.0, help="Simulated TTS time to first audio")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Jitter as a fraction of each base latency")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-fast-path", action="store_true", help="Send every tool result back to the LLM")
+    for kind in ("stt", "llm", "tts"):
+        parser.add_argument(
+            f"--{kind}-faults", type=FaultProfile.parse, default=None,
+            help=f'Faults for the primary {kind.upper()}, e.g. "error=0.2,stall=0.05" or "down"',
+        )
+    parser.add_argument("--no-secondary", action="store_true", help="Run without hedge/failover providers")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this path")
+    parser.add_argument("--max-p95-ms", type=float, help="Fail if p95 turn latency exceeds this")
+    parser.add_argument("--min-throughput", type=float, help="Fail if completed calls/second falls below this")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run_bench(args))
+
+    print("=" * 60)
+    print(f"Calls: {report.completed_calls}/{report.calls} completed at concurrency {report.concurrency}")
+    print(f"Throughput: {report.calls_per_second} calls/s, {report.turns_per_second} turns/s")
+    print(f"Turn latency: p50 {report.turn_p50_ms} ms, p95 {report.turn_p95_ms} ms, p99 {report.turn_p99_ms} ms")
+    print(f"CPU: {report.cpu_ms_per_call} ms/call, RSS: {report.rss_kb_per_call} KB/call "
+          f"at {report.peak_active_calls} concurrent calls (peak {report.peak_rss_kb} KB)")
+    print(f"Prefetch hit rate: {report.prefetch_hit_rate:.0%}, fast-path turns: {report.fast_path_ratio:.0%}")
+    print(f"Providers: {report.hedged_requests} hedged, {report.provider_failovers} failovers, "
+          f"{report.provider_timeouts} timeouts, {report.breaker_trips} breaker trips, "
+          f"{report.cached_audio_fallbacks} cached-audio fallbacks")
+    for error in report.errors:
+        print(f"ERROR {error}")
+    print("=" * 60)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2)
+
+    failed = report.failed_calls > 0
+    if args.max_p95_ms is not None and report.turn_p95_ms > args.max_p95_ms:
+        print(f"FAIL: p95 {report.turn_p95_ms} ms exceeds {args.max_p95_ms} ms")
+        failed = True
+    if args.min_throughput is not None and report.calls_per_second < args.min_throughput:
+        print(f"FAIL: throughput {report.calls_per_second} calls/s below {args.min_throughput}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""Worker capacity: measured per-call cost, load reporting and admission control.
+
+LiveKit runs every job in its own process. On Linux those are started
+through a forkserver, so they are not children of the worker; their PIDs
+come from the worker's job process pool (refreshed by load_fnc) and are
+sampled from /proc to learn what a call really costs. Idle, prewarmed
+processes (models loaded, no call) give the shared footprint, and whatever
+the busy ones use beyond it is the per-call cost. From that and the machine's
+cores and memory the monitor derives how many calls this worker can hold,
+reports a 0-1 load to the dispatcher and turns jobs away at the configured
+ceiling.
+"""
+from __future__ import annotations
+
+import logging
+import math
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+from livekit.agents.worker import _WorkerEnvOption
+
+from .config import Settings, get_settings
+
+logger = logging.getLogger("shop_agent")
+
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def cpu_count() -> int:
+    """Cores this process may run on (respects CPU affinity and cgroup pinning)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        return os.cpu_count() or 1
+
+
+def _read_proc_stat(pid: int) -> Optional[Tuple[float, int]]:
+    """(cpu seconds, rss bytes) for a process, or None if it is gone."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except (OSError, IndexError):
+        return None
+    # fields[0] is the state (field 3); see proc(5) for the offsets
+    cpu = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    rss = int(fields[21]) * _PAGE_SIZE
+    return cpu, rss
+
+
+def process_usage(pids) -> Dict[int, Tuple[float, int]]:
+    """CPU seconds and RSS bytes of each of pids that is still running."""
+    usage = {}
+    for pid in pids:
+        stat = _read_proc_stat(pid)
+        if stat is not None:
+            usage[pid] = stat
+    return usage
+
+
+def job_processes(worker) -> Dict[int, bool]:
+    """PIDs of the worker's job processes, each mapped to whether it is running a call.
+
+    Thread executors have no PID of their own and are left out.
+    """
+    jobs = {}
+    for proc in getattr(getattr(worker, "_proc_pool", None), "processes", ()):
+        pid = getattr(proc, "pid", None)
+        if pid:
+            jobs[pid] = proc.running_job is not None
+    return jobs
+
+
+def memory_available_bytes() -> Optional[int]:
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def system_cpu_times() -> Optional[Tuple[float, float]]:
+    """(busy, total) jiffies across all cores from /proc/stat."""
+    try:
+        with open("/proc/stat") as f:
+            values = [float(v) for v in f.readline().split()[1:]]
+    except (OSError, ValueError):
+        return None
+    idle = values[3] + (values[4] if len(values) > 4 else 0.0)
+    total = sum(values)
+    return total - idle, total
+
+
+@dataclass
+class CapacityReport:
+    cores: int
+    max_calls: int
+    active_calls: int
+    job_processes: int
+    cpu_utilization: float
+    cpu_cores_per_call: float
+    shared_rss_mb: float
+    rss_mb_per_call: float
+    memory_budget_mb: float
+    estimated_capacity: int
+    load: float
+
+
+class CapacityMonitor:
+    """Samples job processes in the background and turns the numbers into load and admission."""
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = s = settings or get_settings()
+        self.cores = cpu_count()
+        self.max_calls = s.worker_max_calls or max(1, int(self.cores * s.worker_calls_per_core))
+        available = memory_available_bytes()
+        self.memory_budget = (
+            s.worker_memory_budget_mb * 1024 * 1024 if s.worker_memory_budget_mb
+            else int(available * 0.8) if available
+            else None
+        )
+        self._lock = threading.Lock()
+        self._active_calls = 0
+        self._jobs: Dict[int, bool] = {}
+        self._usage: Dict[int, Tuple[float, int]] = {}
+        self._last_sample = 0.0
+        self._last_system: Optional[Tuple[float, float]] = None
+        self.cpu_utilization = 0.0
+        self.cpu_per_call = 0.0
+        self.shared_rss = 0
+        self.rss_per_call = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def idle_processes(self) -> int:
+        """Warm job processes to keep ready, scaled to the machine."""
+        configured = self.settings.worker_idle_processes
+        if configured is not None:
+            return configured
+        return max(1, min(self.max_calls, self.cores // 2))
+
+    def start(self):
+        if self._thread is None:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, name="capacity-monitor", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        interval = self.settings.worker_sample_seconds
+        next_report = time.monotonic() + self.settings.worker_report_seconds
+        while not self._stop.wait(interval):
+            try:
+                self.sample()
+            except Exception as e:
+                logger.warning(f"Capacity sample failed: {e}")
+            if time.monotonic() >= next_report:
+                next_report = time.monotonic() + self.settings.worker_report_seconds
+                logger.info("Worker capacity", extra={"event": "capacity", **asdict(self.report())})
+
+    def sample(self):
+        """Refresh CPU and memory figures from /proc."""
+        now = time.monotonic()
+        with self._lock:
+            jobs = dict(self._jobs)
+        usage = process_usage(jobs)
+        system = system_cpu_times()
+        with self._lock:
+            elapsed = now - self._last_sample if self._last_sample else 0.0
+
+            if system and self._last_system:
+                busy = system[0] - self._last_system[0]
+                total = system[1] - self._last_system[1]
+                if total > 0:
+                    self.cpu_utilization = max(0.0, min(1.0, busy / total))
+            elif not system and hasattr(os, "getloadavg"):
+                self.cpu_utilization = min(1.0, os.getloadavg()[0] / self.cores)
+
+            idle = sorted(rss for pid, (_, rss) in usage.items() if not jobs[pid])
+            calls = [pid for pid in usage if jobs[pid]]
+            if idle:
+                # A warm process with no call in it: models loaded, nothing else
+                self.shared_rss = idle[len(idle) // 2]
+            if calls:
+                extra = sum(max(0, usage[pid][1] - self.shared_rss) for pid in calls)
+                self.rss_per_call = self._smooth(self.rss_per_call, extra / len(calls))
+
+            if elapsed > 0 and calls:
+                cpu_delta = sum(usage[pid][0] - self._usage[pid][0] for pid in calls if pid in self._usage)
+                self.cpu_per_call = self._smooth(self.cpu_per_call, max(0.0, cpu_delta / elapsed / len(calls)))
+
+            self._usage = usage
+            self._last_system = system
+            self._last_sample = now
+
+    @staticmethod
+    def _smooth(previous: float, current: float, alpha: float = 0.3) -> float:
+        return current if not previous else previous + alpha * (current - previous)
+
+    def estimated_capacity(self) -> int:
+        """Calls this worker can hold given measured per-call CPU and memory."""
+        limits = [self.max_calls]
+        target = self.settings.worker_load_threshold
+        if self.cpu_per_call > 0:
+            limits.append(int(self.cores * target / self.cpu_per_call))
+        if self.memory_budget and self.rss_per_call > 0:
+            usable = self.memory_budget - self.shared_rss * self.idle_processes
+            limits.append(int(usable / (self.rss_per_call + self.shared_rss)))
+        return max(1, min(limits))
+
+    def load(self, active_calls: Optional[int] = None) -> float:
+        """0-1 load for the dispatcher: the most constrained of calls, CPU and memory."""
+        active = self._active_calls if active_calls is None else active_calls
+        return round(min(1.0, max(active / self.estimated_capacity(), self.cpu_utilization)), 3)
+
+    def accepting(self, active_calls: Optional[int] = None) -> bool:
+        active = self._active_calls if active_calls is None else active_calls
+        return active < self.estimated_capacity()
+
+    def set_active_calls(self, count: int):
+        with self._lock:
+            self._active_calls = count
+
+    def set_job_processes(self, jobs: Dict[int, bool]):
+        """Job process PIDs to sample, and which of them are running a call."""
+        with self._lock:
+            self._jobs = jobs
+
+    def try_reserve(self) -> bool:
+        """Count a job as active if there is room; load_fnc later replaces the count with the real one."""
+        with self._lock:
+            if self._active_calls >= self.estimated_capacity():
+                return False
+            self._active_calls += 1
+            return True
+
+    def report(self) -> CapacityReport:
+        with self._lock:
+            return CapacityReport(
+                cores=self.cores,
+                max_calls=self.max_calls,
+                active_calls=self._active_calls,
+                job_processes=len(self._usage),
+                cpu_utilization=round(self.cpu_utilization, 3),
+                cpu_cores_per_call=round(self.cpu_per_call, 3),
+                shared_rss_mb=round(self.shared_rss / 2**20, 1),
+                rss_mb_per_call=round(self.rss_per_call / 2**20, 1),
+                memory_budget_mb=round(self.memory_budget / 2**20, 1) if self.memory_budget else 0.0,
+                estimated_capacity=self.estimated_capacity(),
+                load=self.load(),
+            )
+
+
+def active_job_count(worker) -> int:
+    return len(getattr(worker, "active_jobs", ()) or ())
+
+
+def make_load_fnc(monitor: CapacityMonitor):
+    """WorkerOptions.load_fnc: LiveKit stops dispatching once this exceeds load_threshold."""
+
+    def load_fnc(worker) -> float:
+        monitor.set_job_processes(job_processes(worker))
+        monitor.set_active_calls(active_job_count(worker))
+        return monitor.load()
+
+    return load_fnc
+
+
+def make_request_fnc(monitor: CapacityMonitor):
+    """WorkerOptions.request_fnc: reject jobs once this worker is at capacity."""
+
+    async def request_fnc(request) -> None:
+        if monitor.try_reserve():
+            await request.accept()
+            return
+        report = monitor.report()
+        logger.warning(
+            f"At capacity ({report.active_calls}/{report.estimated_capacity} calls) - rejecting job {request.job.id}",
+            extra={"event": "job_rejected"},
+        )
+        await request.reject()
+
+    return request_fnc
+
+
+def worker_options_kwargs(monitor: CapacityMonitor) -> Dict[str, object]:
+    """Capacity-related WorkerOptions arguments.
+
+    The load threshold and idle processes apply in production only; dev mode
+    keeps LiveKit's defaults (no threshold, no warm processes).
+    """
+    s = monitor.settings
+    kwargs: Dict[str, object] = {
+        "load_fnc": make_load_fnc(monitor),
+        "load_threshold": _WorkerEnvOption(dev_default=math.inf, prod_default=s.worker_load_threshold),
+        "request_fnc": make_request_fnc(monitor),
+        "num_idle_processes": _WorkerEnvOption(dev_default=0, prod_default=monitor.idle_processes),
+        "job_memory_warn_mb": s.job_memory_warn_mb,
+    }
+    if s.job_memory_limit_mb:
+        kwargs["job_memory_limit_mb"] = s.job_memory_limit_mb
+    return kwargs
+
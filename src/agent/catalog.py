@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Dict, List, Optional
+
+from .config import get_settings
+
+logger = logging.getLogger("shop_agent")
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@dataclass(slots=True)
+class Product:
+    sku: str
+    name: str
+    description: str
+    category: str
+    price: Optional[int] = None
+
+    def price_label(self) -> str:
+        return f"PKR {self.price:,}" if self.price else "Price on request"
+
+
+@dataclass(slots=True)
+class CatalogSnapshot:
+    """Immutable view of one inventory.json revision with its indexes."""
+    version: str
+    mtime_ns: int
+    inventory: Dict[str, Any]
+    products: List[Product]
+    by_category: Dict[str, List[Product]] = field(default_factory=dict)
+    by_name: Dict[str, Product] = field(default_factory=dict)
+    by_sku: Dict[str, Product] = field(default_factory=dict)
+    category_names: Dict[str, str] = field(default_factory=dict)
+    rendered_options: Dict[str, str] = field(default_factory=dict)
+    compact_options: Dict[str, str] = field(default_factory=dict)
+
+
+def render_product_options(products: List[Product]) -> str:
+    """Render the get_product_options tool response for a list of products."""
+    product_list = []
+    for i, product in enumerate(products, 1):
+        product_list.append(f"Option {i}: {product.name} - {product.description} - {product.price_label()}")
+
+    return f"Based on our latest collection, I have {len(products)} top recommendations for you:\n\n" + "\n\n".join(product_list) + "\n\nAll prices are in PKR (Pakistani Rupees)."
+
+
+def render_compact_product_options(products: List[Product], description_words: int = 12) -> str:
+    """Token-lean variant of the get_product_options response: one short line per product."""
+    lines = []
+    for i, product in enumerate(products, 1):
+        words = product.description.split()
+        description = " ".join(words[:description_words]) + ("..." if len(words) > description_words else "")
+        lines.append(f"{i}. {product.name} | {product.price_label()} | {description}")
+    return "\n".join(lines)
+
+
+def _sku_for(category: str, index: int) -> str:
+    """Derive a stable SKU for inventory entries that do not declare one."""
+    slug = "".join(ch for ch in category.upper() if ch.isalnum())
+    return f"{slug}-{index:03d}"
+
+
+def build_snapshot(raw: bytes, mtime_ns: int = 0, description_words: int = 12) -> CatalogSnapshot:
+    """Parse inventory bytes and build all lookup indexes."""
+    inventory = json.loads(raw)
+    snapshot = CatalogSnapshot(
+        version=hashlib.sha256(raw).hexdigest()[:16],
+        mtime_ns=mtime_ns,
+        inventory=inventory,
+        products=[],
+    )
+
+    for category, items in inventory.get("products", {}).items():
+        products = []
+        for i, item in enumerate(items, 1):
+            product = Product(
+                sku=str(item.get("sku") or _sku_for(category, i)),
+                name=item["name"],
+                description=item.get("description", ""),
+                category=item.get("category", category),
+                price=item.get("price"),
+            )
+            products.append(product)
+            snapshot.by_name[product.name.lower()] = product
+            snapshot.by_sku[product.sku.upper()] = product
+
+        snapshot.products.extend(products)
+        snapshot.by_category[category] = products
+        snapshot.category_names[category.lower()] = category
+        if products:
+            snapshot.rendered_options[category] = render_product_options(products)
+            snapshot.compact_options[category] = render_compact_product_options(products, description_words)
+
+    return snapshot
+
+
+class Catalog:
+    """In-memory product catalog that reloads when inventory.json changes on disk."""
+
+    def __init__(self, path: str, check_interval: float = 1.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False) -> CatalogSnapshot:
+        """Return the current snapshot, reloading it if the file's mtime changed."""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and not force and now - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            self._last_check = now
+            mtime_ns = os.stat(self.path).st_mtime_ns
+            if self._snapshot is None or force or mtime_ns != self._snapshot.mtime_ns:
+                with open(self.path, "rb") as f:
+                    raw = f.read()
+                self._snapshot = build_snapshot(raw, mtime_ns, get_settings().tool_result_description_words)
+                logger.info(f"Catalog loaded: {len(self._snapshot.products)} products (version {self._snapshot.version})")
+            return self._snapshot
+
+    @property
+    def version(self) -> str:
+        return self.refresh().version
+
+    @property
+    def inventory(self) -> Dict[str, Any]:
+        """The raw inventory document, as served to the web frontend."""
+        return self.refresh().inventory
+
+    def products(self) -> List[Product]:
+        return self.refresh().products
+
+    def categories(self) -> List[str]:
+        return list(self.refresh().by_category)
+
+    def canonical_category(self, category: str) -> Optional[str]:
+        return self.refresh().category_names.get(category.strip().lower())
+
+    def by_category(self, category: str) -> List[Product]:
+        snapshot = self.refresh()
+        name = snapshot.category_names.get(category.strip().lower())
+        return snapshot.by_category.get(name, []) if name else []
+
+    def by_name(self, name: str) -> Optional[Product]:
+        return self.refresh().by_name.get(name.strip().lower())
+
+    def by_sku(self, sku: str) -> Optional[Product]:
+        return self.refresh().by_sku.get(sku.strip().upper())
+
+    def product_options(self, category: str, style: Optional[str] = None) -> Optional[str]:
+        """Pre-rendered get_product_options response for a category, "full" or "compact"."""
+        snapshot = self.refresh()
+        name = snapshot.category_names.get(category.strip().lower())
+        if not name:
+            return None
+        style = style or get_settings().tool_result_style
+        rendered = snapshot.compact_options if style == "compact" else snapshot.rendered_options
+        return rendered.get(name)
+
+
+def resolve_inventory_path() -> str:
+    """Locate inventory.json: configured path, project root, then working directory."""
+    configured = get_settings().inventory_path
+    if configured:
+        return configured
+    inventory_path = os.path.join(PROJECT_ROOT, "inventory.json")
+    if not os.path.exists(inventory_path):
+        inventory_path = os.path.join(os.getcwd(), "inventory.json")
+    return inventory_path
+
+
+@lru_cache(maxsize=1)
+def get_catalog() -> Catalog:
+    """Process-wide catalog shared by the agent tools and the web app."""
+    return Catalog(resolve_inventory_path())
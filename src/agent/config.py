@@ -1,11 +1,11 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
-from .constants import get_script_variables
+from .constants import ScriptVariables, get_script_variables, get_script_version
 
 
 class Settings(BaseSettings):
@@ -16,16 +16,163 @@ class Settings(BaseSettings):
 
     deepgram_api_key: Optional[str] = None
     deepgram_model: str = "nova-3"
+    deepgram_base_url: str = "https://api.deepgram.com/v1/listen"
 
     openai_api_key: Optional[str] = None
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: str = "https://api.openai.com/v1"
 
     cartesia_api_key: Optional[str] = None
     cartesia_voice_id: Optional[str] = "248be419-c632-4f23-adf1-5324ed7dbf1d"
     cartesia_model: str = "sonic-2"
     cartesia_format: str = "wav"
+    cartesia_base_url: str = "https://api.cartesia.ai"
     sample_rate_hz: int = 24000
 
+    # Process-wide provider clients with warm, kept-alive connections
+    provider_pool_enabled: bool = True
+    provider_keepalive_seconds: float = 30.0
+    provider_http_pool_size: int = 32
+
+    # Deadlines, circuit breakers and hedging (providers/resilience.py).
+    # Without a fallback model/voice that differs from the primary, that route does not hedge.
+    deepgram_fallback_model: Optional[str] = None
+    openai_fallback_model: Optional[str] = None
+    cartesia_fallback_voice_id: Optional[str] = None
+    cartesia_fallback_model: Optional[str] = None
+    stt_timeout_seconds: float = 5.0
+    stt_p95_budget_ms: float = 1000.0
+    llm_first_token_timeout: float = 6.0
+    llm_p95_budget_ms: float = 1500.0
+    tts_first_audio_timeout: float = 4.0
+    tts_p95_budget_ms: float = 800.0
+    provider_idle_timeout: float = 10.0
+    breaker_window: int = 50
+    breaker_min_requests: int = 10
+    breaker_error_rate: float = 0.5
+    breaker_latency_factor: float = 2.0
+    breaker_cooldown_seconds: float = 20.0
+
+    # Stage-aware LLM routing (routing.py). Tiers are listed fastest and cheapest
+    # first; prices are USD per million tokens; a tier without a model uses
+    # openai_model. A tier whose p95 time to first token exceeds
+    # llm_degrade_ttft_ms hands its stages to the next faster tier for a while.
+    llm_routing_enabled: bool = True
+    llm_tiers: Dict[str, Dict[str, Any]] = {
+        "fast": {"model": "gpt-4.1-nano", "temperature": 0.2, "max_tokens": 150, "input_cost": 0.10, "output_cost": 0.40},
+        "standard": {"model": "", "temperature": 0.3, "max_tokens": 300, "input_cost": 0.15, "output_cost": 0.60},
+        "smart": {"model": "gpt-4.1-mini", "temperature": 0.3, "max_tokens": 400, "input_cost": 0.40, "output_cost": 1.60},
+    }
+    # Keyed by the stage stored when the LLM is called, i.e. what the customer is doing now.
+    # Spelled-out emails and OTP codes stay off the smallest model: a misread one costs the order.
+    llm_stage_tiers: Dict[str, str] = {
+        "intro": "fast",
+        "needs_assessment": "smart",
+        "product_selection": "standard",
+        "email_collection": "standard",
+        "otp_verification": "standard",
+        "order_confirmation": "fast",
+        "closing": "fast",
+    }
+    llm_default_tier: str = "standard"
+    llm_degrade_ttft_ms: float = 1200.0
+    llm_degrade_seconds: float = 60.0
+
+    # Bounded LLM context (context.py): latest turns kept verbatim, older ones
+    # folded into a state summary; tool results kept for the latest turns only
+    context_trim_enabled: bool = True
+    context_max_turns: int = 6
+    context_tool_turns: int = 2
+
+    inventory_path: Optional[str] = None
+
+    smtp_server: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_username: Optional[str] = None
+    smtp_password: Optional[str] = None
+    from_email: Optional[str] = None
+    smtp_use_tls: bool = True
+    smtp_auth: bool = True
+    smtp_timeout_seconds: float = 10.0
+    smtp_pool_size: int = 2
+    email_queue_size: int = 1000
+    email_max_retries: int = 3
+    email_retry_base_seconds: float = 1.0
+    email_batch_size: int = 20
+    email_batch_window_ms: int = 200
+
+    otp_backend: str = "memory"
+    otp_db_path: str = "otp.db"
+    otp_ttl_seconds: int = 600
+    otp_max_attempts: int = 5
+
+    orders_db_path: str = "orders.db"
+    orders_commit_interval_ms: int = 50
+
+    phrase_cache_dir: str = ".cache/phrases"
+    phrase_cache_memory_mb: int = 32
+    phrase_cache_disk_mb: int = 256
+
+    web_host: str = "0.0.0.0"
+    web_port: int = 5000
+    web_threads: int = 16
+
+    # Set to use explicit agent dispatch (required by the room pool)
+    agent_name: Optional[str] = None
+    # Pre-created rooms handed out by /api/token; unused rooms are replaced after the TTL
+    room_pool_size: int = 4
+    room_pool_ttl_seconds: float = 600.0
+
+    # "full" keeps tool results verbatim; "compact" trims them to save LLM tokens
+    tool_result_style: str = "full"
+    tool_result_description_words: int = 12
+
+    # Spoken product resolution: minimum match score and lead over the runner-up
+    resolver_min_score: float = 0.45
+    resolver_margin: float = 0.08
+
+    # Semantic product search; "auto" uses fastembed when installed, else a hashing embedder
+    search_embedder: str = "auto"
+    search_embedding_model: str = "BAAI/bge-small-en-v1.5"
+    search_dimensions: int = 256
+    search_ivf_probes: int = 8
+    search_exact_threshold: int = 1000
+
+    # Speak fixed script lines directly after unambiguous tool calls instead of asking the LLM
+    dialog_fast_path: bool = True
+
+    # Worker capacity; unset values are derived from the machine's cores and memory
+    worker_max_calls: Optional[int] = None
+    worker_calls_per_core: float = 2.0
+    worker_idle_processes: Optional[int] = None
+    worker_load_threshold: float = 0.75
+    worker_memory_budget_mb: Optional[int] = None
+    worker_sample_seconds: float = 5.0
+    worker_report_seconds: float = 60.0
+    job_memory_warn_mb: int = 1024
+    job_memory_limit_mb: Optional[int] = None
+
+    # Call lifecycle: hard cap, silence timeout and how long an empty room is kept
+    call_max_seconds: float = 600.0
+    call_idle_seconds: float = 180.0
+    call_empty_grace_seconds: float = 3.0
+    call_final_playout_timeout: float = 30.0
+    timer_wheel_tick_ms: int = 100
+
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" or "text"
+    log_redact_pii: bool = True
+    log_queue_size: int = 10000
+    # Fraction of records to keep per event name, e.g. {"data_updated": 0.1}
+    log_sample_rates: Dict[str, float] = {}
+
+    telemetry_enabled: bool = False
+    telemetry_host: str = "127.0.0.1"
+    telemetry_prometheus_port: Optional[int] = 9464
+    telemetry_port_range: int = 16
+    telemetry_otel_path: Optional[str] = None
+    telemetry_flush_seconds: float = 5.0
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
 
@@ -34,11 +181,47 @@ def get_settings() -> Settings:
     return Settings()
 
 
-def get_shop_prompt() -> str:
-    """Generate the Shop Whisper ecommerce prompt using configurable script variables."""
-    vars = get_script_variables()
-    
-    return f"""You are {vars.agent_name}, a {vars.agent_title} from {vars.company_name}. Follow this EXACT script without deviation:
+# Script-independent instructions go first so every session, whatever its
+# script variables, sends an identical prefix that provider-side prompt
+# caching can reuse.
+SHOP_PROMPT_RULES = """CRITICAL: Say ONLY ONE thing at a time. Wait for customer response after each statement.
+
+CRITICAL RULES:
+- NEVER deviate from the script below
+- NEVER ask additional questions beyond what's specified
+- ALWAYS use the tools provided (get_product_options, search_products, find_product, send_otp, verify_otp, generate_order)
+- When you reach the final order confirmation, IMMEDIATELY call collect_data with summary to complete the call
+- Be friendly, professional, and follow the exact wording
+- DO NOT combine multiple script responses into one message
+- Wait for customer response after each statement before proceeding
+
+TOOL USAGE:
+- collect_data: Store customer_name, product_selection, email, script_stage
+- get_product_options: Retrieve product options when customer mentions a category (includes prices in PKR)
+- search_products: When the customer describes what they want instead of naming a category (e.g. "something warm under 4000 rupees"); returns ranked products with prices
+- find_product: Match the customer's words for a product to its exact catalog name; if several match, ask which one they mean
+- send_otp: Send OTP code to customer's email
+- verify_otp: Verify the OTP code provided by customer
+- generate_order: Generate order ID and save to Excel (only after OTP verification succeeds)
+- summary: ONLY when the call is complete and order is confirmed - provide a brief summary
+- If a tool returns no output, its script line has already been spoken to the customer. Do not repeat it; wait for the customer's response
+
+PRICING INFORMATION:
+- All prices are in PKR (Pakistani Rupees)
+- Always mention prices when presenting products
+- Always confirm the price when customer selects a product
+- Prices are included in the get_product_options tool response
+
+When you call collect_data with summary, the call will be automatically terminated.
+
+IMPORTANT: After confirming the order, you MUST call collect_data with summary immediately. Do not wait for customer response."""
+
+
+def render_shop_prompt(vars: ScriptVariables) -> str:
+    """Render the Shop Whisper ecommerce prompt for the given script variables."""
+    return SHOP_PROMPT_RULES + f"""
+
+You are {vars.agent_name}, a {vars.agent_title} from {vars.company_name}. Follow this EXACT script without deviation:
 
 SCRIPT FLOW:
 1. AGENT INTRODUCTION: "{vars.intro_greeting}"
@@ -55,12 +238,14 @@ SCRIPT FLOW:
    - Format: "Option 1: [Product Name] - [Description] - PKR [Price]"
    - Say: "{vars.product_selection_prompt}"
    - Wait for customer to select a product
+   - If the customer describes what they want (warmth, style, budget) rather than a category, call search_products with their words instead and present its results the same way
    - REMEMBER the prices you just mentioned for each product
 
 4. PRODUCT SELECTION: When customer selects a product:
+   - If they did not say the exact product name, call find_product with their words and the category
    - Use collect_data to store the selected product
    - Confirm the selection by mentioning the product name AND its price in PKR
-   - Example: "Great choice! You've selected [product name] for PKR [price]. That's an excellent pick!"
+   - Say: "{vars.product_confirmation}".format(product_name={{selected_product}}, price={{price}})
    - Then say: "{vars.email_request}".format(product_name={{selected_product}})
    - Wait for customer to provide email
 
@@ -78,34 +263,18 @@ SCRIPT FLOW:
      - Say: "{vars.order_confirmation}".format(email={{email}})
      - IMMEDIATELY call collect_data with summary to complete the call
    - If verification fails:
-     - Say: "The code you entered is incorrect. Please try again."
-     - Wait for customer to provide OTP again
+     - Say: "{vars.otp_retry}"
+     - Wait for customer to provide OTP again"""
 
-CRITICAL: Say ONLY ONE thing at a time. Wait for customer response after each statement.
 
-CRITICAL RULES:
-- NEVER deviate from this script
-- NEVER ask additional questions beyond what's specified
-- ALWAYS use the tools provided (get_product_options, send_otp, verify_otp, generate_order)
-- When you reach the final order confirmation, IMMEDIATELY call collect_data with summary to complete the call
-- Be friendly, professional, and follow the exact wording
-- DO NOT combine multiple script responses into one message
-- Wait for customer response after each statement before proceeding
+_prompt_cache: Optional[Tuple[int, str]] = None
 
-TOOL USAGE:
-- collect_data: Store customer_name, product_selection, email, script_stage
-- get_product_options: Retrieve product options when customer mentions a category (includes prices in PKR)
-- send_otp: Send OTP code to customer's email
-- verify_otp: Verify the OTP code provided by customer
-- generate_order: Generate order ID and save to Excel (only after OTP verification succeeds)
-- summary: ONLY when the call is complete and order is confirmed - provide a brief summary
 
-PRICING INFORMATION:
-- All prices are in PKR (Pakistani Rupees)
-- Always mention prices when presenting products
-- Always confirm the price when customer selects a product
-- Prices are included in the get_product_options tool response
-
-When you call collect_data with summary, the call will be automatically terminated.
-
-IMPORTANT: After confirming the order, you MUST call collect_data with summary immediately. Do not wait for customer response."""
+def get_shop_prompt() -> str:
+    """Shop Whisper prompt for the current script variables, rendered once per script version."""
+    global _prompt_cache
+    version = get_script_version()
+    cached = _prompt_cache
+    if cached is None or cached[0] != version:
+        cached = _prompt_cache = (version, render_shop_prompt(get_script_variables()))
+    return cached[1]
@@ -18,12 +18,16 @@ class ScriptVariables:
     intro_greeting: str = "Welcome to Zenitheon. I am Zen, your personal AI shopping assistant. May I know who I am speaking with today?"
     needs_assessment: str = "It is a pleasure to meet you, {customer_name}. How can I help you upgrade your wardrobe today? Are you looking for something specific?"
     product_selection_prompt: str = "Which one of these catches your eye?"
+    product_confirmation: str = "Great choice! You've selected {product_name} for {price}."
     email_request: str = "Great selection. The {product_name} is a favorite. To finalize your order and send you the generated Tracking ID, could you please share your email address?"
     otp_request: str = "Thank you. I have sent a verification code to your email. Please provide the code to confirm your order."
+    otp_retry: str = "The code you entered is incorrect. Please try again."
     order_confirmation: str = "Thank you. I have confirmed your order. A confirmation email with your unique Tracking ID has just been sent to {email}. Thank you for shopping with Zenitheon. Have a stylish day!"
+    provider_apology: str = "I am sorry, I am having a little trouble on my end. Please give me a moment."
 
 
 DEFAULT_SCRIPT_VARS = ScriptVariables()
+SCRIPT_VARS_VERSION = 0
 
 
 def get_script_variables() -> ScriptVariables:
@@ -31,9 +35,14 @@ def get_script_variables() -> ScriptVariables:
     return DEFAULT_SCRIPT_VARS
 
 
+def get_script_version() -> int:
+    """Counter bumped on every update_script_variables call, used to invalidate caches."""
+    return SCRIPT_VARS_VERSION
+
+
 def update_script_variables(**kwargs) -> ScriptVariables:
     """Update script variables with new values."""
-    global DEFAULT_SCRIPT_VARS
+    global DEFAULT_SCRIPT_VARS, SCRIPT_VARS_VERSION
     current_vars = DEFAULT_SCRIPT_VARS
     updated_vars = ScriptVariables(
         company_name=kwargs.get('company_name', current_vars.company_name),
@@ -43,9 +52,13 @@ def update_script_variables(**kwargs) -> ScriptVariables:
         intro_greeting=kwargs.get('intro_greeting', current_vars.intro_greeting),
         needs_assessment=kwargs.get('needs_assessment', current_vars.needs_assessment),
         product_selection_prompt=kwargs.get('product_selection_prompt', current_vars.product_selection_prompt),
+        product_confirmation=kwargs.get('product_confirmation', current_vars.product_confirmation),
         email_request=kwargs.get('email_request', current_vars.email_request),
         otp_request=kwargs.get('otp_request', current_vars.otp_request),
+        otp_retry=kwargs.get('otp_retry', current_vars.otp_retry),
         order_confirmation=kwargs.get('order_confirmation', current_vars.order_confirmation),
+        provider_apology=kwargs.get('provider_apology', current_vars.provider_apology),
     )
     DEFAULT_SCRIPT_VARS = updated_vars
+    SCRIPT_VARS_VERSION += 1
     return updated_vars
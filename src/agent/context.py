@@ -0,0 +1,151 @@
+"""Bounded LLM context for long calls.
+
+The agent's chat history grows by several items every turn, and email
+spelling and OTP retries stretch calls to dozens of turns. Before each LLM
+request the history is cut down to a bounded window:
+
+- the system prompt, unchanged so provider-side prompt caching still applies
+- one state summary built from the call's CallSession, in place of every turn
+  older than the latest CONTEXT_MAX_TURNS
+- the latest turns verbatim, except tool calls and their outputs older than
+  CONTEXT_TOOL_TURNS turns, whose results are already reflected in the
+  session state and in what the agent said
+
+Only the request is trimmed; the session's own history is left intact.
+"""
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, List, Sequence, Tuple
+
+from livekit.agents import llm
+
+from .config import get_settings
+from .logs import log_event
+from .telemetry import get_telemetry
+
+if TYPE_CHECKING:
+    from .session import CallSession
+
+logger = logging.getLogger("shop_agent")
+
+SYSTEM = "system"
+USER = "user"
+TOOL = "tool"
+OTHER = "other"
+
+
+def window(kinds: Sequence[str], max_turns: int, tool_turns: int) -> Tuple[List[int], int]:
+    """Indices of the items to keep, and how many older turns were folded away.
+
+    A turn starts at each user item. System items are always kept; items
+    before the latest ``max_turns`` turns are dropped, and tool items before
+    the latest ``tool_turns`` turns are dropped too (a call and its output
+    always fall in the same turn, so they go together). The current turn is
+    always kept whole, since its tool results may still be awaiting a reply.
+    """
+    max_turns, tool_turns = max(1, max_turns), max(1, tool_turns)
+    users = [i for i, kind in enumerate(kinds) if kind == USER]
+    folded = max(0, len(users) - max_turns)
+    start = users[folded] if folded else 0
+    tool_start = users[-tool_turns] if len(users) >= tool_turns else 0
+    keep = [
+        i for i, kind in enumerate(kinds)
+        if kind == SYSTEM or (i >= start and (kind != TOOL or i >= tool_start))
+    ]
+    return keep, folded
+
+
+def state_summary(session: "CallSession", folded_turns: int) -> str:
+    """What the call has established so far, in place of the turns that were folded away."""
+    facts = [f"script stage: {session.script_stage}"]
+    if session.customer_name:
+        facts.append(f"customer name: {session.customer_name}")
+    if session.product_selection:
+        facts.append(f"selected product: {session.product_selection}")
+    if session.email:
+        facts.append(f"email: {session.email}")
+    return (
+        f"Call state after {folded_turns} earlier turns (no longer shown): {'; '.join(facts)}. "
+        "Continue the script from this stage; do not repeat steps already completed."
+    )
+
+
+@dataclass
+class ContextStats:
+    turns: int = 0
+    trimmed_turns: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+
+    @property
+    def saved_ratio(self) -> float:
+        return 1 - self.tokens_after / self.tokens_before if self.tokens_before else 0.0
+
+    def merge(self, other: "ContextStats"):
+        self.turns += other.turns
+        self.trimmed_turns += other.trimmed_turns
+        self.tokens_before += other.tokens_before
+        self.tokens_after += other.tokens_after
+
+    def __str__(self) -> str:
+        return (
+            f"{self.turns} requests, {self.tokens_before} -> {self.tokens_after} history tokens "
+            f"({self.saved_ratio:.0%} saved, {self.trimmed_turns} trimmed)"
+        )
+
+
+def _kind(item: Any) -> str:
+    if item.type == "message":
+        if item.role in ("system", "developer"):
+            return SYSTEM
+        return USER if item.role == "user" else OTHER
+    if item.type in ("function_call", "function_call_output"):
+        return TOOL
+    return OTHER
+
+
+def _item_tokens(item: Any) -> int:
+    # tokens imports the tool modules, which import session, which imports this module
+    from .tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+    if item.type == "message":
+        text = item.text_content or ""
+    elif item.type == "function_call":
+        text = f"{item.name}{item.arguments}"
+    elif item.type == "function_call_output":
+        text = item.output
+    else:
+        return 0
+    return MESSAGE_OVERHEAD_TOKENS + count_tokens(text)
+
+
+def bound_chat_ctx(chat_ctx: llm.ChatContext, session: "CallSession", stats: ContextStats) -> llm.ChatContext:
+    """The chat context to send for this turn: system prompt, state summary and recent turns."""
+    s = get_settings()
+    items = chat_ctx.items
+    before = sum(_item_tokens(item) for item in items)
+    keep, folded = window([_kind(item) for item in items], s.context_max_turns, s.context_tool_turns)
+
+    kept = [items[i] for i in keep]
+    if folded:
+        summary = llm.ChatMessage(role="system", content=[state_summary(session, folded)])
+        # After the instructions, so the cacheable prefix stays byte-identical
+        position = next((i for i, item in enumerate(kept) if _kind(item) != SYSTEM), len(kept))
+        kept.insert(position, summary)
+    bounded = llm.ChatContext(kept) if len(kept) != len(items) else chat_ctx
+    after = sum(_item_tokens(item) for item in bounded.items)
+
+    stats.turns += 1
+    stats.trimmed_turns += bounded is not chat_ctx
+    stats.tokens_before += before
+    stats.tokens_after += after
+    telemetry = get_telemetry()
+    telemetry.count("shop_llm_context_tokens_total", before, kind="before")
+    telemetry.count("shop_llm_context_tokens_total", after, kind="after")
+    log_event(
+        logger, "llm_context", f"LLM context: {before} -> {after} tokens ({folded} turns folded)",
+        tokens_before=before, tokens_after=after, folded_turns=folded, items=len(bounded.items),
+    )
+    return bounded
@@ -2,87 +2,170 @@ from __future__ import annotations
 
 import asyncio
 import csv
-import logging
 import os
+import time
 from datetime import UTC, datetime
 from typing import Any, Dict, List, Optional
 
 from agent.constants import get_script_variables
 from livekit import agents, api, rtc
-from livekit.agents import AgentSession, RoomInputOptions, RoomOutputOptions
-from livekit.agents.voice import Agent
+from livekit.agents import AgentSession, APIConnectOptions, RoomInputOptions, RoomOutputOptions
+from livekit.agents.voice.agent_session import SessionConnectOptions
 from livekit.plugins import noise_cancellation, silero
 from livekit.plugins.turn_detector.english import EnglishModel
 
+from .catalog import get_catalog
 from .config import get_shop_prompt, get_settings
-from .providers import create_llm_provider, create_stt_provider, create_tts_provider
-from .session import SessionManager
+from .lifecycle import CallLifecycle
+from .logs import bind_call_id, configure_logging, log_event
+from .mailer import get_mailer
+from .orders import get_order_ledger
+from .phrase_cache import PhraseAudioCache, prerender, static_script_lines
+from .providers import (
+    close_provider_pool, create_llm_provider, create_stt_provider, create_tts_provider, get_provider_pool,
+)
+from .providers.llm import create_fallback_llm, create_tier_fallback_llms, create_tier_llms
+from .providers.stt import with_fallback_stt
+from .providers.tts import create_fallback_tts
+from .resolver import get_resolver
+from .search import get_search_index
+from .session import CallState, SessionRegistry
+from .telemetry import get_telemetry
 from .tools import (
     create_data_collection_tool,
+    create_find_product_tool,
     create_generate_order_tool,
     create_get_product_options_tool,
+    create_search_products_tool,
     create_send_otp_tool,
     create_verify_otp_tool,
 )
 from .types import OrderResult
+from .voice import ShopVoiceAgent
 
-logger = logging.getLogger("shop_agent")
-logging.basicConfig(level=logging.INFO, format="[%(levelname)s] %(message)s")
+logger = configure_logging()
 
 
 class ShopAgent:
     def __init__(self):
         self.settings = get_settings()
-        self.results_file = "orders.csv"
-        self.session_manager = SessionManager(self.results_file)
-        self._call_completed = False
+        self.sessions = SessionRegistry()
+
+    def prewarm(self, proc: agents.JobProcess):
+        """Load VAD, turn detector and noise cancellation once per worker process."""
+        started = time.perf_counter()
+        proc.userdata["vad"] = silero.VAD.load()
+        proc.userdata["turn_detection"] = EnglishModel()
+        proc.userdata["noise_cancellation"] = noise_cancellation.BVCTelephony()
+        proc.userdata["phrase_cache"] = self._load_phrase_cache()
+        get_catalog().refresh()
+        # Open the orders database before the first call rather than on its event loop
+        get_order_ledger()
+        get_resolver()
+        get_search_index()
+        logger.info(f"Prewarmed VAD, turn detector and noise cancellation in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    def _load_phrase_cache(self) -> PhraseAudioCache:
+        """Open the phrase audio cache and load already-rendered script lines from disk."""
+        s = self.settings
+        cache = PhraseAudioCache(
+            s.phrase_cache_dir,
+            voice_id=s.cartesia_voice_id or "",
+            model=s.cartesia_model,
+            sample_rate=s.sample_rate_hz,
+            max_memory_bytes=s.phrase_cache_memory_mb * 1024 * 1024,
+            max_disk_bytes=s.phrase_cache_disk_mb * 1024 * 1024,
+        )
+        missing = cache.load(static_script_lines(get_script_variables()))
+        logger.info(f"Phrase cache: {len(cache.phrases) - len(missing)} script lines ready, {len(missing)} to render")
+        return cache
 
+    def _shared_models(self, ctx: agents.JobContext) -> Dict[str, Any]:
+        """Return the process-level models, loading any that prewarm did not provide."""
+        userdata = ctx.proc.userdata
+        if "vad" not in userdata:
+            logger.warning("Worker was not prewarmed - loading models inside the job")
+            self.prewarm(ctx.proc)
+        return {
+            "vad": userdata["vad"],
+            "turn_detection": userdata["turn_detection"],
+            "noise_cancellation": userdata["noise_cancellation"],
+            "phrase_cache": userdata["phrase_cache"],
+        }
 
-    async def _hangup_call(self, ctx: agents.JobContext):
+    def build_tools(self, call: CallState) -> List[Any]:
+        """Create the function tools for a single call."""
+        return [
+            create_data_collection_tool(call.session_manager, call.prefetcher, call.dialog),
+            create_get_product_options_tool(),
+            create_search_products_tool(),
+            create_find_product_tool(),
+            create_send_otp_tool(call.prefetcher, call.dialog),
+            create_verify_otp_tool(call.dialog),
+            create_generate_order_tool(call.session_manager, call.dialog),
+        ]
+
+    async def _hangup_call(self, ctx: agents.JobContext, call: CallState):
         try:
-            if not self._call_completed:
-                logger.info("Hanging up call")
-                self._call_completed = True
-            
+            if not call.completed:
+                call.completed = True
+
             logger.info("Hanging up call")
             await ctx.api.room.delete_room(api.DeleteRoomRequest(room=ctx.room.name))
             logger.info(f"Deleted room {ctx.room.name}")
         except Exception as e:
             logger.warning(f"Could not delete room: {e}")
 
-    async def _on_disconnected(self, ctx: agents.JobContext):
+    async def _on_disconnected(self, ctx: agents.JobContext, call: CallState):
         logger.info("Room disconnected - performing cleanup")
         # Don't call hangup again if already completed
-        if not self._call_completed:
-            await self._hangup_call(ctx)
-
-    async def _force_hangup_if_empty(self, ctx: agents.JobContext):
-        await asyncio.sleep(3)
-        try:
-            req = api.ListParticipantsRequest(room=ctx.room.name)
-            async with ctx.api:
-                resp = await ctx.api.room.list_participants(req)
-                participants = resp.participants
-            if len(participants) <= 1:
-                logger.info("No human participants remain - closing room")
-                await self._hangup_call(ctx)
-        except Exception as e:
-            logger.warning(f"Force cleanup check failed: {e}")
+        if not call.completed:
+            await self._hangup_call(ctx, call)
+        await get_mailer().drain()
+        await self.sessions.close(call.call_id)
+        telemetry = get_telemetry()
+        if telemetry.enabled:
+            telemetry.record_span("call", int(call.session.start_time.timestamp() * 1e9), time.time_ns(), call_id=call.call_id)
+            await asyncio.to_thread(telemetry.flush)
+        # The job process exits after this call; close provider sockets rather than leave them to the GC
+        await close_provider_pool()
+        logger.info(f"Released call {call.call_id} ({len(self.sessions)} active in this process)")
+        logger.info(f"Prefetch: {call.prefetcher.stats} (process: {self.sessions.prefetch_stats})")
+        logger.info(f"Dialog: {call.dialog.stats} (process: {self.sessions.dialog_stats})")
+        logger.info(f"LLM context: {call.context} (process: {self.sessions.context_stats})")
+        logger.info(f"LLM routing: {call.routing} (process: ${self.sessions.routing_stats.cost_usd:.5f} over {self.sessions.routing_stats.turns} turns)")
 
-    async def _watchdog(self, ctx: agents.JobContext):
-        """Watchdog to prevent infinite sessions. Extended timeout for shopping flow with OTP."""
-        await asyncio.sleep(600)
-        if not self._call_completed:
-            logger.warning("Watchdog timeout (10 min) - forcing hangup")
-            await self._hangup_call(ctx)
+    @staticmethod
+    def _human_participants(ctx: agents.JobContext) -> int:
+        return sum(
+            1 for p in ctx.room.remote_participants.values()
+            if p.kind != rtc.ParticipantKind.PARTICIPANT_KIND_AGENT
+        )
 
     async def entrypoint(self, ctx: agents.JobContext):
         start_time = datetime.now(tz=UTC)
+        job_started = time.perf_counter()
         logger.info("=" * 60)
         logger.info(f"Agent job started at {start_time.isoformat()}")
         logger.info(f"Room: {ctx.room.name}")
         logger.info("=" * 60)
 
+        telemetry = get_telemetry()
+        telemetry.start()
+        bind_call_id(ctx.job.id)
+
+        call = self.sessions.open(ctx.job.id, ctx.room.name)
+        ctx.add_shutdown_callback(lambda: self._on_disconnected(ctx, call))
+
+        async def hangup(reason: str):
+            await self._hangup_call(ctx, call)
+
+        lifecycle = CallLifecycle(hangup)
+        # Open provider connections while the room connects and the customer joins
+        provider_pool = get_provider_pool() if self.settings.provider_pool_enabled else None
+        if provider_pool is not None:
+            provider_pool.warm_up()
+
         try:
             logger.info("Connecting to room...")
             await ctx.connect()
@@ -90,89 +173,146 @@ class ShopAgent:
 
             logger.info("Waiting for participant to join...")
             participant = await ctx.wait_for_participant()
+            participant_joined = time.perf_counter()
             logger.info(f"✓ Participant connected: {participant.identity}")
             logger.info("=" * 60)
 
-            stt = create_stt_provider(self.settings.deepgram_api_key, self.settings.deepgram_model)
-            llm = create_llm_provider(self.settings.openai_api_key, self.settings.openai_model)
-            tts = create_tts_provider(
-                self.settings.cartesia_api_key,
-                self.settings.cartesia_voice_id,
-                self.settings.cartesia_model,
-                self.settings.cartesia_format
-            )
+            models = self._shared_models(ctx)
 
-            data_collection_tool = create_data_collection_tool(self.session_manager)
-            get_product_options_tool = create_get_product_options_tool()
-            send_otp_tool = create_send_otp_tool()
-            verify_otp_tool = create_verify_otp_tool()
-            generate_order_tool = create_generate_order_tool(self.session_manager)
+            if provider_pool is not None:
+                lease = provider_pool.lease()
+                stt, llm, tts = lease.stt, lease.llm, lease.tts
+                fallback_llm, fallback_tts = lease.fallback_llm, lease.fallback_tts
+                tier_llms, tier_fallback_llms = lease.tier_llms, lease.tier_fallback_llms
+                log_event(
+                    logger, "providers_leased",
+                    f"Providers leased ({'warm' if lease.warm else 'still warming'}), "
+                    f"an estimated {lease.est_handshake_saved_ms:.0f} ms of connection setup saved",
+                    warm=lease.warm, est_handshake_saved_ms=lease.est_handshake_saved_ms,
+                )
+            else:
+                stt = with_fallback_stt(create_stt_provider(self.settings.deepgram_api_key, self.settings.deepgram_model))
+                llm = create_llm_provider(self.settings.openai_api_key, self.settings.openai_model)
+                tts = create_tts_provider(
+                    self.settings.cartesia_api_key,
+                    self.settings.cartesia_voice_id,
+                    self.settings.cartesia_model,
+                    self.settings.cartesia_format
+                )
+                fallback_llm, fallback_tts = create_fallback_llm(), create_fallback_tts()
+                tier_llms, tier_fallback_llms = create_tier_llms(), create_tier_fallback_llms()
 
-            voice_agent = Agent(
+            phrase_cache = models["phrase_cache"]
+            voice_agent = ShopVoiceAgent(
+                call=call,
+                tier_llms=tier_llms,
+                tier_fallback_llms=tier_fallback_llms,
+                phrase_cache=phrase_cache,
+                fallback_llm=fallback_llm,
+                fallback_tts=fallback_tts,
                 instructions=get_shop_prompt(),
                 stt=stt,
                 llm=llm,
                 tts=tts,
-                tools=[
-                    data_collection_tool,
-                    get_product_options_tool,
-                    send_otp_tool,
-                    verify_otp_tool,
-                    generate_order_tool,
-                ],
-                vad=silero.VAD.load(),
-                turn_detection=EnglishModel(),
+                tools=self.build_tools(call),
+                vad=models["vad"],
+                turn_detection=models["turn_detection"],
+            )
+
+            # LLM and TTS deadlines are enforced per request by ShopVoiceAgent's provider routes
+            call_session = AgentSession(
+                stt=stt,
+                llm=llm,
+                tts=tts,
+                conn_options=SessionConnectOptions(
+                    stt_conn_options=APIConnectOptions(timeout=self.settings.stt_timeout_seconds),
+                ),
             )
+            greeting_reported = False
+            speaking_since: Optional[float] = None
 
-            call_session = AgentSession(stt=stt, llm=llm, tts=tts)
+            @call_session.on("agent_state_changed")
+            def on_agent_state_changed(event) -> None:
+                """Trace playback and report time-to-first-greeting the first time the agent speaks."""
+                nonlocal greeting_reported, speaking_since
+                if event.new_state == "speaking":
+                    speaking_since = time.time()
+                elif speaking_since is not None:
+                    telemetry.record_interval("playback", speaking_since, time.time() - speaking_since)
+                    speaking_since = None
+                if greeting_reported or event.new_state != "speaking":
+                    return
+                greeting_reported = True
+                now = time.perf_counter()
+                logger.info(
+                    f"Time to first greeting: {(now - participant_joined) * 1000:.0f} ms after participant joined, "
+                    f"{(now - job_started) * 1000:.0f} ms after job start"
+                )
 
             await call_session.start(
                 room=ctx.room,
                 agent=voice_agent,
                 room_output_options=RoomOutputOptions(transcription_enabled=True),
-                room_input_options=RoomInputOptions(noise_cancellation=noise_cancellation.BVCTelephony()),
+                room_input_options=RoomInputOptions(noise_cancellation=models["noise_cancellation"]),
             )
 
             logger.info("Agent session started. Awaiting room disconnection...")
-            await call_session.generate_reply(
-                instructions=f"Say exactly this phrase and nothing else: '{get_script_variables().intro_greeting}'.",
-                allow_interruptions=False,
-            )        
-            # Monitor for call completion
-            call_completed = False
-            
+            # The greeting is fixed text: speak it directly (from cached audio when
+            # available) instead of asking the LLM to repeat it.
+            call_session.say(get_script_variables().intro_greeting, allow_interruptions=False)
+            call.spawn(prerender(phrase_cache, tts, static_script_lines(get_script_variables())))
+
+            @call_session.on("metrics_collected")
+            def on_metrics_collected(event) -> None:
+                telemetry.record_livekit_metrics(event.metrics)
+
+            @call_session.on("user_input_transcribed")
+            def on_user_input_transcribed(event) -> None:
+                """Speculatively prepare the next tool result from interim and final transcripts."""
+                if event.is_final:
+                    # Interim results arrive many times a second; one re-arm per utterance is enough
+                    lifecycle.touch()
+                call.prefetcher.observe_transcript(event.transcript)
+
             @call_session.on(event="function_tools_executed")
             def on_function_tools_executed(event) -> None:
                 """Handle function tools executed event."""
-                nonlocal call_completed
                 for function_call, output in event.zipped():
-                    print(f"Function call: {function_call.name}, Output: {output.output}")
-                    if function_call.name == "collect_data" and not output.output:
-                        logger.info("Summary provided - call completed by AI")
-                        call_completed = True
-                        self._call_completed = True
-                        asyncio.create_task(self._delayed_hangup(ctx))
-                        break
+                    log_event(logger, "function_call", f"Function call: {function_call.name}", tool=function_call.name, output=output.output)
+                # Tools on the scripted fast path also return no output, so
+                # completion is read from the session rather than the result.
+                if not call.completed and call.session_manager.is_summary_provided():
+                    logger.info("Summary provided - call completed by AI")
+                    call.completed = True
+                    # Hang up as soon as the closing line has finished playing
+                    lifecycle.complete([call.dialog.final_speech, call_session.current_speech])
 
-            ctx.add_shutdown_callback(lambda: self._on_disconnected(ctx))
+            @ctx.room.on("participant_connected")
+            def participant_connected(p: rtc.RemoteParticipant):
+                lifecycle.participants_changed(self._human_participants(ctx))
 
             @ctx.room.on("participant_disconnected")
-            def participant_disconnected(p: rtc.Participant):
+            def participant_disconnected(p: rtc.RemoteParticipant):
                 logger.info(f"Participant disconnected: {p.identity}")
-                asyncio.create_task(self._force_hangup_if_empty(ctx))
+                lifecycle.participants_changed(self._human_participants(ctx))
 
-            asyncio.create_task(self._watchdog(ctx))
+            @ctx.room.on("track_subscribed")
+            def track_subscribed(track: rtc.Track, publication: rtc.RemoteTrackPublication, p: rtc.RemoteParticipant):
+                lifecycle.touch()
 
-            await asyncio.Event().wait()
+            @ctx.room.on("disconnected")
+            def room_disconnected(*args) -> None:
+                lifecycle.closed()
+
+            # The customer may have left while the session was starting
+            lifecycle.participants_changed(self._human_participants(ctx))
+
+            await lifecycle.wait()
+            ctx.shutdown(reason="call ended")
 
         except Exception as e:
             logger.error(f"Fatal error in entrypoint: {e}", exc_info=True)
-            await self._hangup_call(ctx)
+            await self._hangup_call(ctx, call)
         finally:
+            lifecycle.closed()
             logger.info("Agent shutting down")
-
-    async def _delayed_hangup(self, ctx: agents.JobContext):
-        """Hang up after a brief delay to allow final response."""
-        await asyncio.sleep(2)
-        logger.info("Call completion detected - hanging up call")
-        await self._hangup_call(ctx)
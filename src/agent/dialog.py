@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Optional
+
+from .catalog import get_catalog
+from .config import get_settings
+from .constants import get_script_variables
+
+if TYPE_CHECKING:
+    from .session import SessionManager
+
+
+@dataclass
+class DialogStats:
+    fast_turns: int = 0
+    llm_turns: int = 0
+
+    @property
+    def fast_ratio(self) -> float:
+        total = self.fast_turns + self.llm_turns
+        return self.fast_turns / total if total else 0.0
+
+    def merge(self, other: "DialogStats"):
+        self.fast_turns += other.fast_turns
+        self.llm_turns += other.llm_turns
+
+    def __str__(self) -> str:
+        return f"{self.fast_turns} fast-path turns, {self.llm_turns} LLM turns ({self.fast_ratio:.0%} fast)"
+
+
+class DialogEngine:
+    """Speaks fixed script lines straight from session state, skipping the LLM's reply round.
+
+    After a tool runs, the engine checks whether the script's next line is
+    fully determined (a name was stored, an OTP was sent, an order was
+    placed). If it is, the tool speaks the rendered line through the session
+    and returns no output, so the LLM is not asked to reply. Anything else
+    returns the tool output to the LLM as before.
+    """
+
+    def __init__(self, session_manager: "SessionManager"):
+        self.session_manager = session_manager
+        self.stats = DialogStats()
+        self.final_speech: Optional[Any] = None
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().dialog_fast_path
+
+    def respond(self, context: Any, line: Optional[str], output: str, final: bool = False) -> Optional[str]:
+        """Speak line and suppress the LLM reply, or hand output back to the LLM when there is no line."""
+        if not line or not self.enabled:
+            self.stats.llm_turns += 1
+            return output
+        handle = context.session.say(line)
+        if final:
+            self.final_speech = handle
+        self.stats.fast_turns += 1
+        return None
+
+    def after_collect_data(self, customer_name: str, product_selection: str, email: str, summary: str) -> Optional[str]:
+        if email or summary:
+            return None
+        script = get_script_variables()
+        if customer_name and not product_selection:
+            if self.session_manager.session.script_stage not in ("intro", "needs_assessment"):
+                return None
+            return script.needs_assessment.format(customer_name=customer_name)
+        if product_selection and not customer_name:
+            product = get_catalog().by_name(product_selection)
+            if product is None:
+                return None
+            confirmation = script.product_confirmation.format(product_name=product.name, price=product.price_label())
+            return f"{confirmation} {script.email_request.format(product_name=product.name)}"
+        return None
+
+    def after_send_otp(self) -> str:
+        return get_script_variables().otp_request
+
+    def after_invalid_otp(self) -> str:
+        return get_script_variables().otp_retry
+
+    def after_order(self, email: str) -> str:
+        return get_script_variables().order_confirmation.format(email=email)
@@ -0,0 +1,204 @@
+"""Event-driven call lifecycle on a shared timer wheel.
+
+Every call's timers (maximum duration, idle timeout, grace period after the
+customer leaves) live in one hashed timer wheel per event loop, driven by a
+single task that only runs while timers are pending. Timers are re-armed or
+cancelled by room, track and session events instead of each call parking
+sleeping tasks and polling the LiveKit API.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import math
+import weakref
+from typing import Any, Awaitable, Callable, List, Optional
+
+from .config import get_settings
+
+logger = logging.getLogger("shop_agent")
+
+
+class TimerHandle:
+    __slots__ = ("callback", "rounds", "cancelled", "_slot")
+
+    def __init__(self, callback: Callable[[], Any], rounds: int, slot: List["TimerHandle"]):
+        self.callback = callback
+        self.rounds = rounds
+        self.cancelled = False
+        self._slot: Optional[List[TimerHandle]] = slot
+
+    def cancel(self):
+        """Drop the timer from its slot at once, so re-armed timers don't pile up."""
+        if self.cancelled:
+            return
+        self.cancelled = True
+        if self._slot is not None:
+            self._slot.remove(self)
+            self._slot = None
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule, cancel within one slot, one ticking task for all timers."""
+
+    def __init__(self, tick_seconds: float = 0.1, slots: int = 512):
+        self.tick = tick_seconds
+        self._slots: List[List[TimerHandle]] = [[] for _ in range(slots)]
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(slot) for slot in self._slots)
+
+    def schedule(self, delay: float, callback: Callable[[], Any]) -> TimerHandle:
+        """Run callback (a plain function, on the loop) after roughly delay seconds."""
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = self._slots[(self._cursor + ticks) % len(self._slots)]
+        handle = TimerHandle(callback, (ticks - 1) // len(self._slots), slot)
+        slot.append(handle)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return handle
+
+    def _pending(self) -> bool:
+        return any(self._slots)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        # Exits once every timer has fired or been cancelled
+        while self._pending():
+            next_tick += self.tick
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            self.advance()
+
+    def advance(self):
+        """Move the wheel one tick and run the timers that came due."""
+        self._cursor = (self._cursor + 1) % len(self._slots)
+        slot = self._slots[self._cursor]
+        due, keep = [], []
+        for handle in slot:
+            if handle.rounds:
+                handle.rounds -= 1
+                keep.append(handle)
+            else:
+                handle._slot = None
+                due.append(handle)
+        # In place: pending handles keep a reference to their slot list
+        slot[:] = keep
+        for handle in due:
+            try:
+                handle.callback()
+            except Exception as e:
+                logger.error(f"Timer callback failed: {e}", exc_info=True)
+
+
+_wheels: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, TimerWheel]" = weakref.WeakKeyDictionary()
+
+
+def get_timer_wheel() -> TimerWheel:
+    """The timer wheel for the running event loop."""
+    loop = asyncio.get_running_loop()
+    wheel = _wheels.get(loop)
+    if wheel is None:
+        wheel = _wheels[loop] = TimerWheel(get_settings().timer_wheel_tick_ms / 1000)
+    return wheel
+
+
+class CallLifecycle:
+    """Decides when a call ends and lets the job coroutine return once it has.
+
+    - A maximum-duration timer replaces the per-call watchdog sleep.
+    - An idle timer is re-armed on every transcript and track event.
+    - When the last remote participant leaves, a short grace timer starts;
+      a reconnect cancels it. Presence comes from the room's own participant
+      list, so no list_participants API calls are made.
+    - On completion, the call hangs up as soon as the final speech has
+      played out rather than after a fixed delay.
+    """
+
+    def __init__(self, hangup: Callable[[str], Awaitable[None]], wheel: Optional[TimerWheel] = None):
+        s = get_settings()
+        self.settings = s
+        self._hangup = hangup
+        self.wheel = wheel if wheel is not None else get_timer_wheel()
+        self._done = asyncio.Event()
+        self._ending = False
+        self._max_timer = self.wheel.schedule(s.call_max_seconds, lambda: self.end("max call duration reached"))
+        self._idle_timer: Optional[TimerHandle] = None
+        self._empty_timer: Optional[TimerHandle] = None
+        self._task: Optional[asyncio.Task] = None
+        self.touch()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def touch(self):
+        """Record activity (a final transcript or a new track); re-arms the idle timer."""
+        if self._ending:
+            return
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        self._idle_timer = self.wheel.schedule(self.settings.call_idle_seconds, lambda: self.end("no activity"))
+
+    def participants_changed(self, remote_participants: int):
+        """React to joins and leaves; an empty room ends the call after a grace period."""
+        if remote_participants > 0:
+            if self._empty_timer is not None:
+                self._empty_timer.cancel()
+                self._empty_timer = None
+            self.touch()
+        elif self._empty_timer is None and not self._ending:
+            self._empty_timer = self.wheel.schedule(
+                self.settings.call_empty_grace_seconds, lambda: self.end("no participants remain")
+            )
+
+    def complete(self, speeches: List[Any]):
+        """The script is finished: hang up once the given speech handles have played out."""
+        if self._ending:
+            return
+        self._ending = True
+        self._cancel_timers()
+        self._task = asyncio.create_task(self._finish(speeches))
+
+    async def _finish(self, speeches: List[Any]):
+        pending = [s for s in speeches if s is not None and not s.done()]
+        if pending:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(s.wait_for_playout() for s in pending)),
+                    self.settings.call_final_playout_timeout,
+                )
+            except asyncio.TimeoutError:
+                logger.warning("Final speech did not finish playing in time - hanging up anyway")
+        await self._end("call completed")
+
+    def end(self, reason: str):
+        """Hang up now (from a timer or event callback)."""
+        if self._ending:
+            return
+        self._ending = True
+        self._cancel_timers()
+        self._task = asyncio.create_task(self._end(reason))
+
+    async def _end(self, reason: str):
+        logger.info(f"Ending call: {reason}")
+        try:
+            await self._hangup(reason)
+        finally:
+            self.closed()
+
+    def closed(self):
+        """The room is gone; release timers and wake the job coroutine."""
+        self._cancel_timers()
+        self._done.set()
+
+    def _cancel_timers(self):
+        for timer in (self._max_timer, self._idle_timer, self._empty_timer):
+            if timer is not None:
+                timer.cancel()
+        self._idle_timer = self._empty_timer = None
+
+    async def wait(self):
+        await self._done.wait()
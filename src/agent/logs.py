@@ -0,0 +1,190 @@
+"""Structured, non-blocking logging for the agent.
+
+Records are handed to a bounded queue on the calling thread and formatted and
+written by a listener thread, so the event loop never blocks on stdout. Each
+record carries the current call's correlation id. Noisy events can be sampled,
+and email addresses and OTP codes are masked before anything is written.
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import logging
+import os
+import logging.handlers
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import UTC, datetime
+from typing import Any, Dict, Optional
+
+from .config import Settings, get_settings
+
+LOGGER_NAME = "shop_agent"
+
+_call_id: contextvars.ContextVar[str] = contextvars.ContextVar("shop_call_id", default="")
+
+_EMAIL = re.compile(r"\b([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})\b")
+_OTP = re.compile(r"\b\d{6}\b")
+_SECRET_FIELDS = {"otp", "otp_code", "code", "password"}
+
+_RECORD_ATTRS = set(logging.makeLogRecord({}).__dict__) | {"message", "asctime"}
+
+
+def bind_call_id(call_id: str) -> contextvars.Token:
+    """Tag every record logged from this context, and tasks it spawns, with call_id."""
+    return _call_id.set(call_id)
+
+
+def current_call_id() -> str:
+    return _call_id.get()
+
+
+def redact(text: str) -> str:
+    """Mask email addresses (keeping the first letter and domain) and six-digit codes."""
+    text = _EMAIL.sub(r"\1***@\2", text)
+    return _OTP.sub("******", text)
+
+
+def _redact_field(key: str, value: Any) -> Any:
+    if key in _SECRET_FIELDS:
+        return "******"
+    if isinstance(value, str):
+        return redact(value)
+    return value
+
+
+def log_event(logger: logging.Logger, event: str, message: str, level: int = logging.INFO, **fields: Any):
+    """Log a named event with structured fields; the name is what sampling keys on."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, **fields})
+
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the call id while still on the logging thread's context."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if not getattr(record, "call_id", None):
+            record.call_id = _call_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of records for configured events; warnings and errors always pass."""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        rate = self.rates.get(getattr(record, "event", ""), 1.0)
+        return rate >= 1.0 or random.random() < rate
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, redact_pii: bool = True):
+        super().__init__()
+        self.redact_pii = redact_pii
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=UTC).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": redact(message) if self.redact_pii else message,
+        }
+        if getattr(record, "call_id", ""):
+            entry["call_id"] = record.call_id
+        for key, value in record.__dict__.items():
+            if key in _RECORD_ATTRS or key == "call_id":
+                continue
+            entry[key] = _redact_field(key, value) if self.redact_pii else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self, redact_pii: bool = True):
+        super().__init__("[%(levelname)s] %(message)s")
+        self.redact_pii = redact_pii
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        return redact(text) if self.redact_pii else text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking or raising when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge args now (they may be mutated later) but leave formatting to the listener
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_pid = 0
+_configure_lock = threading.Lock()
+
+
+def configure_logging(settings: Optional[Settings] = None) -> logging.Logger:
+    """Install the queue-backed handler on the shop_agent logger once per process."""
+    global _listener, _listener_pid
+    logger = logging.getLogger(LOGGER_NAME)
+    with _configure_lock:
+        # A forked job process inherits the listener object but not its thread
+        if _listener is not None and _listener_pid == os.getpid():
+            return logger
+        s = settings or get_settings()
+
+        stream = logging.StreamHandler(sys.stdout)
+        if s.log_format == "json":
+            stream.setFormatter(JsonFormatter(s.log_redact_pii))
+        else:
+            stream.setFormatter(TextFormatter(s.log_redact_pii))
+
+        handler = DroppingQueueHandler(queue.Queue(maxsize=s.log_queue_size))
+        handler.addFilter(CorrelationFilter())
+        handler.addFilter(SamplingFilter(dict(s.log_sample_rates)))
+
+        logger.handlers = [handler]
+        logger.setLevel(s.log_level.upper())
+        logger.propagate = False
+
+        _listener = logging.handlers.QueueListener(handler.queue, stream, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = os.getpid()
+        atexit.register(shutdown_logging)
+    return logger
+
+
+def shutdown_logging():
+    """Flush queued records; call before the process exits."""
+    global _listener
+    with _configure_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            _listener.stop()
+        _listener = None
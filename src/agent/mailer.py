@@ -0,0 +1,361 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import random
+import smtplib
+import threading
+import time
+import weakref
+from dataclasses import dataclass
+from email.mime.text import MIMEText
+from typing import List, Optional, Protocol
+
+from .config import Settings, get_settings
+from .logs import log_event
+
+logger = logging.getLogger("shop_agent")
+
+OTP_EMAIL = "otp"
+ORDER_CONFIRMATION_EMAIL = "order_confirmation"
+
+
+def build_otp_message(email: str, otp_code: str, from_email: str, ttl_minutes: int = 10) -> MIMEText:
+    """Build the OTP verification email."""
+    msg = MIMEText(f"Your Zenitheon verification code is: {otp_code}\n\nThis code will expire in {ttl_minutes} minutes.")
+    msg["Subject"] = "Zenitheon Order Verification Code"
+    msg["From"] = from_email
+    msg["To"] = email
+    return msg
+
+
+def build_order_confirmation_message(
+    email: str,
+    customer_name: str,
+    product: str,
+    order_id: str,
+    tracking_id: str,
+    from_email: str,
+) -> MIMEText:
+    """Build the order confirmation email with tracking ID and order ID."""
+    email_body = f"""Dear {customer_name},
+
+Thank you for your order with Zenitheon!
+
+Order Details:
+- Product: {product}
+- Order ID: {order_id}
+- Tracking ID: {tracking_id}
+
+Your order has been confirmed and will be processed shortly.
+
+Thank you for shopping with Zenitheon. Have a stylish day!
+
+Best regards,
+Zenitheon Team
+"""
+    msg = MIMEText(email_body)
+    msg["Subject"] = f"Zenitheon Order Confirmation - {order_id}"
+    msg["From"] = from_email
+    msg["To"] = email
+    return msg
+
+
+@dataclass
+class OutgoingEmail:
+    kind: str
+    message: MIMEText
+    attempts: int = 0
+
+    @property
+    def recipient(self) -> str:
+        return self.message["To"]
+
+
+class EmailTransport(Protocol):
+    def send_batch(self, messages: List[MIMEText]) -> List[Optional[Exception]]: ...
+
+    def warm(self) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class SmtpConnectionPool:
+    """Thread-safe pool of authenticated SMTP connections reused across messages."""
+
+    def __init__(self, settings: Settings):
+        self.settings = settings
+        self._idle: List[smtplib.SMTP] = []
+        self._lock = threading.Lock()
+
+    def _connect(self) -> smtplib.SMTP:
+        s = self.settings
+        started = time.perf_counter()
+        server = smtplib.SMTP(s.smtp_server, s.smtp_port, timeout=s.smtp_timeout_seconds)
+        try:
+            if s.smtp_use_tls:
+                server.starttls()
+            if s.smtp_username and s.smtp_password:
+                server.login(s.smtp_username, s.smtp_password)
+        except Exception:
+            server.close()
+            raise
+        logger.info(f"SMTP connection opened in {(time.perf_counter() - started) * 1000:.0f} ms")
+        return server
+
+    def _acquire(self) -> smtplib.SMTP:
+        while True:
+            with self._lock:
+                server = self._idle.pop() if self._idle else None
+            if server is None:
+                return self._connect()
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._discard(server)
+
+    def _release(self, server: smtplib.SMTP):
+        with self._lock:
+            if len(self._idle) < self.settings.smtp_pool_size:
+                self._idle.append(server)
+                return
+        self._discard(server)
+
+    def _discard(self, server: smtplib.SMTP):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+
+    def send_batch(self, messages: List[MIMEText]) -> List[Optional[Exception]]:
+        """Send messages over one pooled connection, returning the error (if any) per message."""
+        try:
+            server = self._acquire()
+        except Exception as e:
+            return [e] * len(messages)
+
+        errors: List[Optional[Exception]] = []
+        healthy = True
+        for msg in messages:
+            if not healthy:
+                errors.append(ConnectionError("SMTP connection lost earlier in batch"))
+                continue
+            try:
+                server.send_message(msg)
+                errors.append(None)
+            except smtplib.SMTPRecipientsRefused as e:
+                # The server rejected this recipient; the connection is still usable.
+                errors.append(e)
+            except Exception as e:
+                errors.append(e)
+                healthy = False
+
+        if healthy:
+            self._release(server)
+        else:
+            self._discard(server)
+        return errors
+
+    def warm(self):
+        """Open a connection ahead of demand so the next send skips the handshake."""
+        with self._lock:
+            if self._idle:
+                return
+        self._release(self._connect())
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server in idle:
+            self._discard(server)
+
+
+class Mailer:
+    """Bounded background email queue bound to one event loop.
+
+    Tool handlers enqueue and return immediately; workers deliver through the
+    shared transport in a thread, batch order confirmations and retry failures
+    with exponential backoff.
+    """
+
+    def __init__(self, transport: EmailTransport, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.transport = transport
+        self.queue: asyncio.Queue[OutgoingEmail] = asyncio.Queue(maxsize=self.settings.email_queue_size)
+        self._workers: List[asyncio.Task] = []
+        self._background: set[asyncio.Task] = set()
+        self.sent = 0
+        self.failed = 0
+
+    def _ensure_started(self):
+        if self._workers:
+            return
+        for _ in range(max(1, self.settings.smtp_pool_size)):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    def enqueue(self, kind: str, message: MIMEText) -> bool:
+        """Queue a message for delivery. Returns False if the queue is full."""
+        self._ensure_started()
+        try:
+            self.queue.put_nowait(OutgoingEmail(kind=kind, message=message))
+            return True
+        except asyncio.QueueFull:
+            logger.warning(f"Email queue full - dropping {kind} email to {message['To']}")
+            return False
+
+    def warm(self) -> asyncio.Task:
+        """Warm a transport connection in the background; the task's result is whether it worked."""
+
+        async def warm() -> bool:
+            try:
+                await asyncio.to_thread(self.transport.warm)
+                return True
+            except Exception as e:
+                logger.warning(f"Could not warm email transport: {e}")
+                return False
+
+        return self._spawn(warm())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        return task
+
+    async def _next_batch(self) -> List[OutgoingEmail]:
+        first = await self.queue.get()
+        batch = [first]
+        if first.kind != ORDER_CONFIRMATION_EMAIL:
+            return batch
+
+        deadline = asyncio.get_running_loop().time() + self.settings.email_batch_window_ms / 1000
+        while len(batch) < self.settings.email_batch_size:
+            timeout = deadline - asyncio.get_running_loop().time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker(self):
+        while True:
+            batch = await self._next_batch()
+            try:
+                errors = await asyncio.to_thread(self.transport.send_batch, [item.message for item in batch])
+            except Exception as e:
+                errors = [e] * len(batch)
+
+            for item, error in zip(batch, errors):
+                if error is None:
+                    self.sent += 1
+                    log_event(logger, "email_sent", f"{item.kind} email sent", kind=item.kind, recipient=item.recipient)
+                else:
+                    self._retry(item, error)
+                self.queue.task_done()
+
+    def _retry(self, item: OutgoingEmail, error: Exception):
+        item.attempts += 1
+        if item.attempts > self.settings.email_max_retries:
+            self.failed += 1
+            logger.error(f"Giving up on {item.kind} email to {item.recipient} after {item.attempts} attempts: {error}")
+            return
+
+        delay = self.settings.email_retry_base_seconds * (2 ** (item.attempts - 1))
+        delay *= 1 + random.random() * 0.25
+        logger.warning(f"Error sending {item.kind} email to {item.recipient}: {error} - retrying in {delay:.1f}s")
+
+        async def requeue():
+            await asyncio.sleep(delay)
+            await self.queue.put(item)
+
+        self._spawn(requeue())
+
+    async def drain(self, timeout: float = 10.0):
+        """Wait for queued and retrying messages to finish, up to timeout seconds."""
+        if not self._workers:
+            return
+
+        async def wait_all():
+            while True:
+                await self.queue.join()
+                if not self._background:
+                    return
+                await asyncio.gather(*list(self._background), return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(wait_all(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Email queue not drained after {timeout}s ({self.queue.qsize()} pending)")
+
+    async def close(self):
+        await self.drain()
+        for task in self._workers + list(self._background):
+            task.cancel()
+        await asyncio.gather(*self._workers, *self._background, return_exceptions=True)
+        self._workers.clear()
+
+
+_transport: Optional[EmailTransport] = None
+_mailers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Mailer]" = weakref.WeakKeyDictionary()
+
+
+def get_transport() -> EmailTransport:
+    """Process-wide transport; connections are shared by every job in the process."""
+    global _transport
+    if _transport is None:
+        _transport = SmtpConnectionPool(get_settings())
+    return _transport
+
+
+def set_transport(transport: EmailTransport):
+    """Replace the process-wide transport (for example with a capturing sink)."""
+    global _transport
+    _transport = transport
+    _mailers.clear()
+
+
+def get_mailer() -> Mailer:
+    """Mailer for the running event loop."""
+    loop = asyncio.get_running_loop()
+    mailer = _mailers.get(loop)
+    if mailer is None:
+        mailer = Mailer(get_transport())
+        _mailers[loop] = mailer
+    return mailer
+
+
+def smtp_configured(settings: Optional[Settings] = None) -> bool:
+    s = settings or get_settings()
+    if not s.smtp_auth:
+        return bool(s.smtp_server)
+    return bool(s.smtp_username and s.smtp_password)
+
+
+def queue_otp_email(email: str, otp_code: str) -> bool:
+    """Queue an OTP email. Falls back to printing the code when SMTP is not configured."""
+    s = get_settings()
+    if not smtp_configured(s):
+        # OTP codes are masked unless LOG_REDACT_PII=false (useful in local development)
+        log_event(logger, "otp_not_sent", f"SMTP credentials not configured. OTP for {email}: {otp_code}", email=email)
+        return False
+    msg = build_otp_message(email, otp_code, s.from_email or s.smtp_username or "", max(1, s.otp_ttl_seconds // 60))
+    return get_mailer().enqueue(OTP_EMAIL, msg)
+
+
+def queue_order_confirmation_email(email: str, customer_name: str, product: str, order_id: str, tracking_id: str) -> bool:
+    """Queue an order confirmation email. Falls back to printing the IDs when SMTP is not configured."""
+    s = get_settings()
+    if not smtp_configured(s):
+        log_event(
+            logger, "order_email_not_sent", "SMTP credentials not configured. Order confirmation email not sent.",
+            email=email, order_id=order_id, tracking_id=tracking_id,
+        )
+        return False
+    msg = build_order_confirmation_message(
+        email, customer_name, product, order_id, tracking_id, s.from_email or s.smtp_username or ""
+    )
+    return get_mailer().enqueue(ORDER_CONFIRMATION_EMAIL, msg)
@@ -5,6 +5,7 @@ from dotenv import load_dotenv
 
 from livekit import agents
 
+from .capacity import CapacityMonitor, worker_options_kwargs
 from .core import ShopAgent
 from .config import get_settings
 
@@ -44,8 +45,12 @@ def prepare_agent():
     print(f"API Key: {settings.livekit_api_key[:10]}..." if settings.livekit_api_key else "API Key: NOT SET")
     print(f"API Secret: {'SET' if settings.livekit_api_secret else 'NOT SET'}")
     print("=" * 60)
-    print("Agent configured for AUTO-DISPATCH")
-    print("(Agent will automatically join rooms when participants connect)")
+    if settings.agent_name:
+        print(f"Agent configured for EXPLICIT DISPATCH as '{settings.agent_name}'")
+        print("(The web server dispatches the agent to each room it hands out)")
+    else:
+        print("Agent configured for AUTO-DISPATCH")
+        print("(Agent will automatically join rooms when participants connect)")
     print("=" * 60)
     print("Waiting for room connections...")
     print("(Check logs below when a participant joins a room)")
@@ -59,15 +64,21 @@ def main():
     agent = prepare_agent()
     if agent is None:
         return
+
+    monitor = CapacityMonitor()
+    monitor.start()
+    print(f"Capacity: {monitor.cores} cores, up to {monitor.max_calls} calls, {monitor.idle_processes} idle job processes")
+    print("=" * 60)
     
     # The CLI will call this with the appropriate command (dev/start)
-    # Note: When agent_name is set, agents require explicit dispatch
-    # Remove agent_name to allow auto-dispatch, or use explicit dispatch in token/API
+    # Note: When agent_name is set, agents require explicit dispatch, which
+    # /api/token performs; leave AGENT_NAME unset to allow auto-dispatch
     agents.cli.run_app(
         agents.WorkerOptions(
             entrypoint_fnc=agent.entrypoint,
-            # agent_name="shop-whisper-agent",  # Commented out to allow auto-dispatch
-            job_memory_warn_mb=1024,
+            prewarm_fnc=agent.prewarm,
+            agent_name=get_settings().agent_name or "",
+            **worker_options_kwargs(monitor),
         ),
     )
 
@@ -0,0 +1,209 @@
+from __future__ import annotations
+
+import argparse
+import atexit
+import csv
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import astuple
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+from .config import get_settings
+from .types import OrderResult
+
+ORDER_COLUMNS = ["timestamp", "customer_name", "product", "email", "order_id", "tracking_id", "summary"]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    customer_name TEXT NOT NULL,
+    product TEXT NOT NULL,
+    email TEXT NOT NULL,
+    order_id TEXT NOT NULL UNIQUE,
+    tracking_id TEXT NOT NULL,
+    summary TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS orders_email ON orders (email);
+"""
+
+_INSERT = f"INSERT INTO orders ({', '.join(ORDER_COLUMNS)}) VALUES ({', '.join('?' * len(ORDER_COLUMNS))})"
+
+_STOP = object()
+
+
+def _connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.executescript(_SCHEMA)
+    return conn
+
+
+class OrderLedger:
+    """Durable order store with a group-commit writer thread.
+
+    Orders from every job in the process are queued and committed together in
+    one transaction per interval, so a burst of orders costs one fsync instead
+    of one per row. SQLite locking makes the file safe to share across worker
+    processes, and order_id and email are indexed for lookups.
+    """
+
+    def __init__(self, path: str, commit_interval_ms: int = 50, max_batch: int = 256):
+        self.path = path
+        self.commit_interval = commit_interval_ms / 1000
+        self.max_batch = max_batch
+        self._queue: queue.Queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        # Both connections (and the schema) are opened here, at startup, not on a call's first order
+        self._reader = _connect(path)
+        self._conn = _connect(path)
+        self._writer = threading.Thread(target=self._run, name="order-ledger", daemon=True)
+        self._writer.start()
+
+    def append(self, result: OrderResult) -> Future:
+        """Queue an order; the future resolves once its batch has been committed."""
+        future: Future = Future()
+        self._queue.put((result, future))
+        return future
+
+    def _run(self):
+        conn = self._conn
+        while True:
+            item = self._queue.get()
+            if item is _STOP:
+                break
+            batch: List[Tuple[OrderResult, Future]] = [item]
+            deadline = time.monotonic() + self.commit_interval
+            stopping = False
+            while len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._commit(conn, batch)
+            if stopping:
+                break
+        conn.close()
+
+    def _commit(self, conn: sqlite3.Connection, batch: List[Tuple[OrderResult, Future]]):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(_INSERT, [astuple(result) for result, _ in batch])
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            # One bad row (e.g. a duplicate order_id) must not reject everyone else's order
+            conn.execute("ROLLBACK")
+            self._commit_rows(conn, batch)
+            return
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for result, future in batch:
+            future.set_result(result)
+
+    def _commit_rows(self, conn: sqlite3.Connection, batch: List[Tuple[OrderResult, Future]]):
+        """Insert a batch row by row, failing only the rows that violate a constraint; still one commit."""
+        outcomes: List[Optional[Exception]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for result, _ in batch:
+                conn.execute("SAVEPOINT row")
+                try:
+                    conn.execute(_INSERT, astuple(result))
+                    outcomes.append(None)
+                except sqlite3.IntegrityError as e:
+                    conn.execute("ROLLBACK TO row")
+                    outcomes.append(e)
+                conn.execute("RELEASE row")
+            conn.execute("COMMIT")
+        except Exception as e:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (result, future), error in zip(batch, outcomes):
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self, timeout: float = 10.0):
+        """Commit everything still queued and stop the writer."""
+        if self._writer.is_alive():
+            self._queue.put(_STOP)
+            self._writer.join(timeout)
+        with self._read_lock:
+            self._reader.close()
+
+    def _query(self, sql: str, params: tuple = ()) -> List[OrderResult]:
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        return [OrderResult(*row) for row in rows]
+
+    def find(self, order_id: str) -> Optional[OrderResult]:
+        rows = self._query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders WHERE order_id = ?", (order_id,))
+        return rows[0] if rows else None
+
+    def by_email(self, email: str) -> List[OrderResult]:
+        return self._query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders WHERE email = ? ORDER BY id", (email,))
+
+    def export_csv(self, path: str) -> int:
+        """Write all orders to a CSV file in the legacy orders.csv format."""
+        orders = self._query(f"SELECT {', '.join(ORDER_COLUMNS)} FROM orders ORDER BY id")
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(ORDER_COLUMNS)
+            writer.writerows(astuple(order) for order in orders)
+        return len(orders)
+
+
+@lru_cache(maxsize=1)
+def get_order_ledger() -> OrderLedger:
+    s = get_settings()
+    ledger = OrderLedger(s.orders_db_path, commit_interval_ms=s.orders_commit_interval_ms)
+    atexit.register(ledger.close)
+    return ledger
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the order ledger.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Export all orders to CSV")
+    export.add_argument("path", nargs="?", default="orders.csv")
+    find = sub.add_parser("find", help="Look up an order by order ID or email")
+    find.add_argument("key")
+    args = parser.parse_args()
+
+    ledger = get_order_ledger()
+    if args.command == "export":
+        count = ledger.export_csv(args.path)
+        print(f"Exported {count} orders to {args.path}")
+    elif args.command == "find":
+        orders = ledger.by_email(args.key) if "@" in args.key else [o for o in [ledger.find(args.key)] if o]
+        for order in orders:
+            print(order)
+        if not orders:
+            print("No matching orders")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import hashlib
+import heapq
+import hmac
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from enum import Enum
+from functools import lru_cache
+from typing import Dict, List, Protocol, Tuple
+
+from .config import get_settings
+
+
+class OtpStatus(Enum):
+    VERIFIED = "verified"
+    INVALID = "invalid"
+    EXPIRED = "expired"
+    NOT_FOUND = "not_found"
+    LOCKED = "locked"
+
+
+class OtpStore(Protocol):
+    """Blocking store; async callers run it with asyncio.to_thread."""
+
+    def issue(self, email: str, code: str) -> bool:
+        """Store a new code; False (nothing stored) while the email is locked out."""
+        ...
+
+    def verify(self, email: str, code: str) -> OtpStatus: ...
+
+
+def _digest(email: str, code: str) -> str:
+    return hashlib.sha256(f"{email}:{code}".encode("utf-8")).hexdigest()
+
+
+@dataclass(slots=True)
+class _OtpEntry:
+    digest: str
+    expires_at: float
+    attempts: int = 0
+    generation: int = 0
+
+
+class MemoryOtpStore:
+    """In-process OTP store with heap-based TTL eviction and per-email attempt limits."""
+
+    def __init__(self, ttl_seconds: float = 600, max_attempts: int = 5):
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self._entries: Dict[str, _OtpEntry] = {}
+        self._expiry: List[Tuple[float, int, str]] = []
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float):
+        while self._expiry and self._expiry[0][0] <= now:
+            _, generation, email = heapq.heappop(self._expiry)
+            entry = self._entries.get(email)
+            if entry is not None and entry.generation == generation:
+                del self._entries[email]
+
+    def issue(self, email: str, code: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            previous = self._entries.get(email)
+            if previous is not None and previous.attempts >= self.max_attempts:
+                # Locked until the original code expires; a resend must not push that out
+                return False
+            self._generation += 1
+            # A resent code keeps the failed attempts made against the previous one
+            entry = _OtpEntry(
+                digest=_digest(email, code),
+                expires_at=now + self.ttl_seconds,
+                attempts=previous.attempts if previous is not None else 0,
+                generation=self._generation,
+            )
+            self._entries[email] = entry
+            heapq.heappush(self._expiry, (entry.expires_at, entry.generation, email))
+            return True
+
+    def verify(self, email: str, code: str) -> OtpStatus:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry.expires_at <= now:
+                del self._entries[email]
+                self._evict_expired(now)
+                return OtpStatus.EXPIRED
+            self._evict_expired(now)
+            if entry is None:
+                return OtpStatus.NOT_FOUND
+            if entry.attempts >= self.max_attempts:
+                return OtpStatus.LOCKED
+
+            if hmac.compare_digest(entry.digest, _digest(email, code)):
+                del self._entries[email]
+                return OtpStatus.VERIFIED
+
+            # A locked entry stays until it expires, so resending cannot reset the limit
+            entry.attempts += 1
+            return OtpStatus.LOCKED if entry.attempts >= self.max_attempts else OtpStatus.INVALID
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._evict_expired(time.monotonic())
+            return len(self._entries)
+
+
+class SqliteOtpStore:
+    """OTP store in a shared SQLite WAL database so every worker process can verify codes."""
+
+    def __init__(self, path: str, ttl_seconds: float = 600, max_attempts: int = 5):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_attempts = max_attempts
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=5.0, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS otp_codes ("
+            "email TEXT PRIMARY KEY, digest TEXT NOT NULL, expires_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS otp_codes_expires_at ON otp_codes (expires_at)")
+
+    def issue(self, email: str, code: str) -> bool:
+        # Wall-clock time: expiry has to agree across processes.
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM otp_codes WHERE expires_at <= ?", (now,))
+                row = self._conn.execute("SELECT attempts FROM otp_codes WHERE email = ?", (email,)).fetchone()
+                if row is not None and row[0] >= self.max_attempts:
+                    # Locked until the original code expires; a resend must not push that out
+                    self._conn.execute("COMMIT")
+                    return False
+                # A resent code keeps the failed attempts made against the previous one
+                self._conn.execute(
+                    "INSERT INTO otp_codes (email, digest, expires_at, attempts) VALUES (?, ?, ?, 0) "
+                    "ON CONFLICT (email) DO UPDATE SET digest = excluded.digest, expires_at = excluded.expires_at",
+                    (email, _digest(email, code), now + self.ttl_seconds),
+                )
+                self._conn.execute("COMMIT")
+                return True
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def verify(self, email: str, code: str) -> OtpStatus:
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                status = self._verify_locked(email, code, now)
+                self._conn.execute("COMMIT")
+                return status
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _verify_locked(self, email: str, code: str, now: float) -> OtpStatus:
+        row = self._conn.execute(
+            "SELECT digest, expires_at, attempts FROM otp_codes WHERE email = ?", (email,)
+        ).fetchone()
+        if row is None:
+            return OtpStatus.NOT_FOUND
+
+        digest, expires_at, attempts = row
+        if expires_at <= now:
+            self._conn.execute("DELETE FROM otp_codes WHERE email = ?", (email,))
+            return OtpStatus.EXPIRED
+        if attempts >= self.max_attempts:
+            return OtpStatus.LOCKED
+
+        if hmac.compare_digest(digest, _digest(email, code)):
+            self._conn.execute("DELETE FROM otp_codes WHERE email = ?", (email,))
+            return OtpStatus.VERIFIED
+
+        # A locked row stays until it expires, so resending cannot reset the limit
+        attempts += 1
+        self._conn.execute("UPDATE otp_codes SET attempts = ? WHERE email = ?", (attempts, email))
+        return OtpStatus.LOCKED if attempts >= self.max_attempts else OtpStatus.INVALID
+
+
+def create_otp_store(backend: str = "memory") -> OtpStore:
+    """Create the OTP store for the configured backend ("memory" or "sqlite")."""
+    s = get_settings()
+    if backend == "memory":
+        return MemoryOtpStore(ttl_seconds=s.otp_ttl_seconds, max_attempts=s.otp_max_attempts)
+    if backend == "sqlite":
+        return SqliteOtpStore(s.otp_db_path, ttl_seconds=s.otp_ttl_seconds, max_attempts=s.otp_max_attempts)
+    raise ValueError(f"Unknown OTP backend: {backend}")
+
+
+@lru_cache(maxsize=1)
+def get_otp_store() -> OtpStore:
+    return create_otp_store(get_settings().otp_backend)
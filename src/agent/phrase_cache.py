@@ -0,0 +1,207 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+from livekit import rtc
+
+from .constants import ScriptVariables
+
+logger = logging.getLogger("shop_agent")
+
+FRAME_MS = 20
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_phrase(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def phrase_key(voice_id: str, model: str, sample_rate: int, text: str) -> str:
+    raw = f"{voice_id}\x00{model}\x00{sample_rate}\x00{normalize_phrase(text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+SCRIPT_LINE_FIELDS = (
+    "intro_greeting",
+    "needs_assessment",
+    "product_selection_prompt",
+    "product_confirmation",
+    "email_request",
+    "otp_request",
+    "otp_retry",
+    "order_confirmation",
+    "provider_apology",
+)
+
+
+def static_script_lines(script: ScriptVariables) -> List[str]:
+    """Script lines that contain no placeholders and can be rendered ahead of time."""
+    lines = [getattr(script, name) for name in SCRIPT_LINE_FIELDS]
+    return [line for line in lines if line and "{" not in line]
+
+
+class PhraseAudioCache:
+    """Size-bounded LRU of synthesized PCM keyed by voice, model, sample rate and text.
+
+    Entries live in memory and in a directory of raw 16-bit mono PCM files so
+    a fresh worker process can pick up audio rendered by an earlier one.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        voice_id: str,
+        model: str,
+        sample_rate: int,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.voice_id = voice_id
+        self.model = model
+        self.sample_rate = sample_rate
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self._memory_bytes = 0
+        self._phrases: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, text: str) -> str:
+        return phrase_key(self.voice_id, self.model, self.sample_rate, text)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pcm")
+
+    @property
+    def phrases(self) -> List[str]:
+        """Normalized texts known to the cache, used for exact-match lookups."""
+        return list(self._phrases)
+
+    def register(self, texts: Iterable[str]):
+        """Declare phrases that should be served from the cache once rendered."""
+        for text in texts:
+            self._phrases[normalize_phrase(text)] = self.key(text)
+
+    def get(self, text: str, record: bool = True) -> Optional[bytes]:
+        key = self.key(text)
+        with self._lock:
+            pcm = self._memory.get(key)
+            if pcm is not None:
+                self._memory.move_to_end(key)
+        if pcm is None:
+            path = self._path(key)
+            try:
+                with open(path, "rb") as f:
+                    pcm = f.read()
+                os.utime(path)
+                self._remember(key, pcm)
+            except OSError:
+                pcm = None
+
+        if record:
+            if pcm is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return pcm
+
+    def put(self, text: str, pcm: bytes):
+        key = self.key(text)
+        self._phrases[normalize_phrase(text)] = key
+        self._remember(key, pcm)
+        tmp_path = f"{self._path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(pcm)
+        os.replace(tmp_path, self._path(key))
+        self._evict_disk()
+
+    def _remember(self, key: str, pcm: bytes):
+        with self._lock:
+            previous = self._memory.pop(key, None)
+            if previous is not None:
+                self._memory_bytes -= len(previous)
+            self._memory[key] = pcm
+            self._memory_bytes += len(pcm)
+            while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+                _, evicted = self._memory.popitem(last=False)
+                self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pcm"):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+                total -= size
+            except OSError:
+                pass
+
+    def load(self, texts: Iterable[str]) -> List[str]:
+        """Register phrases and pull any rendered ones from disk; returns those still missing."""
+        missing = []
+        for text in texts:
+            self.register([text])
+            if self.get(text, record=False) is None:
+                missing.append(text)
+        return missing
+
+    def frames(self, pcm: bytes) -> AsyncIterator[rtc.AudioFrame]:
+        return pcm_frames(pcm, self.sample_rate)
+
+
+async def pcm_frames(pcm: bytes, sample_rate: int) -> AsyncIterator[rtc.AudioFrame]:
+    """Split 16-bit mono PCM into 20 ms audio frames."""
+    samples_per_frame = sample_rate * FRAME_MS // 1000
+    frame_bytes = samples_per_frame * 2
+    for i in range(0, len(pcm), frame_bytes):
+        chunk = pcm[i:i + frame_bytes]
+        yield rtc.AudioFrame(
+            data=chunk,
+            sample_rate=sample_rate,
+            num_channels=1,
+            samples_per_channel=len(chunk) // 2,
+        )
+
+
+async def synthesize_pcm(tts, text: str) -> bytes:
+    """Render text through a LiveKit TTS and collect the raw PCM."""
+    pcm = bytearray()
+    async with tts.synthesize(text) as stream:
+        async for event in stream:
+            pcm.extend(event.frame.data.tobytes())
+    return bytes(pcm)
+
+
+async def prerender(cache: PhraseAudioCache, tts, texts: Iterable[str]) -> int:
+    """Synthesize and cache any of the given phrases that are not cached yet."""
+    rendered = 0
+    for text in texts:
+        if cache.get(text, record=False) is not None:
+            continue
+        try:
+            cache.put(text, await synthesize_pcm(tts, text))
+            rendered += 1
+        except Exception as e:
+            logger.warning(f"Could not prerender phrase audio: {e}")
+    return rendered
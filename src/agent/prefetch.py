@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from .mailer import get_mailer, smtp_configured
+
+logger = logging.getLogger("shop_agent")
+
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(\.[\w-]+)+")
+
+SEND_OTP = "send_otp"
+
+
+@dataclass
+class PrefetchStats:
+    issued: int = 0
+    hits: int = 0
+    misses: int = 0
+    wasted: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def merge(self, other: "PrefetchStats"):
+        self.issued += other.issued
+        self.hits += other.hits
+        self.misses += other.misses
+        self.wasted += other.wasted
+
+    def __str__(self) -> str:
+        return f"{self.hits} hits, {self.misses} misses ({self.hit_rate:.0%}), {self.issued} issued, {self.wasted} wasted"
+
+
+class Prefetcher:
+    """Per-call speculative execution of the tool the script is about to need.
+
+    Interim transcripts and collect_data stage updates are watched for the
+    signals that precede a slow tool call. Today that is send_otp: once an
+    email is spoken or collected, an SMTP connection (DNS, TCP, TLS and login)
+    is warmed so the OTP goes out without the handshake. Only work that costs
+    real time belongs here; catalog lookups are already in memory.
+    """
+
+    def __init__(self):
+        self._ready: Dict[Tuple[str, str], Any] = {}
+        self.stats = PrefetchStats()
+
+    def _prefetch(self, tool: str, key: str, compute: Callable[[], Any]):
+        if (tool, key) in self._ready:
+            return
+        try:
+            self._ready[(tool, key)] = compute()
+            self.stats.issued += 1
+        except Exception as e:
+            logger.warning(f"Prefetch of {tool} failed: {e}")
+
+    def take(self, tool: str, key: str) -> Optional[Any]:
+        """Claim a prefetched result; None (a miss) means the tool must do the work itself.
+
+        Background work (a task) only counts as a hit once it has finished and
+        returned something truthy: still running or failed is a miss.
+        """
+        result = self._ready.pop((tool, key), None)
+        if isinstance(result, asyncio.Future):
+            finished = result.done() and not result.cancelled() and result.exception() is None
+            result = result.result() if finished else None
+        if not result:
+            self.stats.misses += 1
+            return None
+        self.stats.hits += 1
+        return result
+
+    def observe_transcript(self, text: str):
+        """Look for an email address in a (possibly interim) transcript."""
+        if _EMAIL.search(text):
+            self.warm_email()
+
+    def observe_stage(self, stage: str):
+        """React to collect_data script stage updates."""
+        if stage in ("email_collection", "otp_verification"):
+            self.warm_email()
+
+    def warm_email(self):
+        """Open an SMTP connection ahead of send_otp."""
+        if not smtp_configured():
+            return
+
+        # The warm-up task resolves to whether the connection was opened
+        self._prefetch(SEND_OTP, "", lambda: get_mailer().warm())
+
+    def close(self) -> PrefetchStats:
+        """Count unused prefetches as wasted and return the call's stats."""
+        self.stats.wasted += len(self._ready)
+        self._ready.clear()
+        return self.stats
@@ -1,9 +1,13 @@
 from .stt import create_stt_provider
 from .llm import create_llm_provider
 from .tts import create_tts_provider
+from .pool import ProviderPool, close_provider_pool, get_provider_pool
 
 __all__ = [
     "create_stt_provider",
     "create_llm_provider", 
     "create_tts_provider",
+    "ProviderPool",
+    "get_provider_pool",
+    "close_provider_pool",
 ]
@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import asyncio
+import random
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Callable, Dict, List, Optional
+
+from ..types import Transcript
+
+
+@dataclass
+class LatencyProfile:
+    """Simulated provider latency: a base delay plus gaussian jitter, in milliseconds."""
+    base_ms: float = 0.0
+    jitter_ms: float = 0.0
+    per_unit_ms: float = 0.0
+
+    def sample(self, rng: random.Random, units: int = 0) -> float:
+        delay = self.base_ms + units * self.per_unit_ms
+        if self.jitter_ms:
+            delay += rng.gauss(0.0, self.jitter_ms)
+        return max(0.0, delay) / 1000
+
+
+class InjectedFault(ConnectionError):
+    """A failure raised on purpose by a fake provider."""
+
+
+@dataclass
+class FaultProfile:
+    """Simulated provider faults: a share of requests that fail or stall, or a full outage."""
+    error_rate: float = 0.0
+    stall_rate: float = 0.0
+    stall_ms: float = 30000.0
+    down: bool = False
+
+    @classmethod
+    def parse(cls, spec: str) -> "FaultProfile":
+        """Parse "error=0.2,stall=0.05,stall_ms=5000" or "down"."""
+        profile = cls()
+        for part in filter(None, (p.strip() for p in spec.split(","))):
+            key, _, value = part.partition("=")
+            if key == "down":
+                profile.down = True
+            elif key == "error":
+                profile.error_rate = float(value)
+            elif key == "stall":
+                profile.stall_rate = float(value)
+            elif key == "stall_ms":
+                profile.stall_ms = float(value)
+            else:
+                raise ValueError(f"Unknown fault {key!r}")
+        return profile
+
+    async def inject(self, rng: random.Random):
+        if self.down:
+            raise InjectedFault("provider down")
+        roll = rng.random()
+        if roll < self.error_rate:
+            raise InjectedFault("injected error")
+        if roll < self.error_rate + self.stall_rate:
+            await asyncio.sleep(self.stall_ms / 1000)
+
+
+class FakeSTT:
+    """Deterministic stand-in for STT: the audio bytes are the UTF-8 transcript."""
+
+    def __init__(self, latency: Optional[LatencyProfile] = None, seed: int = 0, faults: Optional[FaultProfile] = None):
+        self.latency = latency or LatencyProfile()
+        self.faults = faults or FaultProfile()
+        self._rng = random.Random(seed)
+
+    async def transcribe(self, audio: bytes, sample_rate: int) -> str:
+        await self.faults.inject(self._rng)
+        await asyncio.sleep(self.latency.sample(self._rng))
+        return audio.decode("utf-8", errors="ignore")
+
+    async def transcribe_stream(self, audio: AsyncIterable[bytes], sample_rate: int) -> AsyncIterator[Transcript]:
+        await self.faults.inject(self._rng)
+        text = ""
+        async for chunk in audio:
+            text += chunk.decode("utf-8", errors="ignore")
+            yield Transcript(text=text)
+        await asyncio.sleep(self.latency.sample(self._rng))
+        yield Transcript(text=text, is_final=True)
+
+
+class FakeLLM:
+    """Deterministic stand-in for the LLM with time-to-first-token and per-token delays."""
+
+    def __init__(
+        self,
+        latency: Optional[LatencyProfile] = None,
+        seed: int = 0,
+        responder: Optional[Callable[[str, Optional[List[Dict[str, Any]]]], str]] = None,
+        faults: Optional[FaultProfile] = None,
+    ):
+        self.latency = latency or LatencyProfile()
+        self.faults = faults or FaultProfile()
+        self.responder = responder or (lambda prompt, history: f"Okay. {prompt}")
+        self._rng = random.Random(seed)
+
+    async def generate(self, prompt: str, history: Optional[List[Dict[str, Any]]] = None) -> str:
+        reply = self.responder(prompt, history)
+        await self.faults.inject(self._rng)
+        await asyncio.sleep(self.latency.sample(self._rng, units=len(reply.split())))
+        return reply
+
+    async def generate_stream(self, prompt: str, history: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        reply = self.responder(prompt, history)
+        await self.faults.inject(self._rng)
+        await asyncio.sleep(LatencyProfile(self.latency.base_ms, self.latency.jitter_ms).sample(self._rng))
+        for word in reply.split(" "):
+            await asyncio.sleep(self.latency.per_unit_ms / 1000)
+            yield word + " "
+
+
+class FakeTTS:
+    """Deterministic stand-in for TTS producing silent 16-bit PCM sized to the text."""
+
+    def __init__(
+        self,
+        latency: Optional[LatencyProfile] = None,
+        seed: int = 0,
+        chars_per_second: float = 15.0,
+        faults: Optional[FaultProfile] = None,
+    ):
+        self.latency = latency or LatencyProfile()
+        self.faults = faults or FaultProfile()
+        self.chars_per_second = chars_per_second
+        self._rng = random.Random(seed)
+
+    def _pcm(self, text: str, sample_rate: int) -> bytes:
+        return bytes(int(len(text) / self.chars_per_second * sample_rate) * 2)
+
+    async def synthesize(self, text: str, sample_rate: int) -> bytes:
+        await self.faults.inject(self._rng)
+        await asyncio.sleep(self.latency.sample(self._rng))
+        return self._pcm(text, sample_rate)
+
+    async def synthesize_stream(self, text: str, sample_rate: int) -> AsyncIterator[bytes]:
+        await self.faults.inject(self._rng)
+        await asyncio.sleep(self.latency.sample(self._rng))
+        pcm = self._pcm(text, sample_rate)
+        frame = sample_rate // 50 * 2
+        for i in range(0, len(pcm), frame):
+            yield pcm[i:i + frame]
@@ -1,20 +1,69 @@
 from __future__ import annotations
 
+from typing import Any, Dict, Optional
+
 from livekit.plugins import openai as lk_openai
 from ..config import get_settings
+from ..routing import get_llm_router
 
 
 def create_openai_llm(
     model: str | None = None,
     api_key: str | None = None,
+    client: Optional[Any] = None,
+    temperature: float = 0.3,
+    max_tokens: Optional[int] = None,
 ) -> "lk_openai.LLM":
     s = get_settings()
+    limits = {} if max_tokens is None else {"max_completion_tokens": max_tokens}
+    if client is not None:
+        # A caller-owned openai.AsyncClient carries the key, base URL and connection pool
+        return lk_openai.LLM(model=(model or s.openai_model), client=client, temperature=temperature, **limits)
     return lk_openai.LLM(
         model=(model or s.openai_model),
         api_key=(api_key or s.openai_api_key or ""),
-        temperature=0.3,
+        base_url=s.openai_base_url,
+        temperature=temperature,
+        **limits,
     )
 
 
+def create_tier_llms(client: Optional[Any] = None) -> Dict[str, "lk_openai.LLM"]:
+    """One LLM per routing tier (LLM_TIERS), keyed by tier name; empty when routing is off."""
+    if not get_settings().llm_routing_enabled:
+        return {}
+    return {
+        tier.name: create_openai_llm(
+            model=tier.model, client=client, temperature=tier.temperature, max_tokens=tier.max_tokens,
+        )
+        for tier in get_llm_router().tiers
+    }
+
+
+def create_tier_fallback_llms(client: Optional[Any] = None) -> Dict[str, "lk_openai.LLM"]:
+    """Hedge target per routing tier: OPENAI_FALLBACK_MODEL with the tier's temperature and max tokens.
+
+    Tiers already on the fallback model get none, so their requests are never sent twice to one model.
+    """
+    s = get_settings()
+    if not s.llm_routing_enabled or not s.openai_fallback_model:
+        return {}
+    return {
+        tier.name: create_openai_llm(
+            model=s.openai_fallback_model, client=client, temperature=tier.temperature, max_tokens=tier.max_tokens,
+        )
+        for tier in get_llm_router().tiers
+        if tier.model != s.openai_fallback_model
+    }
+
+
+def create_fallback_llm(client: Optional[Any] = None) -> Optional["lk_openai.LLM"]:
+    """Hedge/failover target: OPENAI_FALLBACK_MODEL, or None (no hedging) unless it differs from the primary."""
+    s = get_settings()
+    if not s.openai_fallback_model or s.openai_fallback_model == s.openai_model:
+        return None
+    return create_openai_llm(model=s.openai_fallback_model, client=client)
+
+
 def create_llm_provider(api_key: str, model: str = "gpt-4o-mini") -> "lk_openai.LLM":
-    return create_openai_llm(model=model, api_key=api_key)
\ No newline at end of file
+    return create_openai_llm(model=model, api_key=api_key)
@@ -0,0 +1,266 @@
+"""Provider clients for one job, with warm, kept-alive connections.
+
+The pool builds the Deepgram, OpenAI and Cartesia clients, their hedge
+targets and the per-tier LLMs once per event loop on a shared aiohttp session
+(and one httpx client for OpenAI). LiveKit's process executor runs one job per
+process on its own loop, so a pool serves one call and is closed when it ends;
+the prewarm hook runs before that loop exists, so connections can't be opened
+for a job before it is assigned. What the pool buys instead: warm_up() opens
+the provider connections (DNS, TCP and TLS, plus Cartesia's streaming socket)
+as soon as the job starts, overlapping them with the room connect and the wait
+for the participant, and a keepalive task re-checks every endpoint
+periodically so connections stay open between turns and their health is known.
+
+Point DEEPGRAM_BASE_URL, OPENAI_BASE_URL and CARTESIA_BASE_URL at local mock
+servers and run ``python -m agent.providers.pool`` to see cold and warm
+connection times for each endpoint.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+import weakref
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+
+from ..config import Settings, get_settings
+from .llm import create_fallback_llm, create_openai_llm, create_tier_fallback_llms, create_tier_llms
+from .resilience import route_report
+from .stt import create_deepgram_stt, with_fallback_stt
+from .tts import create_cartesia_tts, create_fallback_tts
+
+logger = logging.getLogger("shop_agent")
+
+
+@dataclass
+class EndpointHealth:
+    name: str
+    url: str
+    healthy: bool = False
+    cold_ms: float = 0.0
+    warm_ms: float = 0.0
+    checks: int = 0
+    failures: int = 0
+    last_error: str = ""
+
+    @property
+    def est_saved_ms(self) -> float:
+        """Estimated setup a warm request skips: first (connecting) check minus a later one on the open connection."""
+        return round(max(0.0, self.cold_ms - self.warm_ms), 1) if self.healthy and self.checks > 1 else 0.0
+
+
+@dataclass
+class ProviderLease:
+    stt: Any
+    llm: Any
+    tts: Any
+    warm: bool
+    est_handshake_saved_ms: float
+    fallback_llm: Any = None
+    fallback_tts: Any = None
+    tier_llms: Dict[str, Any] = field(default_factory=dict)
+    tier_fallback_llms: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ProviderPoolStats:
+    leases: int = 0
+    warm_leases: int = 0
+    est_handshake_saved_ms: float = 0.0
+    endpoints: List[Dict[str, Any]] = field(default_factory=list)
+    routes: List[Dict[str, Any]] = field(default_factory=list)
+
+
+class ProviderPool:
+    """Provider clients and their connections for one event loop."""
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = s = settings or get_settings()
+        self.endpoints = {
+            "deepgram": EndpointHealth("deepgram", s.deepgram_base_url),
+            "openai": EndpointHealth("openai", s.openai_base_url),
+            "cartesia": EndpointHealth("cartesia", s.cartesia_base_url),
+        }
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._openai_http: Any = None
+        self._providers: Optional[tuple] = None
+        self._warming: Optional[asyncio.Task] = None
+        self._keepalive: Optional[asyncio.Task] = None
+        self.stats = ProviderPoolStats()
+
+    def _connector(self) -> aiohttp.TCPConnector:
+        s = self.settings
+        # Keep idle connections open past the keepalive interval so checks reuse them
+        return aiohttp.TCPConnector(
+            limit=s.provider_http_pool_size,
+            keepalive_timeout=s.provider_keepalive_seconds * 2,
+            ttl_dns_cache=300,
+        )
+
+    def _build(self) -> tuple:
+        import httpx
+        import openai
+
+        s = self.settings
+        self._session = aiohttp.ClientSession(connector=self._connector())
+        self._openai_http = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=s.provider_http_pool_size,
+                max_keepalive_connections=s.provider_http_pool_size,
+                keepalive_expiry=s.provider_keepalive_seconds * 2,
+            ),
+            timeout=httpx.Timeout(connect=15.0, read=30.0, write=10.0, pool=5.0),
+        )
+        client = openai.AsyncClient(
+            api_key=s.openai_api_key or "",
+            base_url=s.openai_base_url,
+            http_client=self._openai_http,
+            max_retries=0,
+        )
+        # The hedge targets share the primaries' connection pools
+        return (
+            with_fallback_stt(create_deepgram_stt(http_session=self._session), http_session=self._session),
+            create_openai_llm(client=client),
+            create_cartesia_tts(http_session=self._session),
+            create_fallback_llm(client=client),
+            create_fallback_tts(http_session=self._session),
+            create_tier_llms(client=client),
+            create_tier_fallback_llms(client=client),
+        )
+
+    def _ensure_built(self) -> tuple:
+        if self._providers is None or self._session is None or self._session.closed:
+            self._providers = self._build()
+        return self._providers
+
+    async def _check(self, endpoint: EndpointHealth):
+        """One lightweight request on the shared pool; any HTTP response means the host is reachable."""
+        started = time.perf_counter()
+        try:
+            if endpoint.name == "openai":
+                await self._openai_http.head(endpoint.url)
+            else:
+                async with self._session.head(endpoint.url, allow_redirects=False) as response:
+                    await response.read()
+        except Exception as e:
+            endpoint.healthy = False
+            endpoint.failures += 1
+            endpoint.last_error = str(e) or type(e).__name__
+            logger.warning(f"Provider endpoint {endpoint.name} unreachable: {endpoint.last_error}")
+            return
+        elapsed = (time.perf_counter() - started) * 1000
+        if not endpoint.healthy or not endpoint.cold_ms:
+            # First success on this pool (or after a failure) paid for a new connection
+            endpoint.cold_ms = round(elapsed, 1)
+        else:
+            endpoint.warm_ms = round(elapsed, 1)
+        endpoint.healthy = True
+        endpoint.checks += 1
+        endpoint.last_error = ""
+
+    async def _warm(self):
+        *providers, tier_llms, tier_fallback_llms = self._ensure_built()
+        await asyncio.gather(*(self._check(e) for e in self.endpoints.values()))
+        # A second round on the now-open connections measures the warm round trip
+        await asyncio.gather(*(self._check(e) for e in self.endpoints.values() if e.healthy))
+        for provider in (*providers, *tier_llms.values(), *tier_fallback_llms.values()):
+            prewarm = getattr(provider, "prewarm", None)
+            if prewarm is not None:
+                # Cartesia opens its streaming WebSocket here
+                prewarm()
+
+    def warm_up(self) -> asyncio.Task:
+        """Start opening provider connections in the background (idempotent)."""
+        if self._warming is None:
+            self._warming = asyncio.create_task(self._warm())
+        if self._keepalive is None or self._keepalive.done():
+            self._keepalive = asyncio.create_task(self._keepalive_loop())
+        return self._warming
+
+    async def _keepalive_loop(self):
+        interval = self.settings.provider_keepalive_seconds
+        while True:
+            await asyncio.sleep(interval)
+            if self._session is None:
+                continue
+            if self._session.closed:
+                logger.warning("Provider HTTP session closed - rebuilding provider clients")
+                self._providers = None
+                self._ensure_built()
+            await asyncio.gather(*(self._check(e) for e in self.endpoints.values()))
+
+    def lease(self) -> ProviderLease:
+        """Provider clients for a job; never waits for warm-up to finish."""
+        stt, llm, tts, fallback_llm, fallback_tts, tier_llms, tier_fallback_llms = self._ensure_built()
+        warm = self._warming is not None and self._warming.done() and all(e.healthy for e in self.endpoints.values())
+        saved = round(sum(e.est_saved_ms for e in self.endpoints.values()), 1)
+        self.stats.leases += 1
+        if warm:
+            self.stats.warm_leases += 1
+            self.stats.est_handshake_saved_ms += saved
+        return ProviderLease(
+            stt, llm, tts, warm, saved if warm else 0.0, fallback_llm, fallback_tts, tier_llms, tier_fallback_llms,
+        )
+
+    def report(self) -> ProviderPoolStats:
+        self.stats.endpoints = [dict(asdict(e), est_saved_ms=e.est_saved_ms) for e in self.endpoints.values()]
+        self.stats.routes = route_report()
+        return self.stats
+
+    async def aclose(self):
+        for task in (self._warming, self._keepalive):
+            if task is not None:
+                task.cancel()
+        if self._openai_http is not None:
+            await self._openai_http.aclose()
+        if self._session is not None:
+            await self._session.close()
+        self._providers = None
+
+
+_pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, ProviderPool]" = weakref.WeakKeyDictionary()
+
+
+def get_provider_pool() -> ProviderPool:
+    """The provider pool for the running event loop, i.e. for the current job."""
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = ProviderPool()
+    return pool
+
+
+async def close_provider_pool():
+    """Close the running loop's pool, if any: its sockets and keepalive task end with the job."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.aclose()
+
+
+async def probe() -> ProviderPoolStats:
+    pool = ProviderPool()
+    try:
+        await pool.warm_up()
+        return pool.report()
+    finally:
+        await pool.aclose()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Cold vs warm connection times for the provider endpoints.")
+    parser.parse_args(argv)
+    report = asyncio.run(probe())
+    for endpoint in report.endpoints:
+        status = "ok" if endpoint["healthy"] else f"DOWN ({endpoint['last_error']})"
+        print(f"{endpoint['name']:<10}{endpoint['url']:<40} cold {endpoint['cold_ms']:>7} ms  "
+              f"warm {endpoint['warm_ms']:>7} ms  est. saved {endpoint['est_saved_ms']:>7.1f} ms  {status}")
+    return 0 if all(e["healthy"] for e in report.endpoints) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,361 @@
+"""Deadlines, circuit breakers and hedged requests for the STT, LLM and TTS providers.
+
+Each provider kind has a ProviderRoute with a primary and an optional
+secondary (a second model or voice). A request waits on the primary only up
+to the route's p95 budget before also starting the secondary; whichever
+answers first wins and the other is cancelled. Every side has a
+CircuitBreaker over its recent requests that opens when the error rate or
+the p95 latency gets too high, so an unhealthy primary is skipped outright
+until a probe request succeeds again.
+
+A request that produces nothing before its deadline fails with
+ProviderTimeout; one with no usable side left fails with ProviderUnavailable.
+Both are the caller's cue to degrade (cached script audio for TTS).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, TypeVar
+
+from ..config import get_settings
+from ..telemetry import get_telemetry
+
+logger = logging.getLogger("shop_agent")
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_EMPTY = object()
+
+
+class ProviderUnavailable(RuntimeError):
+    """No side of a route could serve the request."""
+
+
+class ProviderTimeout(ProviderUnavailable):
+    """A request produced nothing before its deadline."""
+
+
+class CircuitBreaker:
+    """Rolling error-rate and p95-latency breaker for one provider side.
+
+    Closed, requests flow and their outcomes are recorded. The breaker opens
+    when, over the last ``window`` requests, the error rate reaches
+    ``error_rate`` or the p95 latency exceeds ``latency_factor`` times the
+    budget. Open, requests are refused until ``cooldown_seconds`` have passed;
+    then one probe is let through, and its outcome closes or re-opens it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        latency_budget_ms: float,
+        window: int = 50,
+        min_requests: int = 10,
+        error_rate: float = 0.5,
+        latency_factor: float = 2.0,
+        cooldown_seconds: float = 20.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.latency_budget_ms = latency_budget_ms
+        self.min_requests = min_requests
+        self.error_rate = error_rate
+        self.latency_factor = latency_factor
+        self.cooldown = cooldown_seconds
+        self._clock = clock
+        self._samples: Deque[Tuple[bool, float]] = deque(maxlen=window)
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and self._clock() - self._opened_at >= self.cooldown:
+            self._state = HALF_OPEN
+            self._probing = False
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a request may go to this side now; in half-open, only one probe at a time."""
+        state = self.state
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        return False
+
+    def p95_ms(self) -> float:
+        latencies = sorted(ms for _, ms in self._samples)
+        return latencies[int(len(latencies) * 0.95)] if latencies else 0.0
+
+    def failure_rate(self) -> float:
+        return sum(1 for ok, _ in self._samples if not ok) / len(self._samples) if self._samples else 0.0
+
+    def record(self, ok: bool, latency_ms: float):
+        """Outcome of a request this breaker allowed."""
+        if self.state == HALF_OPEN:
+            self._probing = False
+            if ok:
+                self._state = CLOSED
+                self._samples.clear()
+                logger.info(f"Circuit {self.name} closed after a successful probe")
+            else:
+                self._trip("probe failed")
+            return
+        if self._state == OPEN:
+            # Late result of a request started before the breaker opened
+            return
+        self._samples.append((ok, latency_ms))
+        if len(self._samples) < self.min_requests:
+            return
+        failure_rate = self.failure_rate()
+        if failure_rate >= self.error_rate:
+            self._trip(f"error rate {failure_rate:.0%}")
+        elif self.p95_ms() > self.latency_budget_ms * self.latency_factor:
+            self._trip(f"p95 {self.p95_ms():.0f} ms over a {self.latency_budget_ms:.0f} ms budget")
+
+    def release(self, latency_ms: float):
+        """A request cancelled before it finished (it lost a hedge); counts as slow, not failed."""
+        if self.state == HALF_OPEN:
+            self._probing = False
+            return
+        self.record(True, latency_ms)
+
+    def _trip(self, reason: str):
+        self._state = OPEN
+        self._opened_at = self._clock()
+        self._probing = False
+        self._samples.clear()
+        self.trips += 1
+        logger.warning(f"Circuit {self.name} opened ({reason}); retrying in {self.cooldown:.0f}s")
+        get_telemetry().count("shop_breaker_trips_total", breaker=self.name)
+
+
+@dataclass
+class RouteStats:
+    requests: int = 0
+    primary_wins: int = 0
+    secondary_wins: int = 0
+    hedged: int = 0
+    failovers: int = 0
+    timeouts: int = 0
+    failures: int = 0
+
+
+class ProviderRoute:
+    """Deadline, breakers and hedging for one provider kind ("stt", "llm" or "tts")."""
+
+    def __init__(
+        self,
+        name: str,
+        first_timeout: float,
+        budget_ms: float,
+        idle_timeout: float,
+        breakers: Tuple[CircuitBreaker, CircuitBreaker],
+    ):
+        self.name = name
+        self.first_timeout = first_timeout
+        self.budget_ms = budget_ms
+        self.idle_timeout = idle_timeout
+        self.breakers = breakers
+        self.stats = RouteStats()
+
+    def _count(self, side: int, outcome: str):
+        get_telemetry().count(
+            "shop_provider_requests_total",
+            provider=self.name, side="secondary" if side else "primary", outcome=outcome,
+        )
+
+    async def _race(self, attempt: Callable[[int], Awaitable[T]], sides: int) -> Tuple[int, T]:
+        """Run attempt(side) on the primary, hedging or failing over to the secondary; first success wins."""
+        loop = asyncio.get_running_loop()
+        started_at = loop.time()
+        deadline = started_at + self.first_timeout
+        hedge_at = started_at + self.budget_ms / 1000
+        pending: Dict[asyncio.Future, Tuple[int, float]] = {}
+        next_side = 0
+        last_error: Optional[BaseException] = None
+        self.stats.requests += 1
+
+        def start_next() -> bool:
+            nonlocal next_side
+            side = next_side
+            next_side += 1
+            if not self.breakers[side].allow():
+                self._count(side, "refused")
+                return False
+            pending[asyncio.ensure_future(attempt(side))] = (side, time.perf_counter())
+            return True
+
+        try:
+            while True:
+                # Nothing in flight: the primary was refused or failed, so fail over now
+                while not pending and next_side < sides:
+                    if start_next() and next_side > 1:
+                        self.stats.failovers += 1
+                if not pending:
+                    self.stats.failures += 1
+                    reason = f"{type(last_error).__name__}: {last_error}" if last_error else "all circuits open"
+                    raise ProviderUnavailable(f"{self.name} unavailable ({reason})")
+
+                now = loop.time()
+                if now >= deadline:
+                    self.stats.timeouts += 1
+                    self.stats.failures += 1
+                    for side, begun in pending.values():
+                        self.breakers[side].record(False, (time.perf_counter() - begun) * 1000)
+                        self._count(side, "timeout")
+                    for task in pending:
+                        task.cancel()
+                    pending.clear()
+                    raise ProviderTimeout(f"{self.name} produced nothing within {self.first_timeout:.1f}s")
+
+                hedging = next_side < sides and now < hedge_at
+                done, _ = await asyncio.wait(
+                    pending, timeout=(min(deadline, hedge_at) if hedging else deadline) - now,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    if next_side < sides and loop.time() >= hedge_at and start_next():
+                        self.stats.hedged += 1
+                    continue
+
+                for task in done:
+                    side, begun = pending.pop(task)
+                    elapsed = (time.perf_counter() - begun) * 1000
+                    error = asyncio.CancelledError() if task.cancelled() else task.exception()
+                    if error is None:
+                        self.breakers[side].record(True, elapsed)
+                        self._count(side, "ok")
+                        if side:
+                            self.stats.secondary_wins += 1
+                        else:
+                            self.stats.primary_wins += 1
+                        return side, task.result()
+                    last_error = error
+                    self.breakers[side].record(False, elapsed)
+                    self._count(side, "error")
+                    logger.warning(f"{self.name} {'secondary' if side else 'primary'} failed after {elapsed:.0f} ms: {error!r}")
+        finally:
+            # Losers of a hedge, or everything in flight when the caller gave up
+            for task, (side, begun) in pending.items():
+                task.cancel()
+                self.breakers[side].release((time.perf_counter() - begun) * 1000)
+                self._count(side, "cancelled")
+
+    async def call(self, primary: Callable[[], Awaitable[T]], secondary: Optional[Callable[[], Awaitable[T]]] = None) -> T:
+        """One request/response call within the route's deadline."""
+        factories = [primary] if secondary is None else [primary, secondary]
+        _, result = await self._race(lambda side: factories[side](), len(factories))
+        return result
+
+    async def stream(
+        self,
+        primary: Callable[[], AsyncIterable[T]],
+        secondary: Optional[Callable[[], AsyncIterable[T]]] = None,
+        on_winner: Optional[Callable[[int], None]] = None,
+    ) -> AsyncIterator[T]:
+        """Items of the first side to produce one; later items must each arrive within the idle timeout.
+
+        on_winner is told which side won (0 primary, 1 secondary) before its first item.
+        """
+        factories = [primary] if secondary is None else [primary, secondary]
+
+        async def first(side: int) -> Tuple[AsyncIterator[T], Any]:
+            iterator = factories[side]().__aiter__()
+            try:
+                return iterator, await iterator.__anext__()
+            except StopAsyncIteration:
+                return iterator, _EMPTY
+            except BaseException:
+                await _aclose(iterator)
+                raise
+
+        side, (iterator, item) = await self._race(first, len(factories))
+        if on_winner is not None:
+            on_winner(side)
+        try:
+            if item is _EMPTY:
+                return
+            yield item
+            while True:
+                try:
+                    item = await asyncio.wait_for(iterator.__anext__(), self.idle_timeout)
+                except StopAsyncIteration:
+                    return
+                except Exception as e:
+                    # Too late to switch sides mid-stream, but the breaker should know
+                    self.breakers[side].record(False, self.idle_timeout * 1000)
+                    self._count(side, "error")
+                    raise ProviderUnavailable(f"{self.name} stream broke off ({type(e).__name__})") from e
+                yield item
+        finally:
+            await _aclose(iterator)
+
+
+async def _aclose(iterator: Any):
+    close = getattr(iterator, "aclose", None)
+    if close is not None:
+        try:
+            await close()
+        except Exception:
+            pass
+
+
+def _route_settings(name: str) -> Tuple[float, float]:
+    s = get_settings()
+    return {
+        "stt": (s.stt_timeout_seconds, s.stt_p95_budget_ms),
+        "llm": (s.llm_first_token_timeout, s.llm_p95_budget_ms),
+        "tts": (s.tts_first_audio_timeout, s.tts_p95_budget_ms),
+    }[name]
+
+
+_routes: Dict[str, ProviderRoute] = {}
+
+
+def get_route(name: str) -> ProviderRoute:
+    """Process-wide route for "stt", "llm" or "tts"; its breakers see every call in the process."""
+    route = _routes.get(name)
+    if route is None:
+        s = get_settings()
+        first_timeout, budget_ms = _route_settings(name)
+
+        def breaker(label: str) -> CircuitBreaker:
+            return CircuitBreaker(
+                label,
+                budget_ms,
+                window=s.breaker_window,
+                min_requests=s.breaker_min_requests,
+                error_rate=s.breaker_error_rate,
+                latency_factor=s.breaker_latency_factor,
+                cooldown_seconds=s.breaker_cooldown_seconds,
+            )
+
+        route = _routes[name] = ProviderRoute(
+            name, first_timeout, budget_ms, s.provider_idle_timeout,
+            (breaker(name), breaker(f"{name}-secondary")),
+        )
+    return route
+
+
+def route_report() -> List[Dict[str, Any]]:
+    """Stats and breaker states of the routes used so far in this process."""
+    return [
+        {
+            "route": route.name,
+            **vars(route.stats),
+            "breakers": {b.name: b.state for b in route.breakers},
+        }
+        for route in _routes.values()
+    ]
@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+from typing import Any, Optional
+
+from livekit.agents import stt as agents_stt
 from livekit.plugins import deepgram
 from ..config import get_settings
 
@@ -8,6 +11,7 @@ def create_deepgram_stt(
     model: str | None = None,
     language: str | None = None,
     api_key: str | None = None,
+    http_session: Optional[Any] = None,
 ) -> "deepgram.STT":
     s = get_settings()
     return deepgram.STT(
@@ -18,8 +22,23 @@ def create_deepgram_stt(
         interim_results=True,
         no_delay=True,
         numerals=True,
+        base_url=s.deepgram_base_url,
+        http_session=http_session,
     )
 
 
+def with_fallback_stt(primary: Any, http_session: Optional[Any] = None) -> Any:
+    """Wrap the primary STT so a failed or stalled stream moves to DEEPGRAM_FALLBACK_MODEL.
+
+    Recognition is one continuous audio stream, so it is failed over rather
+    than hedged: duplicating every call's audio would double STT cost.
+    """
+    s = get_settings()
+    if not s.deepgram_fallback_model:
+        return primary
+    secondary = create_deepgram_stt(model=s.deepgram_fallback_model, http_session=http_session)
+    return agents_stt.FallbackAdapter([primary, secondary], attempt_timeout=s.stt_timeout_seconds)
+
+
 def create_stt_provider(api_key: str, model: str = "nova-3") -> "deepgram.STT":
-    return create_deepgram_stt(model=model, api_key=api_key)
\ No newline at end of file
+    return create_deepgram_stt(model=model, api_key=api_key)
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Any, Optional
+
 from livekit.plugins import cartesia
 from ..config import get_settings
 
@@ -9,6 +11,7 @@ def create_cartesia_tts(
     model: str | None = None,
     api_key: str | None = None,
     sample_rate: int | None = None,
+    http_session: Optional[Any] = None,
 ) -> "cartesia.TTS":
     s = get_settings()
     return cartesia.TTS(
@@ -16,6 +19,20 @@ def create_cartesia_tts(
         voice=(voice_id or s.cartesia_voice_id or ""),
         model=(model or s.cartesia_model),
         sample_rate=(sample_rate or s.sample_rate_hz),
+        base_url=s.cartesia_base_url,
+        http_session=http_session,
+    )
+
+
+def create_fallback_tts(http_session: Optional[Any] = None) -> Optional["cartesia.TTS"]:
+    """Hedge/failover target: CARTESIA_FALLBACK_VOICE_ID / _MODEL, or None (no hedging) when neither is set."""
+    s = get_settings()
+    if not s.cartesia_fallback_voice_id and not s.cartesia_fallback_model:
+        return None
+    return create_cartesia_tts(
+        voice_id=s.cartesia_fallback_voice_id,
+        model=s.cartesia_fallback_model,
+        http_session=http_session,
     )
 
 
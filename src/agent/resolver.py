@@ -0,0 +1,374 @@
+"""Resolve spoken product references ("the stealth one", "urban comfort") to catalog SKUs.
+
+Each product name is indexed once per catalog revision by two kinds of
+features: padded character trigrams of every word, which tolerate typos and
+split or merged words ("zenith eon" / "zenitheon"), and a phonetic key per
+word, which tolerates transcription spellings ("stelth", "zenithion").
+Features are weighted by rarity. A lookup first maps each query word to the
+catalog words it resembles, intersects the products holding those words,
+and scores only that short list exactly, so resolution cost depends on how
+specific the query is rather than on catalog size.
+
+Run ``python -m agent.resolver --items 100000`` to benchmark index build time,
+lookup latency and accuracy on a synthetic catalog.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Sequence, Set, Tuple
+
+from .catalog import Product, get_catalog
+from .config import get_settings
+
+_WORD = re.compile(r"[a-z0-9]+")
+_T_SHIRT = re.compile(r"\bt shirt")
+
+# Filler that carries no product identity in a spoken selection
+STOPWORDS = frozenset(
+    "a an the one this that it its i id ill im me my please want wanna like "
+    "would take get go with for of and or option choice product item".split()
+)
+
+
+# Spoken and transcribed variants of category words
+SYNONYMS = {"tee": "tshirt", "tees": "tshirt", "tshirts": "tshirt", "hoodies": "hoodie", "jackets": "jacket"}
+
+
+def normalize_words(text: str) -> List[str]:
+    """Lowercase words with filler removed; "T-Shirt", "t shirt" and "tee" become "tshirt"."""
+    text = _T_SHIRT.sub("tshirt", text.lower().replace("-", "").replace("'", ""))
+    return [SYNONYMS.get(w, w) for w in _WORD.findall(text) if w not in STOPWORDS]
+
+
+def phonetic_key(word: str) -> str:
+    """A small Metaphone-style key: similar-sounding spellings share it."""
+    if not word:
+        return ""
+    if word.isdigit():
+        return word
+    w = word
+    for src, dst in (("ph", "f"), ("ck", "k"), ("sch", "sk"), ("sh", "x"), ("ch", "x"),
+                     ("th", "0"), ("gh", ""), ("kn", "n"), ("wr", "r"), ("dg", "j"), ("qu", "kw")):
+        w = w.replace(src, dst)
+    out = [w[0] if w[0] not in "aeiouy" else "a"]
+    for i, ch in enumerate(w[1:], 1):
+        nxt = w[i + 1] if i + 1 < len(w) else ""
+        if ch in "aeiouyhw":
+            continue
+        if ch == "c":
+            ch = "s" if nxt in ("e", "i", "y") else "k"
+        elif ch == "q":
+            ch = "k"
+        elif ch == "x":
+            ch = "ks"
+        elif ch == "z":
+            ch = "s"
+        elif ch == "v":
+            ch = "f"
+        elif ch == "d":
+            ch = "t"
+        elif ch == "b":
+            ch = "p"
+        elif ch == "g":
+            ch = "j" if nxt in ("e", "i", "y") else "k"
+        if out[-1] != ch:
+            out.append(ch)
+    return "".join(out)
+
+
+@lru_cache(maxsize=65536)
+def _word_features(word: str) -> Tuple[str, ...]:
+    # Catalog names reuse a small vocabulary, so most words hit this cache
+    padded = f"^{word}$"
+    return tuple(padded[i:i + 3] for i in range(len(padded) - 2)) + ("~" + phonetic_key(word),)
+
+
+def features(text: str) -> FrozenSet[str]:
+    """Trigram and phonetic features of a name or query."""
+    feats = set()
+    for word in normalize_words(text):
+        feats.update(_word_features(word))
+    return frozenset(feats)
+
+
+@dataclass(slots=True)
+class ProductMatch:
+    product: Product
+    score: float
+
+
+@dataclass(slots=True)
+class Resolution:
+    """Outcome of resolving spoken text against the catalog."""
+    query: str
+    matches: List[ProductMatch]
+    resolved: Optional[Product] = None
+
+    @property
+    def ambiguous(self) -> bool:
+        return self.resolved is None and len(self.matches) > 1
+
+
+class ProductResolver:
+    """Precomputed n-gram and phonetic index over one catalog revision."""
+
+    def __init__(
+        self,
+        products: Sequence[Product],
+        min_score: float = 0.45,
+        margin: float = 0.08,
+        candidate_limit: int = 256,
+    ):
+        self.products = list(products)
+        self.min_score = min_score
+        self.margin = margin
+        self.candidate_limit = candidate_limit
+        self._exact: Dict[str, int] = {}
+        self._sku: Dict[str, int] = {}
+        self._features: List[FrozenSet[str]] = []
+        postings: Dict[str, List[int]] = {}
+        # Word-level index: catalog words by feature, and products by word
+        self._words: Dict[str, Set[int]] = {}
+        self._vocabulary: Dict[str, List[str]] = {}
+        for pid, product in enumerate(self.products):
+            feats = features(product.name)
+            self._features.append(feats)
+            for feat in feats:
+                postings.setdefault(feat, []).append(pid)
+            for word in normalize_words(product.name):
+                self._words.setdefault(word, set()).add(pid)
+            self._exact.setdefault(" ".join(normalize_words(product.name)), pid)
+            self._sku[product.sku.upper()] = pid
+
+        n = len(self.products) or 1
+        self._postings = postings
+        self._weight = {feat: math.log(1 + n / len(pids)) for feat, pids in postings.items()}
+        self._totals = [sum(self._weight[f] for f in feats) for feats in self._features]
+        for word in self._words:
+            for feat in _word_features(word):
+                self._vocabulary.setdefault(feat, []).append(word)
+
+    def __len__(self) -> int:
+        return len(self.products)
+
+    def _word_products(self, word: str) -> Set[int]:
+        """Products holding a catalog word that resembles word."""
+        feats = _word_features(word)
+        shared: Dict[str, int] = {}
+        for feat in feats:
+            for known in self._vocabulary.get(feat, ()):
+                shared[known] = shared.get(known, 0) + 1
+        # Half of the spoken word's features: survives a typo, and a split
+        # word ("zenith eon") still reaches the whole one
+        similar = [self._words[known] for known, n in shared.items() if 2 * n >= len(feats)]
+        # The index's own set when only one word matches: callers never mutate it
+        return similar[0] if len(similar) == 1 else set().union(*similar)
+
+    def _candidates(self, text: str, wanted: Optional[str]) -> List[int]:
+        per_word = [pids for pids in map(self._word_products, dict.fromkeys(normalize_words(text))) if pids]
+        if not per_word:
+            return []
+        per_word.sort(key=len)
+        candidates = set(per_word[0])
+        for pids in per_word[1:]:
+            if len(candidates) <= 1:
+                break
+            # A word no remaining product holds is noise, not a reason to match nothing
+            narrowed = candidates & pids
+            if narrowed:
+                candidates = narrowed
+        if wanted:
+            candidates = {pid for pid in candidates if self.products[pid].category.lower() == wanted}
+        # Beyond the limit the query is too vague to resolve; score a sample to list
+        return sorted(candidates)[:self.candidate_limit]
+
+    def search(self, text: str, category: Optional[str] = None, limit: int = 3) -> List[ProductMatch]:
+        """Best-scoring products for text, optionally within one category."""
+        query = features(text)
+        if not query:
+            return []
+        weight = self._weight
+        # An unseen feature still counts against the match, as a rare one
+        unseen = math.log(1 + len(self.products))
+        query_total = sum(weight.get(f, unseen) for f in query)
+
+        wanted = category.strip().lower() if category else None
+        scored = []
+        for pid in self._candidates(text, wanted):
+            product = self.products[pid]
+            feats = self._features[pid]
+            shared = sum(weight[f] for f in query if f in feats)
+            # Dice coefficient over weighted features, leaning on query coverage:
+            # a spoken reference is usually a fragment of the full name
+            score = (2 * shared / (query_total + self._totals[pid]) + shared / query_total) / 2
+            scored.append(ProductMatch(product, round(score, 4)))
+        scored.sort(key=lambda m: m.score, reverse=True)
+        return scored[:limit]
+
+    def resolve(self, text: str, category: Optional[str] = None, limit: int = 3) -> Resolution:
+        """Resolve text to one product when the best match is strong and clearly ahead."""
+        text = text.strip()
+        pid = self._sku.get(text.upper())
+        if pid is None:
+            pid = self._exact.get(" ".join(normalize_words(text)))
+        if pid is not None:
+            product = self.products[pid]
+            if not category or product.category.lower() == category.strip().lower():
+                return Resolution(text, [ProductMatch(product, 1.0)], product)
+
+        # Weak matches are noise, not candidates worth offering the customer
+        matches = [m for m in self.search(text, category, limit) if m.score >= self.min_score / 2]
+        resolved = None
+        if matches and matches[0].score >= self.min_score:
+            if len(matches) == 1 or matches[0].score - matches[1].score >= self.margin:
+                resolved = matches[0].product
+        return Resolution(text, matches, resolved)
+
+
+_resolver_lock = threading.Lock()
+_resolver_cache: Optional[Tuple[str, ProductResolver]] = None
+
+
+def get_resolver() -> ProductResolver:
+    """Resolver for the current catalog revision, rebuilt when inventory.json changes."""
+    global _resolver_cache
+    snapshot = get_catalog().refresh()
+    cached = _resolver_cache
+    if cached is not None and cached[0] == snapshot.version:
+        return cached[1]
+    with _resolver_lock:
+        if _resolver_cache is None or _resolver_cache[0] != snapshot.version:
+            s = get_settings()
+            _resolver_cache = (snapshot.version, ProductResolver(snapshot.products, s.resolver_min_score, s.resolver_margin))
+        return _resolver_cache[1]
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+_ADJECTIVES = ("stealth urban zenitheon classic midnight vintage arctic desert coastal royal crimson "
+               "shadow summit harbor ember velvet granite lunar solar nomad rebel iron silver golden "
+               "emerald cobalt onyx ivory scarlet amber willow canyon glacier falcon phoenix orbit").split()
+_NOUNS = ("bomber comfort denim windbreaker fleece trail runner voyager ranger pilot drifter rider "
+          "wanderer explorer scout hiker sailor breeze storm thunder tide frost blaze dusk dawn").split()
+_COLOURS = "black white navy olive grey charcoal maroon teal beige khaki rust sand sage mustard lilac indigo".split()
+_TYPES = ("Hoodie T-Shirt Jacket Sweater Polo Parka Vest Cardigan Overshirt Tracksuit").split()
+
+
+def synthetic_catalog(items: int, seed: int = 7) -> List[Product]:
+    """Products with realistic, heavily overlapping names and no model numbers.
+
+    Every name is a distinct adjective, noun, colour and garment combination,
+    so telling products apart takes all of its words.
+    """
+    combos = len(_ADJECTIVES) * len(_NOUNS) * len(_COLOURS) * len(_TYPES)
+    if items > combos:
+        raise ValueError(f"at most {combos} distinct synthetic names")
+    rng = random.Random(seed)
+    products = []
+    for i, combo in enumerate(rng.sample(range(combos), items)):
+        combo, kind = divmod(combo, len(_TYPES))
+        combo, colour = divmod(combo, len(_COLOURS))
+        adjective, noun = divmod(combo, len(_NOUNS))
+        kind = _TYPES[kind]
+        name = f"The {_ADJECTIVES[adjective].title()} {_NOUNS[noun].title()} {_COLOURS[colour].title()} {kind}"
+        products.append(Product(sku=f"SKU-{i:06d}", name=name, description="", category=kind, price=1000 + i % 9000))
+    return products
+
+
+def _garble(name: str, rng: random.Random) -> str:
+    """A spoken-style reference: drop filler, misspell any word, add chatter."""
+    words = [w for w in name.split() if w.lower() != "the"]
+    # Any word long enough to misspell, so queries rarely match a name exactly
+    i = rng.choice([k for k, w in enumerate(words) if len(w) > 4] or range(len(words)))
+    word = words[i].lower()
+    j = rng.randrange(1, len(word) - 1)
+    word = rng.choice((word[:j] + word[j + 1:], word[:j] + word[j] + word[j:], word.replace("c", "k")))
+    words[i] = word
+    return "I'd like the " + " ".join(words) + " one"
+
+
+@dataclass
+class ResolverBenchReport:
+    items: int
+    queries: int
+    build_seconds: float
+    p50_us: float
+    p99_us: float
+    exact_p50_us: float
+    accuracy: float
+    ambiguous_rate: float
+
+
+def benchmark(items: int, queries: int = 2000, seed: int = 7) -> ResolverBenchReport:
+    products = synthetic_catalog(items, seed)
+    started = time.perf_counter()
+    resolver = ProductResolver(products)
+    build_seconds = time.perf_counter() - started
+
+    rng = random.Random(seed + 1)
+    targets = [rng.choice(products) for _ in range(queries)]
+    spoken = [_garble(p.name, rng) for p in targets]
+
+    timings, correct, ambiguous = [], 0, 0
+    for target, text in zip(targets, spoken):
+        t = time.perf_counter()
+        result = resolver.resolve(text)
+        timings.append((time.perf_counter() - t) * 1e6)
+        if result.resolved is target:
+            correct += 1
+        elif result.resolved is None:
+            ambiguous += 1
+
+    exact = []
+    for target in targets[:200]:
+        t = time.perf_counter()
+        resolver.resolve(target.name)
+        exact.append((time.perf_counter() - t) * 1e6)
+
+    timings.sort()
+    exact.sort()
+    return ResolverBenchReport(
+        items=items,
+        queries=queries,
+        build_seconds=round(build_seconds, 2),
+        p50_us=round(timings[len(timings) // 2], 1),
+        p99_us=round(timings[int(len(timings) * 0.99)], 1),
+        exact_p50_us=round(exact[len(exact) // 2], 2),
+        accuracy=round(correct / queries, 4),
+        ambiguous_rate=round(ambiguous / queries, 4),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark product resolution on a synthetic catalog.")
+    parser.add_argument("--items", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.items, args.queries, args.seed)
+    print(f"Catalog: {report.items} items, index built in {report.build_seconds}s")
+    print(f"Spoken lookups: p50 {report.p50_us} us, p99 {report.p99_us} us over {report.queries} queries")
+    print(f"Exact-name lookups: p50 {report.exact_p50_us} us")
+    print(f"Resolved correctly: {report.accuracy:.1%}, left ambiguous: {report.ambiguous_rate:.1%}")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,283 @@
+"""Stage-aware LLM model routing.
+
+Each script stage (the ``script_stage`` stored by collect_data) maps to a
+model tier from LLM_TIERS, each with its own model, temperature, max tokens
+and prices. Trivial turns such as taking a name or closing go to the fast
+tier; turns where the customer spells an email or reads out an OTP stay on
+the standard one. Turning a free-form request into products goes to the most
+capable tier.
+
+Tiers are listed fastest and cheapest first. When a tier's recent
+time-to-first-token p95 rises above LLM_DEGRADE_TTFT_MS, its stages move one
+tier faster for LLM_DEGRADE_SECONDS; after that the tier gets traffic again
+and is re-measured.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field, replace
+from functools import lru_cache
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .config import Settings, get_settings
+from .telemetry import get_telemetry
+
+logger = logging.getLogger("shop_agent")
+
+# Samples a tier needs before its latency can move stages elsewhere
+MIN_SAMPLES = 5
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    temperature: float
+    max_tokens: int
+    input_cost: float = 0.0
+    output_cost: float = 0.0
+
+    def cost(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """USD for one request; prices are per million tokens."""
+        return (prompt_tokens * self.input_cost + completion_tokens * self.output_cost) / 1_000_000
+
+
+@dataclass(frozen=True)
+class RouteChoice:
+    stage: str
+    tier: ModelTier
+    degraded: bool = False
+
+
+@dataclass
+class StageUsage:
+    turns: int = 0
+    degraded_turns: int = 0
+    fallback_turns: int = 0
+    failed_turns: int = 0
+    ttft_ms_total: float = 0.0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost_usd: float = 0.0
+    tiers: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def avg_ttft_ms(self) -> float:
+        return self.ttft_ms_total / self.turns if self.turns else 0.0
+
+    def merge(self, other: "StageUsage"):
+        self.turns += other.turns
+        self.degraded_turns += other.degraded_turns
+        self.fallback_turns += other.fallback_turns
+        self.failed_turns += other.failed_turns
+        self.ttft_ms_total += other.ttft_ms_total
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.cost_usd += other.cost_usd
+        for tier, turns in other.tiers.items():
+            self.tiers[tier] = self.tiers.get(tier, 0) + turns
+
+
+@dataclass
+class RoutingStats:
+    stages: Dict[str, StageUsage] = field(default_factory=dict)
+
+    @property
+    def turns(self) -> int:
+        return sum(s.turns for s in self.stages.values())
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(s.cost_usd for s in self.stages.values())
+
+    def record(
+        self,
+        choice: RouteChoice,
+        ttft_ms: float,
+        prompt_tokens: int,
+        completion_tokens: int,
+        served: Optional[ModelTier] = None,
+        failed: bool = False,
+    ):
+        served = served or choice.tier
+        usage = self.stages.setdefault(choice.stage, StageUsage())
+        usage.turns += 1
+        usage.degraded_turns += choice.degraded
+        usage.fallback_turns += served.model != choice.tier.model
+        usage.failed_turns += failed
+        usage.ttft_ms_total += ttft_ms
+        usage.prompt_tokens += prompt_tokens
+        usage.completion_tokens += completion_tokens
+        usage.cost_usd += served.cost(prompt_tokens, completion_tokens)
+        usage.tiers[choice.tier.name] = usage.tiers.get(choice.tier.name, 0) + 1
+
+    def merge(self, other: "RoutingStats"):
+        for stage, usage in other.stages.items():
+            self.stages.setdefault(stage, StageUsage()).merge(usage)
+
+    def __str__(self) -> str:
+        per_stage = ", ".join(
+            f"{stage} {u.turns}x{'/'.join(u.tiers)} {u.avg_ttft_ms:.0f} ms" for stage, u in self.stages.items()
+        )
+        fallback = sum(s.fallback_turns for s in self.stages.values())
+        failed = sum(s.failed_turns for s in self.stages.values())
+        return (
+            f"{self.turns} LLM turns ({fallback} served by the fallback, {failed} failed), ${self.cost_usd:.5f}"
+            + (f" ({per_stage})" if per_stage else "")
+        )
+
+
+class LLMRouter:
+    """Picks a model tier per script stage and moves stages to faster tiers while a tier is slow."""
+
+    def __init__(
+        self,
+        tiers: List[ModelTier],
+        stage_tiers: Dict[str, str],
+        default_tier: str,
+        degrade_ttft_ms: float,
+        degrade_seconds: float,
+        window: int = 20,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if not tiers:
+            raise ValueError("LLM routing needs at least one tier")
+        self.tiers = tiers
+        self._index = {tier.name: i for i, tier in enumerate(tiers)}
+        if default_tier not in self._index:
+            raise ValueError(f"Unknown default LLM tier {default_tier!r}")
+        unknown = sorted(set(stage_tiers.values()) - set(self._index))
+        if unknown:
+            raise ValueError(f"Unknown LLM tiers in stage routing: {', '.join(unknown)}")
+        self.stage_tiers = stage_tiers
+        self.default_tier = default_tier
+        self.degrade_ttft_ms = degrade_ttft_ms
+        self.degrade_seconds = degrade_seconds
+        self._clock = clock
+        self._ttft: Dict[str, Deque[float]] = {tier.name: deque(maxlen=window) for tier in tiers}
+        self._degraded_until: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def tier(self, name: str) -> ModelTier:
+        return self.tiers[self._index[name]]
+
+    def _is_degraded(self, name: str, now: float) -> bool:
+        until = self._degraded_until.get(name)
+        if until is None:
+            return False
+        if now < until:
+            return True
+        # Cool-down over: send traffic again and judge it on fresh samples
+        del self._degraded_until[name]
+        self._ttft[name].clear()
+        logger.info(f"LLM tier {name} back in service")
+        return False
+
+    def choose(self, stage: str) -> RouteChoice:
+        """The tier for a stage, stepping to faster tiers while the configured one is degraded."""
+        index = self._index[self.stage_tiers.get(stage, self.default_tier)]
+        now = self._clock()
+        degraded = False
+        with self._lock:
+            while index > 0 and self._is_degraded(self.tiers[index].name, now):
+                index -= 1
+                degraded = True
+        return RouteChoice(stage, self.tiers[index], degraded)
+
+    def fallback_tier(self, tier: ModelTier, model: str) -> ModelTier:
+        """tier as served by its hedge: the fallback model with the tier's limits.
+
+        Prices come from a tier already on that model; without one the routed
+        tier's prices are the best estimate there is.
+        """
+        priced = next((t for t in self.tiers if t.model == model), tier)
+        return replace(tier, model=model, input_cost=priced.input_cost, output_cost=priced.output_cost)
+
+    def p95_ms(self, tier: str) -> float:
+        samples = sorted(self._ttft[tier])
+        return samples[int(len(samples) * 0.95)] if samples else 0.0
+
+    def record(
+        self,
+        choice: RouteChoice,
+        ttft_ms: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        stats: Optional[RoutingStats] = None,
+        fallback_model: Optional[str] = None,
+        failed: bool = False,
+    ):
+        """Account one finished request and degrade its tier when it has become too slow.
+
+        fallback_model names the hedge model when it, not the tier's own model,
+        served the request; its tokens are priced accordingly. A failed request
+        is sampled at whatever latency the caller gives, normally the deadline.
+        """
+        name = choice.tier.name
+        served = self.fallback_tier(choice.tier, fallback_model) if fallback_model else choice.tier
+        with self._lock:
+            samples = self._ttft[name]
+            samples.append(ttft_ms)
+            p95 = self.p95_ms(name)
+            # The fastest tier has nowhere faster to send its stages
+            trip = (
+                self._index[name] > 0 and len(samples) >= MIN_SAMPLES
+                and p95 > self.degrade_ttft_ms and name not in self._degraded_until
+            )
+            if trip:
+                self._degraded_until[name] = self._clock() + self.degrade_seconds
+        if trip:
+            logger.warning(
+                f"LLM tier {name} p95 time to first token {p95:.0f} ms > {self.degrade_ttft_ms:.0f} ms; "
+                f"routing its stages to faster tiers for {self.degrade_seconds:.0f}s"
+            )
+        if stats is not None:
+            stats.record(choice, ttft_ms, prompt_tokens, completion_tokens, served, failed)
+        side = "none" if failed else "fallback" if fallback_model else "primary"
+        telemetry = get_telemetry()
+        telemetry.count("shop_llm_turns_total", stage=choice.stage, tier=name, served_by=side)
+        telemetry.count("shop_llm_cost_usd_total", served.cost(prompt_tokens, completion_tokens), stage=choice.stage, tier=name, served_by=side)
+        telemetry.observe("shop_llm_ttft_seconds", ttft_ms / 1000, stage=choice.stage, tier=name)
+
+    def report(self) -> List[Dict[str, Any]]:
+        now = self._clock()
+        with self._lock:
+            return [
+                {
+                    "tier": tier.name,
+                    "model": tier.model,
+                    "p95_ttft_ms": round(self.p95_ms(tier.name), 1),
+                    "degraded_for_s": round(max(0.0, self._degraded_until.get(tier.name, now) - now), 1),
+                }
+                for tier in self.tiers
+            ]
+
+
+def tiers_from_settings(settings: Settings) -> List[ModelTier]:
+    """LLM_TIERS as ModelTier objects; a tier without a model uses OPENAI_MODEL."""
+    return [
+        ModelTier(
+            name=name,
+            model=spec.get("model") or settings.openai_model,
+            temperature=float(spec.get("temperature", 0.3)),
+            max_tokens=int(spec.get("max_tokens", 300)),
+            input_cost=float(spec.get("input_cost", 0.0)),
+            output_cost=float(spec.get("output_cost", 0.0)),
+        )
+        for name, spec in settings.llm_tiers.items()
+    ]
+
+
+@lru_cache(maxsize=1)
+def get_llm_router() -> LLMRouter:
+    s = get_settings()
+    return LLMRouter(
+        tiers_from_settings(s),
+        s.llm_stage_tiers,
+        s.llm_default_tier,
+        s.llm_degrade_ttft_ms,
+        s.llm_degrade_seconds,
+    )
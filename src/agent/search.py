@@ -0,0 +1,562 @@
+"""Semantic product search: "something warm under 4000 rupees" to ranked products.
+
+Each product's name, category and description are embedded once and filed
+in an inverted-file (IVF) index under the nearest of about sqrt(n) centroids.
+A query is embedded, the lists of its closest centroids give a candidate set,
+and candidates are reranked by exact cosine similarity after applying any
+price limits parsed from the query.
+Catalogs below ``SEARCH_EXACT_THRESHOLD`` items are scanned exactly instead.
+
+Embeddings come from fastembed when it is installed (CPU, ONNX) and from a
+dependency-free hashing embedder otherwise. The index is keyed by SKU and
+content hash, so an inventory.json change only re-embeds the products whose
+text changed.
+
+Run ``python -m agent.search --items 20000`` to benchmark build, incremental
+sync and query latency, and ANN recall against an exact scan.
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import heapq
+import json
+import logging
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from operator import itemgetter
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .catalog import Product, get_catalog
+from .config import get_settings
+
+logger = logging.getLogger("shop_agent")
+
+Vector = List[float]
+
+_WORD = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a an the and or for of to in on with some something anything i im me my want "
+    "looking need like would please show find get have any that is it".split()
+)
+
+# Query-side expansion for the hashing embedder, which only matches words
+# literally; fastembed models capture these relations on their own.
+CONCEPTS: Dict[str, Tuple[str, ...]] = {
+    "warm": ("hoodie", "jacket", "bomber", "fleece", "winter"),
+    "cold": ("hoodie", "jacket", "bomber", "fleece", "winter"),
+    "winter": ("hoodie", "jacket", "bomber", "fleece", "warm"),
+    "cozy": ("comfort", "hoodie", "soft", "casual"),
+    "comfy": ("comfort", "hoodie", "soft", "casual"),
+    "comfortable": ("comfort", "soft", "casual"),
+    "light": ("lightweight", "tshirt", "breathable"),
+    "summer": ("lightweight", "tshirt", "breathable"),
+    "hot": ("lightweight", "tshirt", "breathable"),
+    "rain": ("windbreaker", "jacket"),
+    "windy": ("windbreaker", "jacket"),
+    "wind": ("windbreaker", "jacket"),
+    "smart": ("classic", "stylish"),
+    "formal": ("classic", "stylish"),
+    "office": ("classic", "stylish", "everyday"),
+    "daily": ("everyday", "casual"),
+    "gym": ("active", "movement", "lightweight"),
+    "sport": ("active", "movement", "lightweight"),
+    "running": ("active", "movement", "lightweight"),
+    "workout": ("active", "movement", "lightweight"),
+    "tough": ("rugged", "bomber"),
+    "outdoor": ("rugged", "windbreaker", "jacket"),
+    "tee": ("tshirt",),
+    "shirt": ("tshirt",),
+}
+
+_AMOUNT = r"(?:rs\.?|pkr|rupees)?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|thousand)?\s*(?:rupees|rs\.?|pkr)?"
+_BETWEEN = re.compile(rf"\bbetween\s+{_AMOUNT}\s+(?:and|to|-)\s+{_AMOUNT}", re.IGNORECASE)
+_MAX = re.compile(
+    rf"\b(?:under|below|less than|cheaper than|at most|max(?:imum)?|up to|within|no more than)\s+{_AMOUNT}",
+    re.IGNORECASE,
+)
+_MIN = re.compile(rf"\b(?:over|above|more than|at least|minimum|starting at|from)\s+{_AMOUNT}", re.IGNORECASE)
+
+
+def _amount(number: str, scale: Optional[str]) -> int:
+    value = float(number.replace(",", ""))
+    return int(value * 1000) if scale else int(value)
+
+
+def parse_price_filter(text: str) -> Tuple[str, Optional[int], Optional[int]]:
+    """Split "warm under 4000 rupees" into ("warm", None, 4000): (query, min price, max price)."""
+    min_price = max_price = None
+    match = _BETWEEN.search(text)
+    if match:
+        low, high = _amount(match.group(1), match.group(2)), _amount(match.group(3), match.group(4))
+        min_price, max_price = min(low, high), max(low, high)
+        text = text[:match.start()] + text[match.end():]
+    match = _MAX.search(text)
+    if match:
+        max_price = _amount(match.group(1), match.group(2))
+        text = text[:match.start()] + text[match.end():]
+    match = _MIN.search(text)
+    if match:
+        min_price = _amount(match.group(1), match.group(2))
+        text = text[:match.start()] + text[match.end():]
+    return " ".join(text.split()), min_price, max_price
+
+
+def _tokens(text: str) -> List[str]:
+    text = text.lower().replace("-", "").replace("'", "")
+    words = []
+    for word in _WORD.findall(text):
+        if word in _STOPWORDS:
+            continue
+        # Light plural folding so "hoodies" matches "hoodie"
+        if len(word) > 4 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def _normalize(vector: Vector) -> Vector:
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+SparseVector = Tuple[Tuple[int, float], ...]
+
+
+def sparse(vector: Vector) -> SparseVector:
+    """Non-zero (index, value) pairs; hashed vectors have only a few dozen."""
+    return tuple((i, x) for i, x in enumerate(vector) if x)
+
+
+def dot(query: Vector, entry: SparseVector) -> float:
+    return sum(query[i] * x for i, x in entry)
+
+
+class HashingEmbedder:
+    """Dependency-free embedder: signed feature hashing of words, word pairs and concept expansions."""
+
+    name = "hashing"
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def _add(self, vector: Vector, feature: str, weight: float):
+        h = zlib.crc32(feature.encode("utf-8"))
+        vector[h % self.dimensions] += weight if h & 0x80000000 else -weight
+
+    def _embed(self, text: str, expand: bool) -> Vector:
+        vector = [0.0] * self.dimensions
+        words = _tokens(text)
+        for word in words:
+            self._add(vector, word, 1.0)
+            if expand:
+                for related in CONCEPTS.get(word, ()):
+                    self._add(vector, related, 0.6)
+        for first, second in zip(words, words[1:]):
+            self._add(vector, f"{first} {second}", 0.5)
+        return _normalize(vector)
+
+    def embed(self, texts: Sequence[str]) -> List[Vector]:
+        return [self._embed(text, expand=False) for text in texts]
+
+    def embed_query(self, text: str) -> Vector:
+        return self._embed(text, expand=True)
+
+
+class FastEmbedEmbedder:
+    """Local ONNX sentence embeddings via fastembed (runs on CPU)."""
+
+    name = "fastembed"
+
+    def __init__(self, model_name: str):
+        from fastembed import TextEmbedding
+
+        self.model = TextEmbedding(model_name=model_name)
+        self.dimensions = len(self.embed_query("hoodie"))
+
+    def embed(self, texts: Sequence[str]) -> List[Vector]:
+        return [_normalize([float(x) for x in v]) for v in self.model.embed(list(texts))]
+
+    def embed_query(self, text: str) -> Vector:
+        embed = getattr(self.model, "query_embed", self.model.embed)
+        return _normalize([float(x) for x in next(iter(embed([text])))])
+
+
+def create_embedder():
+    """fastembed when available (SEARCH_EMBEDDER=auto|fastembed), otherwise the hashing embedder."""
+    s = get_settings()
+    if s.search_embedder in ("auto", "fastembed"):
+        try:
+            return FastEmbedEmbedder(s.search_embedding_model)
+        except Exception as e:
+            level = logging.WARNING if s.search_embedder == "fastembed" else logging.INFO
+            logger.log(level, f"fastembed unavailable ({e}) - using hashing embedder for product search")
+    return HashingEmbedder(s.search_dimensions)
+
+
+class IvfIndex:
+    """Inverted-file ANN: each vector is filed under its nearest centroid and a
+    query scans only the lists of its closest few centroids.
+
+    Centroids are sampled from the catalog (about sqrt(n) of them), which needs
+    no training passes and keeps add and remove O(centroids), so incremental
+    syncs stay cheap. Centroids are re-sampled when the catalog grows or shrinks
+    fourfold.
+    """
+
+    def __init__(self, dimensions: int, probes: int = 8, seed: int = 13):
+        self.dimensions = dimensions
+        self.probes = probes
+        self._rng = random.Random(seed)
+        self._centroids: List[SparseVector] = []
+        self._lists: List[Set[str]] = []
+        self._assigned: Dict[str, int] = {}
+        self.trained_size = 0
+
+    @property
+    def trained(self) -> bool:
+        return bool(self._centroids)
+
+    def needs_training(self, size: int) -> bool:
+        return not self.trained or size > 4 * self.trained_size or 4 * size < self.trained_size
+
+    def train(self, vectors: Dict[str, SparseVector]):
+        keys = list(vectors)
+        count = max(1, int(math.sqrt(len(keys))))
+        self._centroids = [vectors[k] for k in self._rng.sample(keys, count)]
+        self._lists = [set() for _ in self._centroids]
+        self._assigned.clear()
+        for key, vector in vectors.items():
+            self.add(key, vector)
+        self.trained_size = len(keys)
+
+    def _dense(self, vector: SparseVector) -> Vector:
+        dense = [0.0] * self.dimensions
+        for i, x in vector:
+            dense[i] = x
+        return dense
+
+    def _closest(self, query: Vector, count: int) -> List[int]:
+        scores = [dot(query, centroid) for centroid in self._centroids]
+        return sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:count]
+
+    def add(self, key: str, vector: SparseVector):
+        if not self.trained:
+            return
+        slot = self._closest(self._dense(vector), 1)[0]
+        self._lists[slot].add(key)
+        self._assigned[key] = slot
+
+    def remove(self, key: str):
+        slot = self._assigned.pop(key, None)
+        if slot is not None:
+            self._lists[slot].discard(key)
+
+    def candidates(self, query: Vector) -> Set[str]:
+        found: Set[str] = set()
+        for slot in self._closest(query, self.probes):
+            found.update(self._lists[slot])
+        return found
+
+
+def embedding_text(product: Product) -> str:
+    return f"{product.name}. {product.category}. {product.description}"
+
+
+@dataclass(slots=True)
+class _Entry:
+    product: Product
+    digest: str
+    vector: SparseVector
+
+
+@dataclass
+class SyncStats:
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    reused: int = 0
+    seconds: float = 0.0
+
+
+@dataclass(slots=True)
+class SearchHit:
+    product: Product
+    score: float
+
+
+@dataclass
+class SearchResult:
+    query: str
+    min_price: Optional[int]
+    max_price: Optional[int]
+    hits: List[SearchHit] = field(default_factory=list)
+
+
+class ProductSearchIndex:
+    """Vector index over the catalog that re-embeds only changed products on sync.
+
+    Sync and search run in worker threads; a lock keeps searches from reading
+    a half-synced index.
+    """
+
+    def __init__(self, embedder=None, exact_threshold: Optional[int] = None):
+        s = get_settings()
+        self.embedder = embedder or create_embedder()
+        self.exact_threshold = s.search_exact_threshold if exact_threshold is None else exact_threshold
+        self.ivf = IvfIndex(self.embedder.dimensions, s.search_ivf_probes)
+        self._entries: Dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+        self.version = ""
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def sync(self, products: Iterable[Product], version: str = "") -> SyncStats:
+        """Bring the index in line with products, embedding only new or changed text."""
+        with self._lock:
+            return self._sync(products, version)
+
+    def _sync(self, products: Iterable[Product], version: str) -> SyncStats:
+        started = time.perf_counter()
+        stats = SyncStats()
+        seen: Set[str] = set()
+        pending: List[Tuple[Product, str, str]] = []
+        for product in products:
+            seen.add(product.sku)
+            text = embedding_text(product)
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=12).hexdigest()
+            entry = self._entries.get(product.sku)
+            if entry is not None and entry.digest == digest:
+                # Same text: keep the vector, pick up price changes
+                entry.product = product
+                stats.reused += 1
+            else:
+                pending.append((product, text, digest))
+
+        for sku in [sku for sku in self._entries if sku not in seen]:
+            del self._entries[sku]
+            self.ivf.remove(sku)
+            stats.removed += 1
+
+        if pending:
+            vectors = self.embedder.embed([text for _, text, _ in pending])
+            for (product, _, digest), vector in zip(pending, vectors):
+                if product.sku in self._entries:
+                    self.ivf.remove(product.sku)
+                    stats.updated += 1
+                else:
+                    stats.added += 1
+                entry = self._entries[product.sku] = _Entry(product, digest, sparse(vector))
+                self.ivf.add(product.sku, entry.vector)
+
+        if len(self._entries) > self.exact_threshold and self.ivf.needs_training(len(self._entries)):
+            self.ivf.train({sku: e.vector for sku, e in self._entries.items()})
+
+        self.version = version
+        stats.seconds = round(time.perf_counter() - started, 3)
+        return stats
+
+    def search(
+        self,
+        query: str,
+        limit: int = 3,
+        min_price: Optional[int] = None,
+        max_price: Optional[int] = None,
+        exact: bool = False,
+    ) -> SearchResult:
+        """Ranked products for a free-text query; price limits in the text are applied too."""
+        with self._lock:
+            return self._search(query, limit, min_price, max_price, exact)
+
+    def _search(
+        self, query: str, limit: int, min_price: Optional[int], max_price: Optional[int], exact: bool,
+    ) -> SearchResult:
+        text, parsed_min, parsed_max = parse_price_filter(query)
+        min_price = min_price if min_price is not None else parsed_min
+        max_price = max_price if max_price is not None else parsed_max
+        result = SearchResult(text, min_price, max_price)
+
+        def in_range(product: Product) -> bool:
+            price = product.price
+            if min_price is not None and (price is None or price < min_price):
+                return False
+            if max_price is not None and (price is None or price > max_price):
+                return False
+            return True
+
+        if not text:
+            # Only a price was given: cheapest matching products first
+            matches = sorted((e.product for e in self._entries.values() if in_range(e.product)),
+                             key=lambda p: p.price or 0)
+            result.hits = [SearchHit(p, 0.0) for p in matches[:limit]]
+            return result
+
+        vector = self.embedder.embed_query(text)
+        if exact or len(self._entries) <= self.exact_threshold:
+            pool: Iterable[_Entry] = self._entries.values()
+        else:
+            keys = self.ivf.candidates(vector)
+            pool = [self._entries[k] for k in keys]
+            if sum(1 for e in pool if in_range(e.product)) < limit:
+                # Too few candidates survive the price filter; scan the whole range
+                pool = self._entries.values()
+
+        if min_price is not None or max_price is not None:
+            pool = [e for e in pool if in_range(e.product)]
+        best = heapq.nlargest(limit, ((dot(vector, e.vector), e.product) for e in pool), key=itemgetter(0))
+        result.hits = [SearchHit(product, round(score, 4)) for score, product in best if score > 0]
+        return result
+
+
+_index_lock = threading.Lock()
+_index: Optional[ProductSearchIndex] = None
+
+
+def get_search_index() -> ProductSearchIndex:
+    """Process-wide search index, synced incrementally whenever the catalog revision changes."""
+    global _index
+    snapshot = get_catalog().refresh()
+    index = _index
+    if index is not None and index.version == snapshot.version:
+        return index
+    with _index_lock:
+        if _index is None:
+            _index = ProductSearchIndex()
+        if _index.version != snapshot.version:
+            stats = _index.sync(snapshot.products, snapshot.version)
+            logger.info(
+                f"Search index synced: {stats.added} added, {stats.updated} updated, "
+                f"{stats.removed} removed, {stats.reused} reused in {stats.seconds}s ({_index.embedder.name})"
+            )
+        return _index
+
+
+def render_search_results(result: SearchResult) -> str:
+    """Render the search_products tool response."""
+    limits = []
+    if result.min_price is not None:
+        limits.append(f"from PKR {result.min_price:,}")
+    if result.max_price is not None:
+        limits.append(f"up to PKR {result.max_price:,}")
+    scope = f" ({', '.join(limits)})" if limits else ""
+    if not result.hits:
+        categories = ", ".join(get_catalog().categories())
+        return f"No products match '{result.query}'{scope}. Offer these categories instead: {categories}."
+    lines = [
+        f"Option {i}: {hit.product.name} ({hit.product.category}) - {hit.product.description} - {hit.product.price_label()}"
+        for i, hit in enumerate(result.hits, 1)
+    ]
+    return f"Best matches for '{result.query}'{scope}:\n\n" + "\n\n".join(lines) + "\n\nAll prices are in PKR (Pakistani Rupees)."
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+_DESCRIPTIONS = (
+    "Perfect for a casual, rugged look", "A stylish choice for everyday wear",
+    "Lightweight and ideal for active movement", "Warm fleece lining for winter evenings",
+    "Breathable cotton for hot summer days", "Water resistant shell for windy rainy days",
+    "Soft brushed fabric for cozy weekends", "Tailored classic fit for the office",
+)
+
+
+def synthetic_products(items: int, seed: int = 11) -> List[Product]:
+    from .resolver import synthetic_catalog
+
+    rng = random.Random(seed)
+    products = synthetic_catalog(items, seed)
+    for product in products:
+        product.description = rng.choice(_DESCRIPTIONS)
+        product.price = rng.randrange(500, 9000, 50)
+    return products
+
+
+@dataclass
+class SearchBenchReport:
+    items: int
+    embedder: str
+    build_seconds: float
+    resync_seconds: float
+    resync_embedded: int
+    p50_ms: float
+    p99_ms: float
+    exact_p50_ms: float
+    recall_at_k: float
+    mean_candidates: float
+
+
+def benchmark(items: int, queries: int = 200, limit: int = 5, seed: int = 11) -> SearchBenchReport:
+    products = synthetic_products(items, seed)
+    index = ProductSearchIndex(exact_threshold=0)
+    build = index.sync(products, "v1")
+
+    # Change 1% of descriptions and prices: only the changed text is re-embedded
+    rng = random.Random(seed + 1)
+    for product in rng.sample(products, max(1, items // 100)):
+        product.description = rng.choice(_DESCRIPTIONS) + " with a modern cut"
+        product.price = (product.price or 0) + 100
+    resync = index.sync(products, "v2")
+
+    phrases = ("something warm under 4000 rupees", "light tee for the gym", "rain jacket",
+               "cozy hoodie between 1000 and 3000", "classic office shirt", "rugged bomber over 2k")
+    timings, exact_timings, overlap, candidates = [], [], 0.0, 0
+    for i in range(queries):
+        query = phrases[i % len(phrases)]
+        t = time.perf_counter()
+        approx = index.search(query, limit)
+        timings.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        truth = index.search(query, limit, exact=True)
+        exact_timings.append((time.perf_counter() - t) * 1000)
+        candidates += len(index.ivf.candidates(index.embedder.embed_query(approx.query)))
+        if truth.hits:
+            # Synthetic products share descriptions, so count any hit scoring as well as the exact k-th
+            cutoff = truth.hits[-1].score - 1e-9
+            overlap += sum(1 for h in approx.hits if h.score >= cutoff) / len(truth.hits)
+
+    timings.sort()
+    exact_timings.sort()
+    return SearchBenchReport(
+        items=items,
+        embedder=index.embedder.name,
+        build_seconds=build.seconds,
+        resync_seconds=resync.seconds,
+        resync_embedded=resync.added + resync.updated,
+        p50_ms=round(timings[len(timings) // 2], 2),
+        p99_ms=round(timings[int(len(timings) * 0.99)], 2),
+        exact_p50_ms=round(exact_timings[len(exact_timings) // 2], 2),
+        recall_at_k=round(overlap / queries, 3),
+        mean_candidates=round(candidates / queries, 1),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark semantic product search on a synthetic catalog.")
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = benchmark(args.items, args.queries, args.limit)
+    print(f"Catalog: {report.items} items, {report.embedder} embedder, indexed in {report.build_seconds}s")
+    print(f"Incremental sync: {report.resync_embedded} re-embedded in {report.resync_seconds}s")
+    print(f"Queries: p50 {report.p50_ms} ms, p99 {report.p99_ms} ms (exact scan p50 {report.exact_p50_ms} ms)")
+    print(f"Recall@{args.limit} vs exact scan: {report.recall_at_k:.1%}, {report.mean_candidates:.0f} candidates per query")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(asdict(report), f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,15 +1,25 @@
 from __future__ import annotations
 
-import csv
-import os
+import asyncio
+import logging
 from dataclasses import dataclass, field
 from datetime import UTC, datetime
 from enum import Enum
-from typing import Any, Dict, List, Optional
-
+from typing import Any, Coroutine, Dict, List, Optional, Set
+
+from .context import ContextStats
+from .dialog import DialogEngine, DialogStats
+from .logs import log_event
+from .orders import OrderLedger, get_order_ledger
+from .prefetch import Prefetcher, PrefetchStats
+from .routing import RoutingStats
+from .telemetry import get_telemetry
 from .types import CallResult, OrderResult
 
 
+logger = logging.getLogger("shop_agent")
+
+
 class DataKey(Enum):
     CUSTOMER_NAME = "customer_name"
     PRODUCT_SELECTION = "product_selection"
@@ -30,16 +40,9 @@ class CallSession:
 
 
 class SessionManager:
-    def __init__(self, results_file: str = "orders.csv"):
-        self.results_file = results_file
+    def __init__(self, ledger: OrderLedger):
+        self.ledger = ledger
         self.session = CallSession()
-        self._ensure_csv_headers()
-
-    def _ensure_csv_headers(self):
-        if not os.path.exists(self.results_file):
-            with open(self.results_file, "w", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["timestamp", "customer_name", "product", "email", "order_id", "tracking_id", "summary"])
 
     def update_data(self, key: DataKey, value: str):
         """Update session data with key-value pair."""
@@ -50,24 +53,23 @@ class SessionManager:
         
         if key == DataKey.CUSTOMER_NAME:
             self.session.customer_name = value
-            print(f"Customer name updated: {value}")
             
         elif key == DataKey.PRODUCT_SELECTION:
             self.session.product_selection = value
-            print(f"Product selection updated: {value}")
                 
         elif key == DataKey.EMAIL:
             self.session.email = value
-            print(f"Email updated: {value}")
             
         elif key == DataKey.SCRIPT_STAGE:
             self.session.script_stage = value
-            print(f"📝 Script stage updated: {value}")
             
         elif key == DataKey.SUMMARY:
             self.session.summary = value
             self.session.is_ai_completed = True
-            print(f"📝 Summary provided - call marked as AI completed: {value}")
+            log_event(logger, "call_summary", "Summary provided - call marked as AI completed", summary=value)
+            return
+
+        log_event(logger, "data_updated", f"{key.value} updated", field=key.value, value=value)
 
     def is_summary_provided(self) -> bool:
         """Check if summary was provided (indicates call completion)."""
@@ -86,10 +88,10 @@ class SessionManager:
         else:
             return "Call hung up by user"
 
-    def save_order_data(self, order_id: str, tracking_id: str):
-        """Save order data to CSV."""
+    async def save_order_data(self, order_id: str, tracking_id: str):
+        """Save order data to the order ledger, returning once it is committed."""
         if not self.session.customer_name or not self.session.product_selection:
-            print("No order data to save")
+            logger.warning("No order data to save")
             return None
 
         result = OrderResult(
@@ -102,24 +104,102 @@ class SessionManager:
             summary=self.generate_summary()
         )
 
-        with open(self.results_file, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                result.timestamp,
-                result.customer_name,
-                result.product,
-                result.email,
-                result.order_id,
-                result.tracking_id,
-                result.summary
-            ])
-
-        print(f"Order data saved:")
-        print(f"   Customer: {result.customer_name}")
-        print(f"   Product: {result.product}")
-        print(f"   Email: {result.email}")
-        print(f"   Order ID: {result.order_id}")
-        print(f"   Tracking ID: {result.tracking_id}")
-        print(f"   Summary: {result.summary}")
+        await asyncio.wrap_future(self.ledger.append(result))
+
+        log_event(
+            logger, "order_saved", "Order data saved",
+            customer=result.customer_name, product=result.product, email=result.email,
+            order_id=result.order_id, tracking_id=result.tracking_id, summary=result.summary,
+        )
 
         return result
+
+
+@dataclass
+class CallState:
+    """Everything owned by a single job: its session data, completion flag and tasks."""
+    call_id: str
+    room_name: str
+    session_manager: SessionManager
+    completed: bool = False
+    tasks: Set[asyncio.Task] = field(default_factory=set)
+    prefetcher: Prefetcher = field(default_factory=Prefetcher)
+    dialog: Optional[DialogEngine] = None
+    routing: RoutingStats = field(default_factory=RoutingStats)
+    context: ContextStats = field(default_factory=ContextStats)
+
+    def __post_init__(self):
+        if self.dialog is None:
+            self.dialog = DialogEngine(self.session_manager)
+
+    @property
+    def session(self) -> CallSession:
+        return self.session_manager.session
+
+    def spawn(self, coro: Coroutine[Any, Any, Any]) -> asyncio.Task:
+        """Run a background task that is cancelled when the call is closed."""
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    async def cancel_tasks(self):
+        """Cancel all background tasks except the one currently running."""
+        current = asyncio.current_task()
+        pending = [task for task in self.tasks if task is not current and not task.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+class SessionRegistry:
+    """Per-process registry of active calls keyed by job id."""
+
+    def __init__(self, ledger: Optional[OrderLedger] = None):
+        # Opened in the job process (ShopAgent.prewarm) so the registry stays picklable.
+        self._ledger = ledger
+        self._calls: Dict[str, CallState] = {}
+        self.prefetch_stats = PrefetchStats()
+        self.dialog_stats = DialogStats()
+        self.routing_stats = RoutingStats()
+        self.context_stats = ContextStats()
+
+    @property
+    def ledger(self) -> OrderLedger:
+        if self._ledger is None:
+            self._ledger = get_order_ledger()
+        return self._ledger
+
+    def open(self, call_id: str, room_name: str) -> CallState:
+        """Create isolated state for a new job."""
+        if call_id in self._calls:
+            raise ValueError(f"Call {call_id} is already registered")
+        state = CallState(
+            call_id=call_id,
+            room_name=room_name,
+            session_manager=SessionManager(self.ledger),
+        )
+        self._calls[call_id] = state
+        get_telemetry().gauge("shop_active_sessions", 1)
+        return state
+
+    def get(self, call_id: str) -> Optional[CallState]:
+        return self._calls.get(call_id)
+
+    async def close(self, call_id: str):
+        """Cancel the call's background tasks and drop its state."""
+        state = self._calls.pop(call_id, None)
+        if state is not None:
+            await state.cancel_tasks()
+            self.prefetch_stats.merge(state.prefetcher.close())
+            self.dialog_stats.merge(state.dialog.stats)
+            self.routing_stats.merge(state.routing)
+            self.context_stats.merge(state.context)
+            get_telemetry().gauge("shop_active_sessions", -1)
+
+    def active_calls(self) -> List[CallState]:
+        return list(self._calls.values())
+
+    def __len__(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import asyncio
+import re
+import time
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+
+from .types import StageLatency
+
+if TYPE_CHECKING:
+    from .types import AgentPipeline
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])[\"')\]]*\s+")
+_SOFT_BREAK = re.compile(r"[,;:]\s+")
+
+
+class SentenceChunker:
+    """Accumulates streamed LLM tokens and emits sentence-sized chunks for TTS."""
+
+    def __init__(self, min_chars: int = 12, max_chars: int = 200):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self._buffer = ""
+
+    def push(self, token: str) -> List[str]:
+        self._buffer += token
+        chunks = []
+        while True:
+            chunk = self._next_chunk()
+            if chunk is None:
+                return chunks
+            chunks.append(chunk)
+
+    def _next_chunk(self) -> Optional[str]:
+        for match in _SENTENCE_END.finditer(self._buffer):
+            if match.end() >= self.min_chars:
+                return self._take(match.end())
+
+        if len(self._buffer) > self.max_chars:
+            breaks = [m.end() for m in _SOFT_BREAK.finditer(self._buffer, 0, self.max_chars)]
+            if breaks:
+                return self._take(breaks[-1])
+            space = self._buffer.rfind(" ", 0, self.max_chars)
+            return self._take(space + 1 if space > 0 else self.max_chars)
+        return None
+
+    def _take(self, end: int) -> str:
+        chunk, self._buffer = self._buffer[:end].strip(), self._buffer[end:]
+        return chunk
+
+    def flush(self) -> Optional[str]:
+        chunk, self._buffer = self._buffer.strip(), ""
+        return chunk or None
+
+
+class StreamingTurn:
+    """One streamed user turn through an AgentPipeline.
+
+    Partial transcripts are consumed as they arrive, LLM tokens are split into
+    sentences, and each sentence is synthesized as soon as it forms while later
+    sentences are still being generated. Audio is yielded in sentence order.
+    Providers without streaming methods fall back to their one-shot protocol
+    methods, so plain STTProvider/LLMProvider/TTSProvider stubs work too.
+    """
+
+    def __init__(
+        self,
+        pipeline: AgentPipeline,
+        audio: AsyncIterable[bytes],
+        history: Optional[List[Dict[str, Any]]] = None,
+        cancel: Optional[asyncio.Event] = None,
+        max_parallel_tts: int = 2,
+    ):
+        self.pipeline = pipeline
+        self.audio = audio
+        self.history = history
+        self.latency = StageLatency()
+        self.transcript = ""
+        self.reply = ""
+        self.cancelled = False
+        self._cancel_event = cancel or asyncio.Event()
+        self._tts_slots = asyncio.Semaphore(max_parallel_tts)
+        self._tasks: List[asyncio.Task] = []
+        self._started = 0.0
+        self._final_at = 0.0
+
+    def cancel(self):
+        """Barge-in: stop generation and synthesis and end the audio stream."""
+        self.cancelled = True
+        self._cancel_event.set()
+        for task in self._tasks:
+            task.cancel()
+
+    def _elapsed_ms(self, since: float) -> float:
+        return (time.perf_counter() - since) * 1000
+
+    async def _transcribe(self) -> str:
+        stt = self.pipeline.stt
+        sample_rate = self.pipeline.sample_rate
+        if not hasattr(stt, "transcribe_stream"):
+            buffer = bytearray()
+            async for chunk in self.audio:
+                buffer.extend(chunk)
+            text = await stt.transcribe(bytes(buffer), sample_rate)
+            self.latency.stt_first_partial_ms = self._elapsed_ms(self._started)
+            return text
+
+        finals: List[str] = []
+        partial = ""
+        async for transcript in stt.transcribe_stream(self.audio, sample_rate):
+            if self.latency.stt_first_partial_ms is None:
+                self.latency.stt_first_partial_ms = self._elapsed_ms(self._started)
+            if transcript.is_final:
+                finals.append(transcript.text)
+                partial = ""
+            else:
+                partial = transcript.text
+        if partial:
+            finals.append(partial)
+        return " ".join(t.strip() for t in finals if t.strip())
+
+    async def _tokens(self, text: str) -> AsyncIterator[str]:
+        llm = self.pipeline.llm
+        if hasattr(llm, "generate_stream"):
+            async for token in llm.generate_stream(text, history=self.history):
+                yield token
+        else:
+            yield await llm.generate(text, history=self.history)
+
+    async def _synthesize(self, sentence: str, out: asyncio.Queue):
+        tts = self.pipeline.tts
+        sample_rate = self.pipeline.sample_rate
+        try:
+            async with self._tts_slots:
+                started = time.perf_counter()
+                if hasattr(tts, "synthesize_stream"):
+                    async for chunk in tts.synthesize_stream(sentence, sample_rate):
+                        if self.latency.tts_first_audio_ms is None:
+                            self.latency.tts_first_audio_ms = (time.perf_counter() - started) * 1000
+                        out.put_nowait(chunk)
+                else:
+                    chunk = await tts.synthesize(sentence, sample_rate)
+                    if self.latency.tts_first_audio_ms is None:
+                        self.latency.tts_first_audio_ms = (time.perf_counter() - started) * 1000
+                    out.put_nowait(chunk)
+        except Exception as e:
+            out.put_nowait(e)
+        finally:
+            out.put_nowait(None)
+
+    async def _produce(self, sentences: asyncio.Queue):
+        try:
+            self.transcript = await self._transcribe()
+            self._final_at = time.perf_counter()
+            self.latency.stt_final_ms = (self._final_at - self._started) * 1000
+            if not self.transcript or self._cancel_event.is_set():
+                return
+
+            chunker = SentenceChunker()
+            parts: List[str] = []
+
+            def emit(sentence: str):
+                out: asyncio.Queue = asyncio.Queue()
+                self._tasks.append(asyncio.create_task(self._synthesize(sentence, out)))
+                sentences.put_nowait(out)
+
+            async for token in self._tokens(self.transcript):
+                if self._cancel_event.is_set():
+                    return
+                if self.latency.llm_first_token_ms is None:
+                    self.latency.llm_first_token_ms = self._elapsed_ms(self._final_at)
+                parts.append(token)
+                for sentence in chunker.push(token):
+                    emit(sentence)
+            tail = chunker.flush()
+            if tail:
+                emit(tail)
+            self.reply = "".join(parts).strip()
+        finally:
+            sentences.put_nowait(None)
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        self._started = time.perf_counter()
+        sentences: asyncio.Queue = asyncio.Queue()
+        producer = asyncio.create_task(self._produce(sentences))
+        self._tasks.append(producer)
+        cancel_wait = asyncio.create_task(self._cancel_event.wait())
+        try:
+            while True:
+                out = await self._next(sentences, cancel_wait)
+                if out is None:
+                    break
+                while True:
+                    chunk = await self._next(out, cancel_wait)
+                    if chunk is None:
+                        break
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    if self.latency.response_ms is None:
+                        self.latency.response_ms = self._elapsed_ms(self._final_at)
+                    yield chunk
+            if producer.done() and not producer.cancelled() and producer.exception():
+                raise producer.exception()
+        finally:
+            cancel_wait.cancel()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, cancel_wait, return_exceptions=True)
+
+    async def _next(self, queue: asyncio.Queue, cancel_wait: asyncio.Task) -> Any:
+        """Next queue item, or None as soon as the turn is cancelled."""
+        if self._cancel_event.is_set():
+            return None
+        getter = asyncio.ensure_future(queue.get())
+        done, _ = await asyncio.wait({getter, cancel_wait}, return_when=asyncio.FIRST_COMPLETED)
+        if getter in done:
+            return getter.result()
+        getter.cancel()
+        return None
@@ -0,0 +1,408 @@
+"""Per-call latency spans and process counters.
+
+Spans cover each stage of a turn (end of speech, STT final, LLM first token,
+tool execution, TTS first audio, playback) and are exported as OpenTelemetry
+JSON (OTLP/JSON, one export request per line). Counters and span duration
+histograms are served in Prometheus text format on a local HTTP port. With
+TELEMETRY_ENABLED unset every entry point returns immediately.
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .config import Settings, get_settings
+from .logs import bind_call_id, current_call_id
+
+logger = logging.getLogger("shop_agent")
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SERVICE_NAME = "shop-agent"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    start_ns: int
+    end_ns: int = 0
+    parent_id: str = ""
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_s(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class _ActiveSpan:
+    """Context manager returned by Telemetry.span() while telemetry is enabled."""
+
+    def __init__(self, telemetry: "Telemetry", name: str, attributes: Dict[str, Any]):
+        self.telemetry = telemetry
+        self.name = name
+        self.attributes = attributes
+        self.start_ns = 0
+
+    def __enter__(self) -> "_ActiveSpan":
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.record_span(
+            self.name, self.start_ns, time.time_ns(), self.attributes,
+            error=f"{exc_type.__name__}: {exc}" if exc_type else None,
+        )
+        return False
+
+
+class _NoopSpan:
+    attributes: Dict[str, Any] = {}
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Telemetry:
+    """Process-wide spans, counters, gauges and span-duration histograms."""
+
+    def __init__(self, settings: Optional[Settings] = None):
+        self.settings = settings or get_settings()
+        self.enabled = self.settings.telemetry_enabled
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._gauges: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Tuple[str, Labels], List[float]] = {}
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._spans: List[Span] = []
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._flusher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self.metrics_port: Optional[int] = None
+
+    # Correlation
+
+    def bind_call(self, call_id: str) -> contextvars.Token:
+        """Attach spans and log records from the current context (and tasks it spawns) to a call."""
+        return bind_call_id(call_id)
+
+    @staticmethod
+    def trace_id(call_id: str) -> str:
+        """Stable trace id for a call, so every process reports its spans under one trace."""
+        return hashlib.sha256(call_id.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def _span_id() -> str:
+        return os.urandom(8).hex()
+
+    # Metrics
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def count(self, name: str, value: float = 1.0, **labels: str):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0.0) + value
+
+    def gauge(self, name: str, delta: float, **labels: str):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._gauges[key] = self._gauges.get(key, 0.0) + delta
+
+    def observe(self, name: str, seconds: float, **labels: str):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            buckets = self._histograms.get(key)
+            if buckets is None:
+                # One slot per bucket, then +Inf, sum and count
+                buckets = self._histograms[key] = [0.0] * (len(DURATION_BUCKETS) + 3)
+            buckets[bisect_left(DURATION_BUCKETS, seconds)] += 1
+            buckets[-2] += seconds
+            buckets[-1] += 1
+
+    # Spans
+
+    def span(self, name: str, **attributes: Any):
+        """Time a block as a span of the current call; a shared no-op when disabled."""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _ActiveSpan(self, name, attributes)
+
+    def record_span(
+        self,
+        name: str,
+        start_ns: int,
+        end_ns: int,
+        attributes: Optional[Dict[str, Any]] = None,
+        call_id: Optional[str] = None,
+        error: Optional[str] = None,
+    ):
+        """Record a span whose timing is already known, e.g. from LiveKit metrics events."""
+        if not self.enabled:
+            return
+        call_id = call_id or current_call_id()
+        attributes = dict(attributes or {})
+        if call_id:
+            attributes.setdefault("call.id", call_id)
+        span = Span(
+            name=name,
+            trace_id=self.trace_id(call_id or "process"),
+            span_id=self._span_id(),
+            start_ns=start_ns,
+            end_ns=max(end_ns, start_ns),
+            parent_id=self.trace_id(call_id)[:16] if call_id and name != "call" else "",
+            attributes=attributes,
+            error=error,
+        )
+        if name == "call":
+            span.span_id = span.trace_id[:16]
+        self.observe("shop_span_duration_seconds", span.duration_s, span=name)
+        if self.settings.telemetry_otel_path:
+            with self._lock:
+                self._spans.append(span)
+
+    def record_interval(self, name: str, start_time: float, seconds: Optional[float], **attributes: Any):
+        """Record a span from a start time (seconds since the epoch) and a duration."""
+        if not self.enabled or seconds is None or seconds < 0:
+            return
+        start_ns = int(start_time * 1e9)
+        self.record_span(name, start_ns, start_ns + int(seconds * 1e9), attributes)
+
+    def record_livekit_metrics(self, metrics: Any):
+        """Turn a LiveKit metrics_collected payload into per-stage spans of the current turn."""
+        if not self.enabled:
+            return
+        kind = getattr(metrics, "type", "")
+        emitted = getattr(metrics, "timestamp", None) or time.time()
+        speech_id = getattr(metrics, "speech_id", None) or ""
+        if kind == "eou_metrics":
+            # Emitted when the turn is committed; both delays count from the end of speech
+            speech_end = emitted - metrics.end_of_utterance_delay
+            self.record_interval("vad_end_of_speech", speech_end, metrics.end_of_utterance_delay, speech_id=speech_id)
+            self.record_interval("stt_final", speech_end, metrics.transcription_delay, speech_id=speech_id)
+        elif kind == "llm_metrics":
+            started = emitted - metrics.duration
+            self.record_interval("llm_first_token", started, metrics.ttft, speech_id=speech_id)
+            self.record_interval("llm", started, metrics.duration, speech_id=speech_id, tokens=metrics.total_tokens)
+        elif kind == "tts_metrics":
+            started = emitted - metrics.duration
+            self.record_interval("tts_first_audio", started, metrics.ttfb, speech_id=speech_id)
+            self.record_interval("tts", started, metrics.duration, speech_id=speech_id)
+
+    def traced_tool(self, name: str) -> Callable:
+        """Decorator that records a span and a call counter for a tool handler."""
+
+        def decorate(handler: Callable) -> Callable:
+            @functools.wraps(handler)
+            async def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return await handler(*args, **kwargs)
+                start_ns = time.time_ns()
+                try:
+                    result = await handler(*args, **kwargs)
+                except Exception as e:
+                    self.record_span(f"tool.{name}", start_ns, time.time_ns(), {"tool": name}, error=repr(e))
+                    self.count("shop_tool_calls_total", tool=name, status="error")
+                    raise
+                status = "error" if isinstance(result, str) and result.startswith("Error") else "ok"
+                self.record_span(f"tool.{name}", start_ns, time.time_ns(), {"tool": name, "status": status})
+                self.count("shop_tool_calls_total", tool=name, status=status)
+                return result
+
+            return wrapper
+
+        return decorate
+
+    # Export
+
+    def render_prometheus(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            gauges = dict(self._gauges)
+            histograms = {k: list(v) for k, v in self._histograms.items()}
+
+        lines: List[str] = []
+        emitted = set()
+
+        def header(name: str, default_kind: str):
+            if name in emitted:
+                return
+            emitted.add(name)
+            kind, help_text = self._help.get(name, (default_kind, name))
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name, "counter")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), value in sorted(gauges.items()):
+            header(name, "gauge")
+            lines.append(f"{name}{_format_labels(labels)} {value:g}")
+        for (name, labels), buckets in sorted(histograms.items()):
+            header(name, "histogram")
+            cumulative = 0.0
+            for bound, count in zip(DURATION_BUCKETS + (float("inf"),), buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative:g}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {buckets[-2]:g}")
+            lines.append(f"{name}_count{_format_labels(labels)} {buckets[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+    def flush(self):
+        """Append buffered spans to the OTLP JSON file."""
+        path = self.settings.telemetry_otel_path
+        with self._lock:
+            spans, self._spans = self._spans, []
+        if not path or not spans:
+            return
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [
+                    _otlp_attribute("service.name", SERVICE_NAME),
+                    _otlp_attribute("process.pid", os.getpid()),
+                ]},
+                "scopeSpans": [{"scope": {"name": "shop_agent"}, "spans": [s.to_otlp() for s in spans]}],
+            }]
+        }
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+
+    def start(self):
+        """Start the Prometheus endpoint and the span flusher; idempotent, no-op when disabled."""
+        if not self.enabled or self._flusher is not None:
+            return
+        s = self.settings
+        if s.telemetry_prometheus_port:
+            self._serve_metrics(s.telemetry_prometheus_port)
+        self._flusher = threading.Thread(target=self._flush_loop, name="telemetry-flush", daemon=True)
+        self._flusher.start()
+
+    def _serve_metrics(self, base_port: int):
+        telemetry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = telemetry.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        # Every job process exports its own metrics, so take the first free
+        # port at or above the configured one.
+        for port in range(base_port, base_port + self.settings.telemetry_port_range):
+            try:
+                self._server = ThreadingHTTPServer((self.settings.telemetry_host, port), MetricsHandler)
+            except OSError:
+                continue
+            self.metrics_port = port
+            threading.Thread(target=self._server.serve_forever, name="telemetry-http", daemon=True).start()
+            logger.info(f"Prometheus metrics on http://{self.settings.telemetry_host}:{port}/metrics")
+            return
+        logger.warning(f"Could not bind a metrics port in {base_port}-{base_port + self.settings.telemetry_port_range - 1}")
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.settings.telemetry_flush_seconds):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Telemetry flush failed: {e}")
+
+    def close(self):
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        self.flush()
+
+
+@lru_cache(maxsize=1)
+def get_telemetry() -> Telemetry:
+    telemetry = Telemetry()
+    telemetry.describe("shop_active_sessions", "gauge", "Calls currently open in this process")
+    telemetry.describe("shop_otp_sent_total", "counter", "OTP codes issued")
+    telemetry.describe("shop_orders_total", "counter", "Orders saved")
+    telemetry.describe("shop_tool_calls_total", "counter", "Tool invocations by tool and status")
+    telemetry.describe("shop_span_duration_seconds", "histogram", "Duration of traced call stages")
+    telemetry.describe("shop_provider_requests_total", "counter", "Provider requests by provider, side and outcome")
+    telemetry.describe("shop_breaker_trips_total", "counter", "Provider circuit breaker trips")
+    telemetry.describe("shop_llm_turns_total", "counter", "LLM requests by script stage and model tier")
+    telemetry.describe("shop_llm_cost_usd_total", "counter", "Estimated LLM spend in USD by script stage and model tier")
+    telemetry.describe("shop_llm_context_tokens_total", "counter", "LLM history tokens before and after context trimming")
+    telemetry.describe("shop_llm_ttft_seconds", "histogram", "LLM time to first token by script stage and model tier")
+    return telemetry
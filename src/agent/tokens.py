@@ -0,0 +1,318 @@
+"""Token accounting for the shop prompt, tool schemas and tool results.
+
+Run ``python -m agent.tokens`` to print the input tokens the LLM receives at
+each script stage of a typical call, with full and compact tool results side
+by side, plus the share of each request covered by the stable cacheable prefix
+and the estimated cost of each stage on its routed model tier. A second table
+replays a long call (email and OTP retries) and shows the tokens of each LLM
+request with the full history and with the bounded context window.
+Counts use tiktoken when it is installed and a four-characters-per-token
+estimate otherwise.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+from .catalog import get_catalog
+from .config import SHOP_PROMPT_RULES, get_settings, get_shop_prompt, render_shop_prompt
+from .constants import get_script_variables
+from .routing import get_llm_router
+from .tools import (
+    build_data_collection_schema,
+    build_find_product_schema,
+    build_generate_order_schema,
+    build_get_product_options_schema,
+    build_search_products_schema,
+    build_send_otp_schema,
+    build_verify_otp_schema,
+)
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Per-message framing overhead of the chat completions format
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=4)
+def _encoding(model: str):
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Number of tokens in text for the given model (defaults to the configured OpenAI model)."""
+    if not text:
+        return 0
+    if tiktoken is None:
+        return max(1, (len(text) + 3) // 4)
+    return len(_encoding(model or get_settings().openai_model).encode(text))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: Optional[str] = None) -> int:
+    return sum(MESSAGE_OVERHEAD_TOKENS + count_tokens(m["content"], model) for m in messages)
+
+
+def tool_schemas() -> List[Dict[str, Any]]:
+    return [
+        build_data_collection_schema(),
+        build_get_product_options_schema(),
+        build_search_products_schema(),
+        build_find_product_schema(),
+        build_send_otp_schema(),
+        build_verify_otp_schema(),
+        build_generate_order_schema(),
+    ]
+
+
+@dataclass
+class StageTokens:
+    stage: str
+    requests: int
+    full_tokens: int
+    compact_tokens: int
+    cacheable_prefix_tokens: int
+    output_tokens: int = 0
+    tier: str = ""
+
+    @property
+    def saved_pct(self) -> float:
+        return round(100 * (self.full_tokens - self.compact_tokens) / self.full_tokens, 1) if self.full_tokens else 0.0
+
+
+# (stage, customer utterance, tool calls as (name, arguments), agent reply)
+Turn = Tuple[str, str, List[Tuple[str, Dict[str, Any]]], str]
+
+
+def sample_call() -> List[Turn]:
+    """A representative happy-path call built from the live script and catalog."""
+    script = get_script_variables()
+    product = get_catalog().products()[0]
+    name, email = "Ayesha", "ayesha@example.com"
+    return [
+        ("intro", "", [], script.intro_greeting),
+        ("needs_assessment", f"Hi, I'm {name}",
+         [("collect_data", {"customer_name": name, "script_stage": "needs_assessment"})],
+         script.needs_assessment.format(customer_name=name)),
+        ("product_selection", f"I'm looking for a {product.category}",
+         [("get_product_options", {"category": product.category})],
+         script.product_selection_prompt),
+        ("email_collection", f"I'll take the {product.name}",
+         [("collect_data", {"product_selection": product.name, "script_stage": "email_collection"})],
+         script.email_request.format(product_name=product.name)),
+        ("otp_verification", f"My email is {email}",
+         [("collect_data", {"email": email}), ("send_otp", {"email": email})],
+         script.otp_request),
+        ("order_confirmation", "123456",
+         [("verify_otp", {"email": email, "otp_code": "123456"}),
+          ("generate_order", {"customer_name": name, "product": product.name, "email": email})],
+         script.order_confirmation.format(email=email)),
+        ("closing", "",
+         [("collect_data", {"summary": f"{name} ordered {product.name}"})],
+         ""),
+    ]
+
+
+def long_call(email_retries: int = 3, otp_retries: int = 2) -> List[Turn]:
+    """sample_call stretched by a misheard email and mistyped OTP codes, as long real calls are."""
+    script = get_script_variables()
+    turns = sample_call()
+    email = "ayesha@example.com"
+    at = next(i for i, turn in enumerate(turns) if turn[0] == "otp_verification")
+    retries: List[Turn] = [
+        ("otp_verification", "No, that's wrong. It's a y e s h a at example dot com",
+         [("collect_data", {"email": email}), ("send_otp", {"email": email})],
+         script.otp_request)
+        for _ in range(email_retries)
+    ]
+    retries += [
+        ("order_confirmation", "654321", [("verify_otp", {"email": email, "otp_code": "654321"})], script.otp_retry)
+        for _ in range(otp_retries)
+    ]
+    return turns[:at + 1] + retries + turns[at + 1:]
+
+
+def _tool_output(name: str, arguments: Dict[str, Any], style: str) -> str:
+    if name == "get_product_options":
+        return get_catalog().product_options(arguments["category"], style) or ""
+    return {
+        "collect_data": "Data collected successfully",
+        "send_otp": f"OTP code sent to {arguments.get('email', '')}",
+        "verify_otp": "OTP verified successfully",
+        "generate_order": "Order generated successfully. Order ID: 1234-567890, Tracking ID: TRK-1A2B3C4D5E6F",
+    }.get(name, "")
+
+
+def stage_report(model: Optional[str] = None) -> List[StageTokens]:
+    """Input tokens sent to the LLM per script stage, replaying a sample call."""
+    system = get_shop_prompt()
+    tools = json.dumps(tool_schemas(), separators=(",", ":"))
+    fixed = count_tokens(system, model) + MESSAGE_OVERHEAD_TOKENS + count_tokens(tools, model)
+    prefix = count_tokens(tools, model) + count_tokens(SHOP_PROMPT_RULES, model)
+
+    histories: Dict[str, List[Dict[str, str]]] = {"full": [], "compact": []}
+    router = get_llm_router()
+    # The router sees the stage stored when the request is made, not the one a turn moves to
+    stored_stage = "intro"
+    report = []
+    for stage, utterance, calls, reply in sample_call():
+        totals = {"full": 0, "compact": 0}
+        requests = 0
+        for style, history in histories.items():
+            if utterance:
+                history.append({"role": "user", "content": utterance})
+            # One request to decide on tools, and one more to respond to their results
+            rounds = 0
+            if utterance or calls:
+                totals[style] += fixed + count_message_tokens(history, model)
+                rounds += 1
+            if calls:
+                for name, arguments in calls:
+                    history.append({"role": "assistant", "content": json.dumps({"name": name, "arguments": arguments})})
+                    history.append({"role": "tool", "content": _tool_output(name, arguments, style)})
+                totals[style] += fixed + count_message_tokens(history, model)
+                rounds += 1
+            if reply:
+                history.append({"role": "assistant", "content": reply})
+            requests = rounds
+        output = count_tokens(reply, model) + sum(count_tokens(json.dumps(args), model) for _, args in calls) if requests else 0
+        tier = router.choose(stored_stage).tier.name
+        report.append(StageTokens(stage, requests, totals["full"], totals["compact"], prefix * requests, output, tier))
+        for _, arguments in calls:
+            stored_stage = arguments.get("script_stage") or stored_stage
+    return report
+
+
+def stage_cost(row: StageTokens, tier: Optional[str] = None) -> float:
+    """Estimated USD for a stage's requests on its routed tier (or the given one)."""
+    router = get_llm_router()
+    input_tokens = row.compact_tokens if get_settings().tool_result_style == "compact" else row.full_tokens
+    return router.tier(tier or row.tier).cost(input_tokens, row.output_tokens)
+
+
+@dataclass
+class ContextTurn:
+    turn: int
+    stage: str
+    full_tokens: int
+    bounded_tokens: int
+
+
+def context_report(model: Optional[str] = None) -> List[ContextTurn]:
+    """Tokens of each LLM request in a long call, with the full history and the bounded window."""
+    from .context import OTHER, TOOL, USER, state_summary, window
+    from .session import CallSession
+
+    s = get_settings()
+    system = get_shop_prompt()
+    fixed = count_tokens(system, model) + MESSAGE_OVERHEAD_TOKENS + count_tokens(json.dumps(tool_schemas(), separators=(",", ":")), model)
+    session = CallSession()
+    history: List[Tuple[str, Dict[str, str]]] = []
+    report = []
+
+    def request(turn: int, stage: str):
+        keep, folded = window([kind for kind, _ in history], s.context_max_turns, s.context_tool_turns)
+        bounded = [history[i][1] for i in keep]
+        if folded:
+            bounded.insert(0, {"role": "system", "content": state_summary(session, folded)})
+        report.append(ContextTurn(
+            turn, stage,
+            fixed + count_message_tokens([m for _, m in history], model),
+            fixed + count_message_tokens(bounded, model),
+        ))
+
+    for turn, (stage, utterance, calls, reply) in enumerate(long_call(), 1):
+        if utterance:
+            history.append((USER, {"role": "user", "content": utterance}))
+        if utterance or calls:
+            request(turn, stage)
+        if calls:
+            for name, arguments in calls:
+                history.append((TOOL, {"role": "assistant", "content": json.dumps({"name": name, "arguments": arguments})}))
+                history.append((TOOL, {"role": "tool", "content": _tool_output(name, arguments, s.tool_result_style)}))
+                if name == "collect_data":
+                    for key in ("customer_name", "product_selection", "email", "script_stage"):
+                        if arguments.get(key):
+                            setattr(session, key, arguments[key])
+            request(turn, stage)
+        if reply:
+            history.append((OTHER, {"role": "assistant", "content": reply}))
+    return report
+
+
+def prompt_render_us(iterations: int = 1000) -> Tuple[float, float]:
+    """Mean microseconds to render the prompt from scratch vs. fetch the memoized copy."""
+    script = get_script_variables()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        render_shop_prompt(script)
+    rendered = (time.perf_counter() - started) * 1e6 / iterations
+    started = time.perf_counter()
+    for _ in range(iterations):
+        get_shop_prompt()
+    cached = (time.perf_counter() - started) * 1e6 / iterations
+    return rendered, cached
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Per-stage LLM token report for the shop agent.")
+    parser.add_argument("--model", help="Tokenizer model (defaults to OPENAI_MODEL)")
+    parser.add_argument("--json", dest="json_path", help="Write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = stage_report(args.model)
+    counter = "tiktoken" if tiktoken is not None else "chars/4 estimate"
+    print(f"Token counts via {counter}; tool result style setting: {get_settings().tool_result_style}")
+    print(f"{'stage':<20}{'requests':>9}{'full':>9}{'compact':>9}{'saved':>8}{'cacheable':>11}  {'tier':<10}{'cost $':>10}")
+    for row in report:
+        print(f"{row.stage:<20}{row.requests:>9}{row.full_tokens:>9}{row.compact_tokens:>9}{row.saved_pct:>7}%"
+              f"{row.cacheable_prefix_tokens:>11}  {row.tier:<10}{stage_cost(row):>10.6f}")
+    full = sum(r.full_tokens for r in report)
+    compact = sum(r.compact_tokens for r in report)
+    cacheable = sum(r.cacheable_prefix_tokens for r in report)
+    print(f"{'total':<20}{sum(r.requests for r in report):>9}{full:>9}{compact:>9}"
+          f"{round(100 * (full - compact) / full, 1) if full else 0.0:>7}%{cacheable:>11}")
+
+    default_tier = get_settings().llm_default_tier
+    routed = sum(stage_cost(r) for r in report)
+    single = sum(stage_cost(r, default_tier) for r in report)
+    print(f"LLM cost per order: ${routed:.6f} routed by stage vs ${single:.6f} all on the {default_tier} tier")
+
+    turns = context_report(args.model)
+    s = get_settings()
+    print(f"Long call, {len(turns)} LLM requests; history bounded to {s.context_max_turns} turns "
+          f"(tool results for {s.context_tool_turns}):")
+    print(f"{'turn':>5}  {'stage':<20}{'full':>9}{'bounded':>9}")
+    for row in turns:
+        print(f"{row.turn:>5}  {row.stage:<20}{row.full_tokens:>9}{row.bounded_tokens:>9}")
+    full = sum(r.full_tokens for r in turns)
+    bounded = sum(r.bounded_tokens for r in turns)
+    print(f"{'total':>5}  {'':<20}{full:>9}{bounded:>9}  ({round(100 * (full - bounded) / full, 1) if full else 0.0}% saved)")
+
+    rendered, cached = prompt_render_us()
+    print(f"Prompt build: {rendered:.1f} us rendered, {cached:.2f} us memoized")
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "counter": counter,
+                "stages": [dict(asdict(r), saved_pct=r.saved_pct, cost_usd=stage_cost(r)) for r in report],
+                "long_call": [asdict(r) for r in turns],
+                "prompt_render_us": rendered,
+                "prompt_cached_us": cached,
+            }, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,25 +1,45 @@
 from __future__ import annotations
 
-import json
-import os
+import asyncio
+import logging
 import random
-import smtplib
 import uuid
-from email.mime.text import MIMEText
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from livekit.agents import RunContext, function_tool
 
+from .catalog import get_catalog
+from .dialog import DialogEngine
+from .mailer import queue_order_confirmation_email, queue_otp_email, smtp_configured
+from .otp import OtpStatus, get_otp_store
+from .prefetch import SEND_OTP, Prefetcher
+from .resolver import Resolution, get_resolver
+from .search import SearchResult, get_search_index, render_search_results
 from .session import DataKey, SessionManager
+from .telemetry import get_telemetry
 
-_otp_storage: Dict[str, str] = {}
+logger = logging.getLogger("shop_agent")
+
+_OTP_STATUS_MESSAGES = {
+    OtpStatus.VERIFIED: "OTP verified successfully",
+    OtpStatus.INVALID: "Error: Invalid OTP code. Please try again.",
+    OtpStatus.EXPIRED: "Error: This OTP has expired. Please request a new OTP.",
+    OtpStatus.NOT_FOUND: "Error: No OTP found for this email. Please request a new OTP.",
+    OtpStatus.LOCKED: "Error: Too many incorrect attempts. Please try again later.",
+}
 
 
 def build_data_collection_schema() -> Dict[str, Any]:
     """Build schema for data collection tool."""
     return {
         "name": "collect_data",
-        "description": "Call this tool whenever you extract key information from the conversation. When the call is complete and you've said goodbye, call this with summary to finalize the call.",
+        "description": (
+            "Call this tool whenever you extract key information from the conversation. "
+            "When storing customer_name or product_selection, call it before saying anything and do not add "
+            "your own greeting or confirmation: if it returns no output, the confirmation and the next script "
+            "line have already been spoken. "
+            "When the call is complete and you've said goodbye, call this with summary to finalize the call."
+        ),
         "parameters": {
             "type": "object",
             "properties": {
@@ -76,6 +96,57 @@ def build_get_product_options_schema() -> Dict[str, Any]:
     }
 
 
+def build_search_products_schema() -> Dict[str, Any]:
+    """Build schema for search_products tool."""
+    return {
+        "name": "search_products",
+        "description": "Search the catalog by description, e.g. \"something warm under 4000 rupees\"; returns ranked products with prices",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "What the customer is looking for, in their words (price limits may be included)",
+                },
+                "max_price": {
+                    "type": "integer",
+                    "description": "Highest price in PKR, if the customer gave one",
+                },
+                "min_price": {
+                    "type": "integer",
+                    "description": "Lowest price in PKR, if the customer gave one",
+                }
+            },
+            "required": ["query"],
+            "additionalProperties": False,
+        },
+    }
+
+
+def build_find_product_schema() -> Dict[str, Any]:
+    """Build schema for find_product tool."""
+    return {
+        "name": "find_product",
+        "description": "Match what the customer said (e.g. \"the stealth one\") to an exact catalog product",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "query": {
+                    "type": "string",
+                    "description": "The customer's words for the product",
+                },
+                "category": {
+                    "type": "string",
+                    "description": "Category the customer is choosing from, if known",
+                    "default": "",
+                }
+            },
+            "required": ["query"],
+            "additionalProperties": False,
+        },
+    }
+
+
 def build_send_otp_schema() -> Dict[str, Any]:
     """Build schema for send_otp tool."""
     return {
@@ -145,11 +216,37 @@ def build_generate_order_schema() -> Dict[str, Any]:
     }
 
 
-def create_data_collection_tool(session_manager: SessionManager) -> Any:
+def resolve_product(text: str, category: Optional[str] = None) -> Resolution:
+    """Blocking: rebuilds the resolver when the catalog changed. Async callers use asyncio.to_thread."""
+    return get_resolver().resolve(text, category)
+
+
+def search_products(query: str, **kwargs: Any) -> SearchResult:
+    """Blocking: syncs the index when the catalog changed. Async callers use asyncio.to_thread."""
+    return get_search_index().search(query, **kwargs)
+
+
+def describe_resolution(resolution: Resolution) -> str:
+    """Tool text for a product resolution: the match, the candidates, or no match."""
+    if resolution.resolved:
+        product = resolution.resolved
+        return f"Match: {product.name} (SKU {product.sku}) - {product.price_label()}"
+    if resolution.matches:
+        options = "; ".join(f"{m.product.name} - {m.product.price_label()}" for m in resolution.matches)
+        return f"'{resolution.query}' could be: {options}. Ask the customer which one they mean."
+    return f"No product matches '{resolution.query}'. Ask the customer to choose from the options presented."
+
+
+def create_data_collection_tool(
+    session_manager: SessionManager,
+    prefetcher: Optional[Prefetcher] = None,
+    dialog: Optional[DialogEngine] = None,
+) -> Any:
     """Create data collection tool for tracking conversation data."""
     schema = build_data_collection_schema()
 
     @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
     async def collect_data_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
         """Handle data collection during conversation."""
         try:
@@ -163,22 +260,33 @@ def create_data_collection_tool(session_manager: SessionManager) -> Any:
                 session_manager.update_data(DataKey.CUSTOMER_NAME, customer_name)
             
             if product_selection:
+                resolved = (await asyncio.to_thread(resolve_product, product_selection)).resolved
+                if resolved:
+                    product_selection = resolved.name
                 session_manager.update_data(DataKey.PRODUCT_SELECTION, product_selection)
             
             if email:
                 session_manager.update_data(DataKey.EMAIL, email)
+                if prefetcher:
+                    prefetcher.warm_email()
             
             if script_stage:
                 session_manager.update_data(DataKey.SCRIPT_STAGE, script_stage)
+                if prefetcher:
+                    prefetcher.observe_stage(script_stage)
             
             if summary:
                 session_manager.update_data(DataKey.SUMMARY, summary)
                 return None
 
-            return "Data collected successfully"
+            output = "Data collected successfully"
+            if dialog:
+                line = dialog.after_collect_data(customer_name, product_selection, email, summary)
+                return dialog.respond(context, line, output)
+            return output
 
         except Exception as e:
-            print(f"Error collecting data: {e}")
+            logger.error(f"Error collecting data: {e}", exc_info=True)
             return f"Error collecting data: {str(e)}"
 
     return collect_data_handler
@@ -189,137 +297,93 @@ def create_get_product_options_tool() -> Any:
     schema = build_get_product_options_schema()
 
     @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
     async def get_product_options_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
         """Retrieve product options for a category."""
         try:
             category = raw_arguments.get("category", "").strip()
-            
-            project_root = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
-            inventory_path = os.path.join(project_root, "inventory.json")
-            
-            if not os.path.exists(inventory_path):
-                return f"Error: Inventory file not found at {inventory_path}"
-            
-            with open(inventory_path, "r", encoding="utf-8") as f:
-                inventory = json.load(f)
-            
-            products = inventory.get("products", {}).get(category, [])
-            
-            if not products:
+
+            catalog = get_catalog()
+            try:
+                result = catalog.product_options(category)
+            except FileNotFoundError:
+                return f"Error: Inventory file not found at {catalog.path}"
+
+            if not result:
                 return f"No products found for category: {category}"
-            
-            product_list = []
-            for i, product in enumerate(products, 1):
-                price_str = ""
-                if product.get('price'):
-                    price_str = f" - PKR {product['price']:,}"
-                else:
-                    price_str = " - Price on request"
-                product_list.append(f"Option {i}: {product['name']} - {product['description']}{price_str}")
-            
-            result = f"Based on our latest collection, I have {len(products)} top recommendations for you:\n\n" + "\n\n".join(product_list) + "\n\nAll prices are in PKR (Pakistani Rupees)."
-            
+
             return result
 
         except Exception as e:
-            print(f"Error retrieving products: {e}")
+            logger.error(f"Error retrieving products: {e}", exc_info=True)
             return f"Error retrieving products: {str(e)}"
 
     return get_product_options_handler
 
 
-def _send_email_otp(email: str, otp_code: str) -> bool:
-    """Send OTP code via email using SMTP."""
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_username = os.getenv("SMTP_USERNAME", "")
-        smtp_password = os.getenv("SMTP_PASSWORD", "")
-        from_email = os.getenv("FROM_EMAIL", smtp_username)
-        
-        if not smtp_username or not smtp_password:
-            print("SMTP credentials not configured. OTP will be stored but not sent via email.")
-            print(f"   OTP for {email}: {otp_code}")
-            return False
-        
-        msg = MIMEText(f"Your Zenitheon verification code is: {otp_code}\n\nThis code will expire in 10 minutes.")
-        msg["Subject"] = "Zenitheon Order Verification Code"
-        msg["From"] = from_email
-        msg["To"] = email
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-        
-        print(f"OTP sent to {email}")
-        return True
-        
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        print(f"   OTP for {email}: {otp_code} (stored in memory)")
-        return False
-
-
-def _send_order_confirmation_email(email: str, customer_name: str, product: str, order_id: str, tracking_id: str) -> bool:
-    """Send order confirmation email with tracking ID and order ID."""
-    try:
-        smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        smtp_port = int(os.getenv("SMTP_PORT", "587"))
-        smtp_username = os.getenv("SMTP_USERNAME", "")
-        smtp_password = os.getenv("SMTP_PASSWORD", "")
-        from_email = os.getenv("FROM_EMAIL", smtp_username)
-        
-        if not smtp_username or not smtp_password:
-            print("SMTP credentials not configured. Order confirmation email not sent.")
-            print(f"   Order confirmation for {email}:")
-            print(f"   Order ID: {order_id}")
-            print(f"   Tracking ID: {tracking_id}")
-            return False
-        
-        email_body = f"""Dear {customer_name},
-
-Thank you for your order with Zenitheon!
-
-Order Details:
-- Product: {product}
-- Order ID: {order_id}
-- Tracking ID: {tracking_id}
-
-Your order has been confirmed and will be processed shortly.
-
-Thank you for shopping with Zenitheon. Have a stylish day!
-
-Best regards,
-Zenitheon Team
-"""
-        
-        msg = MIMEText(email_body)
-        msg["Subject"] = f"Zenitheon Order Confirmation - {order_id}"
-        msg["From"] = from_email
-        msg["To"] = email
-        
-        with smtplib.SMTP(smtp_server, smtp_port) as server:
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            server.send_message(msg)
-        
-        print(f"Order confirmation email sent to {email}")
-        return True
-        
-    except Exception as e:
-        print(f"Error sending order confirmation email: {e}")
-        print(f"   Order confirmation for {email}:")
-        print(f"   Order ID: {order_id}")
-        print(f"   Tracking ID: {tracking_id}")
-        return False
-
-
-def create_send_otp_tool() -> Any:
+def create_search_products_tool() -> Any:
+    """Create tool to search products by free-text description and price."""
+    schema = build_search_products_schema()
+
+    @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
+    async def search_products_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
+        """Search products semantically."""
+        try:
+            query = str(raw_arguments.get("query", "")).strip()
+            max_price = raw_arguments.get("max_price")
+            min_price = raw_arguments.get("min_price")
+
+            if not query:
+                return "Error: Query is required"
+
+            # A catalog change re-embeds products on the first search after it; keep that off the event loop
+            result = await asyncio.to_thread(
+                search_products,
+                query,
+                limit=3,
+                min_price=int(min_price) if min_price is not None else None,
+                max_price=int(max_price) if max_price is not None else None,
+            )
+            return render_search_results(result)
+
+        except Exception as e:
+            logger.error(f"Error searching products: {e}", exc_info=True)
+            return f"Error searching products: {str(e)}"
+
+    return search_products_handler
+
+
+def create_find_product_tool() -> Any:
+    """Create tool to resolve a spoken product reference to a catalog product."""
+    schema = build_find_product_schema()
+
+    @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
+    async def find_product_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
+        """Resolve the customer's words to a product."""
+        try:
+            query = str(raw_arguments.get("query", "")).strip()
+            category = str(raw_arguments.get("category", "")).strip() or None
+
+            if not query:
+                return "Error: Query is required"
+
+            return describe_resolution(await asyncio.to_thread(resolve_product, query, category))
+
+        except Exception as e:
+            logger.error(f"Error finding product: {e}", exc_info=True)
+            return f"Error finding product: {str(e)}"
+
+    return find_product_handler
+
+
+def create_send_otp_tool(prefetcher: Optional[Prefetcher] = None, dialog: Optional[DialogEngine] = None) -> Any:
     """Create tool to send OTP to customer's email."""
     schema = build_send_otp_schema()
 
     @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
     async def send_otp_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
         """Send OTP code to customer's email."""
         try:
@@ -330,24 +394,34 @@ def create_send_otp_tool() -> Any:
             
             otp_code = str(random.randint(100000, 999999))
             
-            _otp_storage[email] = otp_code
+            # The SQLite store can wait on another process's write lock; keep that off the event loop
+            if not await asyncio.to_thread(get_otp_store().issue, email, otp_code):
+                # Locked out: a new code could never verify, so don't send one
+                return _OTP_STATUS_MESSAGES[OtpStatus.LOCKED]
+            get_telemetry().count("shop_otp_sent_total")
+
+            if prefetcher and smtp_configured():
+                # Claims the connection warmed when the email was collected
+                prefetcher.take(SEND_OTP, "")
             
-            _send_email_otp(email, otp_code)
+            queue_otp_email(email, otp_code)
             
-            return f"OTP code sent to {email}"
+            output = f"OTP code sent to {email}"
+            return dialog.respond(context, dialog.after_send_otp(), output) if dialog else output
 
         except Exception as e:
-            print(f"Error sending OTP: {e}")
+            logger.error(f"Error sending OTP: {e}", exc_info=True)
             return f"Error sending OTP: {str(e)}"
 
     return send_otp_handler
 
 
-def create_verify_otp_tool() -> Any:
+def create_verify_otp_tool(dialog: Optional[DialogEngine] = None) -> Any:
     """Create tool to verify OTP code."""
     schema = build_verify_otp_schema()
 
     @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
     async def verify_otp_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
         """Verify OTP code provided by customer."""
         try:
@@ -357,30 +431,26 @@ def create_verify_otp_tool() -> Any:
             if not email or not otp_code:
                 return "Error: Email and OTP code are required"
             
-            stored_otp = _otp_storage.get(email)
-            
-            if not stored_otp:
-                return "Error: No OTP found for this email. Please request a new OTP."
-            
-            if stored_otp != otp_code:
-                return "Error: Invalid OTP code. Please try again."
-            
-            del _otp_storage[email]
-            
-            return "OTP verified successfully"
+            status = await asyncio.to_thread(get_otp_store().verify, email, otp_code)
+
+            output = _OTP_STATUS_MESSAGES[status]
+            if dialog and status == OtpStatus.INVALID:
+                return dialog.respond(context, dialog.after_invalid_otp(), output)
+            return output
 
         except Exception as e:
-            print(f"Error verifying OTP: {e}")
+            logger.error(f"Error verifying OTP: {e}", exc_info=True)
             return f"Error verifying OTP: {str(e)}"
 
     return verify_otp_handler
 
 
-def create_generate_order_tool(session_manager: SessionManager) -> Any:
+def create_generate_order_tool(session_manager: SessionManager, dialog: Optional[DialogEngine] = None) -> Any:
     """Create tool to generate order ID and save to Excel/CSV."""
     schema = build_generate_order_schema()
 
     @function_tool(raw_schema=schema)
+    @get_telemetry().traced_tool(schema["name"])
     async def generate_order_handler(raw_arguments: Dict[str, Any], context: RunContext) -> str:
         """Generate order ID and tracking ID, then save order."""
         try:
@@ -391,6 +461,11 @@ def create_generate_order_tool(session_manager: SessionManager) -> Any:
             if not customer_name or not product or not email:
                 return "Error: Customer name, product, and email are required"
             
+            resolution = await asyncio.to_thread(resolve_product, product)
+            if not resolution.resolved:
+                return f"Error: Order not placed. {describe_resolution(resolution)}"
+            product = resolution.resolved.name
+
             session_manager.update_data(DataKey.CUSTOMER_NAME, customer_name)
             session_manager.update_data(DataKey.PRODUCT_SELECTION, product)
             session_manager.update_data(DataKey.EMAIL, email)
@@ -398,16 +473,23 @@ def create_generate_order_tool(session_manager: SessionManager) -> Any:
             order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
             tracking_id = f"TRK-{uuid.uuid4().hex[:12].upper()}"
             
-            result = session_manager.save_order_data(order_id, tracking_id)
+            result = await session_manager.save_order_data(order_id, tracking_id)
             
             if result:
-                _send_order_confirmation_email(email, customer_name, product, order_id, tracking_id)
-                return f"Order generated successfully. Order ID: {order_id}, Tracking ID: {tracking_id}"
+                get_telemetry().count("shop_orders_total")
+                queue_order_confirmation_email(email, customer_name, product, order_id, tracking_id)
+                output = f"Order generated successfully. Order ID: {order_id}, Tracking ID: {tracking_id}"
+                if dialog and dialog.enabled:
+                    # The confirmation is the last line of the script, so record
+                    # the summary that ends the call instead of waiting for the LLM.
+                    session_manager.update_data(DataKey.SUMMARY, f"{customer_name} ordered {product} ({order_id})")
+                    return dialog.respond(context, dialog.after_order(email), output, final=True)
+                return output
             else:
                 return f"Error: Failed to save order data"
 
         except Exception as e:
-            print(f"Error generating order: {e}")
+            logger.error(f"Error generating order: {e}", exc_info=True)
             return f"Error generating order: {str(e)}"
 
     return generate_order_handler
@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Protocol
+from typing import TYPE_CHECKING, Any, AsyncIterable, AsyncIterator, Dict, List, Optional, Protocol
+
+if TYPE_CHECKING:
+    from .streaming import StreamingTurn
 
 
 class STTProvider(Protocol):
@@ -16,6 +20,39 @@ class TTSProvider(Protocol):
     async def synthesize(self, text: str, sample_rate: int) -> bytes: ...
 
 
+@dataclass(slots=True)
+class Transcript:
+    text: str
+    is_final: bool = False
+
+
+class StreamingSTTProvider(STTProvider, Protocol):
+    def transcribe_stream(self, audio: AsyncIterable[bytes], sample_rate: int) -> AsyncIterator[Transcript]: ...
+
+
+class StreamingLLMProvider(LLMProvider, Protocol):
+    def generate_stream(self, prompt: str, history: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]: ...
+
+
+class StreamingTTSProvider(TTSProvider, Protocol):
+    def synthesize_stream(self, text: str, sample_rate: int) -> AsyncIterator[bytes]: ...
+
+
+@dataclass(slots=True)
+class StageLatency:
+    """First-byte latencies of one streamed turn, in milliseconds.
+
+    STT values are measured from the start of the turn, the LLM from the final
+    transcript, TTS from the first sentence handed to it, and response_ms from
+    the final transcript to the first audio frame.
+    """
+    stt_first_partial_ms: Optional[float] = None
+    stt_final_ms: Optional[float] = None
+    llm_first_token_ms: Optional[float] = None
+    tts_first_audio_ms: Optional[float] = None
+    response_ms: Optional[float] = None
+
+
 @dataclass(slots=True)
 class CallResult:
     timestamp: str
@@ -51,3 +88,18 @@ class AgentPipeline:
         reply = await self.llm.generate(text, history=history)
         speech = await self.tts.synthesize(reply, self.sample_rate)
         return reply, speech
+
+    def stream_audio(
+        self,
+        audio: AsyncIterable[bytes],
+        history: Optional[List[Dict[str, Any]]] = None,
+        cancel: Optional[asyncio.Event] = None,
+    ) -> StreamingTurn:
+        """Start a streamed turn that overlaps STT, LLM and TTS.
+
+        Iterate the returned turn for audio chunks; call ``turn.cancel()`` (or
+        set ``cancel``) to barge in.
+        """
+        from .streaming import StreamingTurn
+
+        return StreamingTurn(self, audio, history=history, cancel=cancel)
@@ -0,0 +1,259 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, AsyncIterable, AsyncIterator, Dict, List, Optional
+
+from livekit import rtc
+from livekit.agents import APIConnectOptions, ModelSettings, llm, tokenize, utils
+from livekit.agents import tts as agents_tts
+from livekit.agents.voice import Agent
+
+from .config import get_settings
+from .constants import get_script_variables
+from .context import bound_chat_ctx
+from .phrase_cache import PhraseAudioCache, normalize_phrase
+from .providers.resilience import ProviderUnavailable, get_route
+from .routing import get_llm_router
+from .session import CallState
+
+logger = logging.getLogger("shop_agent")
+
+
+async def _replay(buffered: List[str], rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    for chunk in buffered:
+        yield chunk
+    async for chunk in rest:
+        yield chunk
+
+
+class _TextTee:
+    """Reads a text stream once; each reader() replays it from the start, so a hedge can join late."""
+
+    def __init__(self, source: AsyncIterable[str]):
+        self._chunks: List[str] = []
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._changed = asyncio.Condition()
+        self._pump = asyncio.ensure_future(self._read(source))
+
+    async def _read(self, source: AsyncIterable[str]):
+        try:
+            async for chunk in source:
+                async with self._changed:
+                    self._chunks.append(chunk)
+                    self._changed.notify_all()
+        except Exception as e:
+            self._error = e
+        finally:
+            async with self._changed:
+                self._done = True
+                self._changed.notify_all()
+
+    async def started(self) -> bool:
+        """Wait for the first chunk; False when the stream ended empty."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._chunks or self._done)
+        return bool(self._chunks)
+
+    async def text(self) -> str:
+        """The whole text, once the source has finished."""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self._done)
+        return "".join(self._chunks)
+
+    async def reader(self) -> AsyncIterator[str]:
+        i = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: i < len(self._chunks) or self._done)
+                chunks = self._chunks[i:]
+                finished = self._done
+            for chunk in chunks:
+                yield chunk
+            i += len(chunks)
+            if finished and i >= len(self._chunks):
+                if self._error is not None:
+                    raise self._error
+                return
+
+    async def aclose(self):
+        await utils.aio.cancel_and_wait(self._pump)
+
+
+async def _synthesize(tts: Any, text: AsyncIterable[str], conn_options: APIConnectOptions) -> AsyncIterator[rtc.AudioFrame]:
+    """Stream text through one specific TTS, as Agent.default.tts_node does for the session TTS."""
+    if not tts.capabilities.streaming:
+        tts = agents_tts.StreamAdapter(tts=tts, sentence_tokenizer=tokenize.basic.SentenceTokenizer())
+    async with tts.stream(conn_options=conn_options) as stream:
+        async def forward():
+            async for chunk in text:
+                stream.push_text(chunk)
+            stream.end_input()
+
+        forward_task = asyncio.create_task(forward())
+        try:
+            async for event in stream:
+                yield event.frame
+        finally:
+            await utils.aio.cancel_and_wait(forward_task)
+
+
+class ShopVoiceAgent(Agent):
+    """Voice agent with cached script audio and deadline/breaker/hedge-protected LLM and TTS.
+
+    Utterances that exactly match a script line play from the phrase cache.
+    Everything else goes through the "llm" and "tts" provider routes, hedged
+    to ``fallback_llm`` / ``fallback_tts`` when those are set; when TTS is
+    unavailable the line is served from cached audio instead (the apology line
+    if it is not a script line). Each LLM turn sends a bounded window of the
+    chat history and uses the model tier the router picks for the call's script
+    stage, from ``tier_llms``, hedged to the same tier in ``tier_fallback_llms``.
+    """
+
+    def __init__(
+        self,
+        *,
+        call: Optional[CallState] = None,
+        tier_llms: Optional[Dict[str, Any]] = None,
+        tier_fallback_llms: Optional[Dict[str, Any]] = None,
+        phrase_cache: Optional[PhraseAudioCache] = None,
+        fallback_llm: Optional[Any] = None,
+        fallback_tts: Optional[Any] = None,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.call = call
+        self.tier_llms = tier_llms or {}
+        self.tier_fallback_llms = tier_fallback_llms or {}
+        self.phrase_cache = phrase_cache
+        self.fallback_llm = fallback_llm
+        self.fallback_tts = fallback_tts
+
+    async def llm_node(
+        self,
+        chat_ctx: llm.ChatContext,
+        tools: List[llm.FunctionTool],
+        model_settings: ModelSettings,
+    ) -> AsyncIterator[llm.ChatChunk | str]:
+        if self.call is not None and get_settings().context_trim_enabled:
+            chat_ctx = bound_chat_ctx(chat_ctx, self.call.session, self.call.context)
+        route = get_route("llm")
+        # The route owns deadlines and retries; the plugin gets one attempt
+        options = APIConnectOptions(max_retry=0, timeout=route.first_timeout)
+
+        def chat(model: Any):
+            return lambda: model.chat(
+                chat_ctx=chat_ctx, tools=tools, tool_choice=model_settings.tool_choice, conn_options=options,
+            )
+
+        primary, fallback, choice = self.llm, self.fallback_llm, None
+        if self.tier_llms and self.call is not None:
+            router = get_llm_router()
+            choice = router.choose(self.call.session.script_stage)
+            primary = self.tier_llms.get(choice.tier.name, primary)
+            # The hedge keeps the routed tier's token limit; no entry means no distinct fallback
+            fallback = self.tier_fallback_llms.get(choice.tier.name)
+
+        secondary = chat(fallback) if fallback is not None else None
+        winner: List[int] = []
+        started = time.perf_counter()
+        ttft_ms: Optional[float] = None
+        usage = None
+        failed = False
+        try:
+            async for chunk in route.stream(chat(primary), secondary, on_winner=winner.append):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - started) * 1000
+                if isinstance(chunk, llm.ChatChunk) and chunk.usage is not None:
+                    usage = chunk.usage
+                yield chunk
+        except ProviderUnavailable as e:
+            if ttft_ms is not None:
+                # Part of the reply is already out; an apology on top of it would not make sense
+                logger.error(f"LLM broke off mid-reply: {e}")
+            else:
+                logger.error(f"LLM unavailable, apologising to the customer: {e}")
+                # The customer waited for nothing; count it against the tier at the full deadline
+                ttft_ms, failed = route.first_timeout * 1000, True
+
+        if choice is not None and ttft_ms is not None:
+            router.record(
+                choice, ttft_ms,
+                prompt_tokens=usage.prompt_tokens if usage else 0,
+                completion_tokens=usage.completion_tokens if usage else 0,
+                stats=self.call.routing,
+                fallback_model=fallback.model if winner == [1] else None,
+                failed=failed,
+            )
+        if failed:
+            yield get_script_variables().provider_apology
+
+    async def tts_node(self, text: AsyncIterable[str], model_settings: ModelSettings) -> AsyncIterator[rtc.AudioFrame]:
+        cache = self.phrase_cache
+        stream = text.__aiter__()
+        buffered: List[str] = []
+        if cache is not None and cache.phrases:
+            # Buffer text only while it is still a prefix of some cached phrase; as
+            # soon as it diverges, hand everything to the real TTS unchanged.
+            phrases = cache.phrases
+            diverged = False
+            async for chunk in stream:
+                buffered.append(chunk)
+                so_far = normalize_phrase("".join(buffered))
+                if not any(phrase.startswith(so_far) for phrase in phrases):
+                    diverged = True
+                    break
+
+            if not diverged:
+                pcm = cache.get("".join(buffered))
+                if pcm is not None:
+                    async for frame in cache.frames(pcm):
+                        yield frame
+                    return
+
+        async for frame in self._resilient_tts(_replay(buffered, stream)):
+            yield frame
+
+    async def _resilient_tts(self, text: AsyncIterator[str]) -> AsyncIterator[rtc.AudioFrame]:
+        route = get_route("tts")
+        tee = _TextTee(text)
+        try:
+            # Start the TTS deadline at the first text, not while the LLM is still thinking
+            if not await tee.started():
+                return
+            options = APIConnectOptions(max_retry=0, timeout=route.first_timeout)
+
+            def synthesize(tts: Any):
+                return lambda: _synthesize(tts, tee.reader(), options)
+
+            secondary = synthesize(self.fallback_tts) if self.fallback_tts is not None else None
+            spoke = False
+            try:
+                async for frame in route.stream(synthesize(self.tts), secondary):
+                    spoke = True
+                    yield frame
+                return
+            except ProviderUnavailable as e:
+                if spoke:
+                    logger.error(f"TTS broke off mid-utterance: {e}")
+                    return
+                logger.error(f"TTS unavailable, using cached audio: {e}")
+
+            pcm = self._cached_audio(await tee.text())
+            if pcm is not None:
+                async for frame in self.phrase_cache.frames(pcm):
+                    yield frame
+        finally:
+            await tee.aclose()
+
+    def _cached_audio(self, text: str) -> Optional[bytes]:
+        cache = self.phrase_cache
+        if cache is None:
+            return None
+        pcm = cache.get(text)
+        if pcm is None:
+            # Not a script line: at least tell the customer something is wrong
+            pcm = cache.get(get_script_variables().provider_apology)
+        return pcm
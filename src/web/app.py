@@ -1,18 +1,73 @@
 from __future__ import annotations
 
+import json
 import os
+import threading
 import uuid
 from datetime import timedelta
+from typing import Optional
 
-from flask import Flask, jsonify, render_template, request
+from flask import Flask, abort, jsonify, render_template, request
 from flask_cors import CORS
 from livekit import api
 
+from agent.catalog import get_catalog
 from agent.config import get_settings
 
-app = Flask(__name__, template_folder="templates", static_folder="static")
+from .caching import (
+    IMMUTABLE_CACHE_CONTROL,
+    REVALIDATE_CACHE_CONTROL,
+    CompressedBody,
+    StaticAssets,
+    cached_response,
+)
+from .livekit_service import get_livekit_service
+from .room_pool import get_room_pool
+
+# Static files are served by the "static" route below so they can be
+# precompressed and carry content-hash versions.
+app = Flask(__name__, template_folder="templates", static_folder=None)
 CORS(app)
 
+static_assets = StaticAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "static"))
+
+_products_body: Optional[CompressedBody] = None
+_products_lock = threading.Lock()
+_index_body: Optional[CompressedBody] = None
+
+
+@app.url_defaults
+def add_static_version(endpoint: str, values: dict):
+    """Append ?v=<content hash> to static URLs so they can be cached forever."""
+    if endpoint == "static" and "v" not in values:
+        version = static_assets.version(values.get("filename", ""))
+        if version:
+            values["v"] = version
+
+
+@app.route("/static/<path:filename>", endpoint="static")
+def static_file(filename: str):
+    """Serve a precompressed static asset; versioned URLs are immutable."""
+    body = static_assets.get(filename)
+    if body is None:
+        abort(404)
+    versioned = request.args.get("v") == body.etag[:12]
+    return cached_response(body, request, IMMUTABLE_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL)
+
+
+def products_body() -> CompressedBody:
+    """Serialized and compressed inventory, rebuilt only when the catalog version changes."""
+    global _products_body
+    snapshot = get_catalog().refresh()
+    body = _products_body
+    if body is not None and body.etag == f"products-{snapshot.version}":
+        return body
+    with _products_lock:
+        if _products_body is None or _products_body.etag != f"products-{snapshot.version}":
+            raw = json.dumps(snapshot.inventory, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            _products_body = CompressedBody.build(raw, "application/json", etag=f"products-{snapshot.version}")
+        return _products_body
+
 
 def generate_livekit_token(room_name: str, participant_name: str) -> str:
     """Generate LiveKit access token for a participant."""
@@ -38,65 +93,39 @@ def generate_livekit_token(room_name: str, participant_name: str) -> str:
 @app.route("/")
 def index():
     """Render the shop homepage."""
-    return render_template("index.html")
+    global _index_body
+    html = render_template("index.html").encode("utf-8")
+    body = _index_body
+    if body is None or body.identity != html:
+        body = _index_body = CompressedBody.build(html, "text/html; charset=utf-8")
+    return cached_response(body, request, REVALIDATE_CACHE_CONTROL)
 
 
 @app.route("/api/token", methods=["POST"])
 def get_token():
     """Generate LiveKit token for a participant and dispatch agent."""
     try:
-        data = request.get_json()
-        room_name = data.get("room_name", f"shop-{uuid.uuid4().hex[:8]}")
+        data = request.get_json() or {}
         participant_name = data.get("participant_name", "Customer")
-        
-        token = generate_livekit_token(room_name, participant_name)
         settings = get_settings()
-        
-        # Explicitly dispatch agent to the room
+
+        # A pre-created room makes call setup a local operation; without the
+        # pool (or when it is empty) the room is created off the request path
+        # and LiveKit also creates it when the participant joins.
+        pool = get_room_pool()
+        room_name = pool.acquire() if pool else None
         try:
-            import asyncio
-            from livekit import api as lk_api
-            
-            async def dispatch_agent_to_room():
-                async_api = lk_api.LiveKitAPI(
-                    url=settings.livekit_url or os.getenv("LIVEKIT_URL", ""),
-                    api_key=settings.livekit_api_key,
-                    api_secret=settings.livekit_api_secret,
-                )
-                
-                async with async_api:
-                    # Create room if it doesn't exist
-                    try:
-                        await async_api.room.create_room(
-                            lk_api.CreateRoomRequest(name=room_name)
-                        )
-                        print(f"Created room: {room_name}")
-                    except Exception as e:
-                        # Room might already exist, which is fine
-                        print(f"Room creation note: {e}")
-                    
-                    # Explicitly dispatch agent using AgentDispatchService
-                    # This tells LiveKit to dispatch the agent to this room
-                    try:
-                        # Use the agent dispatch API to request agent dispatch
-                        # Note: This requires the agent worker to be running
-                        print(f"Requesting agent dispatch for room: {room_name}")
-                        # The agent will be dispatched when participant joins
-                    except Exception as dispatch_error:
-                        print(f"Agent dispatch note: {dispatch_error}")
-            
-            # Run async function
-            try:
-                loop = asyncio.get_event_loop()
-            except RuntimeError:
-                loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(loop)
-            
-            loop.run_until_complete(dispatch_agent_to_room())
+            if room_name is not None:
+                if settings.agent_name:
+                    get_livekit_service().dispatch_in_background(room_name, settings.agent_name)
+            else:
+                room_name = data.get("room_name") or f"shop-{uuid.uuid4().hex[:8]}"
+                get_livekit_service().create_room_in_background(room_name, settings.agent_name)
         except Exception as room_error:
-            print(f"Warning: Could not dispatch agent: {room_error}")
-            # Continue anyway - agent should auto-dispatch if worker is running
-        
+            print(f"Warning: Could not create room: {room_error}")
+
+        token = generate_livekit_token(room_name, participant_name)
+
         return jsonify({
             "token": token,
             "url": settings.livekit_url or os.getenv("LIVEKIT_URL", ""),
@@ -120,8 +149,8 @@ def start_agent():
         # Note: The agent worker should be running separately using:
         # uv run python -m agent.main
         # 
-        # When a participant joins a room, LiveKit automatically dispatches
-        # the agent to that room. No explicit dispatch needed.
+        # With AGENT_NAME set, /api/token has already dispatched the agent;
+        # otherwise LiveKit dispatches it automatically when a participant joins.
         
         return jsonify({
             "status": "ready",
@@ -133,29 +162,22 @@ def start_agent():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/api/room-pool", methods=["GET"])
+def room_pool_stats():
+    """Room pool depth and hit-rate metrics."""
+    pool = get_room_pool()
+    if pool is None:
+        return jsonify({"enabled": False}), 200
+    return jsonify({"enabled": True, **pool.stats()}), 200
+
+
 @app.route("/api/products", methods=["GET"])
 def get_products():
     """Get product inventory."""
     try:
-        import json
-        # Get the project root directory (where inventory.json is located)
-        # __file__ is src/web/app.py, so we need to go up 2 levels
-        current_dir = os.path.dirname(os.path.abspath(__file__))  # src/web
-        web_dir = os.path.dirname(current_dir)  # src
-        project_root = os.path.dirname(web_dir)  # project root
-        inventory_path = os.path.join(project_root, "inventory.json")
-        
-        # Alternative: try relative to current working directory
-        if not os.path.exists(inventory_path):
-            inventory_path = os.path.join(os.getcwd(), "inventory.json")
-        
-        if not os.path.exists(inventory_path):
-            return jsonify({"error": f"Inventory file not found. Tried: {inventory_path}"}), 404
-        
-        with open(inventory_path, "r", encoding="utf-8") as f:
-            inventory = json.load(f)
-        
-        return jsonify(inventory), 200
+        return cached_response(products_body(), request, REVALIDATE_CACHE_CONTROL)
+    except FileNotFoundError:
+        return jsonify({"error": f"Inventory file not found. Tried: {get_catalog().path}"}), 404
     except Exception as e:
         import traceback
         return jsonify({"error": str(e), "traceback": traceback.format_exc()}), 500
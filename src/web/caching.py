@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import mimetypes
+import os
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from flask import Request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+_COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+
+@dataclass(frozen=True)
+class CompressedBody:
+    """A response body pre-encoded once for every supported Content-Encoding."""
+    etag: str
+    content_type: str
+    identity: bytes
+    gzip: Optional[bytes] = None
+    br: Optional[bytes] = None
+
+    @classmethod
+    def build(cls, body: bytes, content_type: str, etag: Optional[str] = None) -> "CompressedBody":
+        etag = etag or hashlib.sha256(body).hexdigest()[:20]
+        if not content_type.startswith(_COMPRESSIBLE_TYPES) or len(body) < 256:
+            return cls(etag=etag, content_type=content_type, identity=body)
+        return cls(
+            etag=etag,
+            content_type=content_type,
+            identity=body,
+            gzip=gzip.compress(body, compresslevel=9, mtime=0),
+            br=brotli.compress(body, quality=11) if brotli is not None else None,
+        )
+
+    def encoded(self, accept_encoding: str) -> Tuple[Optional[str], bytes]:
+        accepted = _accepted_encodings(accept_encoding)
+        if self.br is not None and "br" in accepted:
+            return "br", self.br
+        if self.gzip is not None and "gzip" in accepted:
+            return "gzip", self.gzip
+        return None, self.identity
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate.strip('"') == etag:
+            return True
+    return False
+
+
+def cached_response(body: CompressedBody, request: Request, cache_control: str) -> Response:
+    """Serve a pre-encoded body, answering If-None-Match with 304 Not Modified."""
+    headers = {
+        "ETag": f'"{body.etag}"',
+        "Cache-Control": cache_control,
+        "Vary": "Accept-Encoding",
+    }
+    if _etag_matches(request.headers.get("If-None-Match", ""), body.etag):
+        return Response(status=304, headers=headers)
+
+    encoding, payload = body.encoded(request.headers.get("Accept-Encoding", ""))
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(payload, status=200, headers=headers, content_type=body.content_type)
+
+
+class StaticAssets:
+    """Serves files from a static folder pre-compressed, with content-hash versions."""
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self._entries: Dict[str, Tuple[int, CompressedBody]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename: str) -> Optional[CompressedBody]:
+        path = os.path.realpath(os.path.join(self.folder, filename))
+        if not path.startswith(os.path.realpath(self.folder) + os.sep):
+            return None
+        try:
+            mtime_ns = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is not None and entry[0] == mtime_ns:
+            return entry[1]
+
+        with open(path, "rb") as f:
+            data = f.read()
+        content_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        if content_type.startswith("text/") or content_type == "application/javascript":
+            content_type += "; charset=utf-8"
+        body = CompressedBody.build(data, content_type)
+        with self._lock:
+            self._entries[path] = (mtime_ns, body)
+        return body
+
+    def version(self, filename: str) -> Optional[str]:
+        """Content hash used as the ?v= cache-busting token in asset URLs."""
+        body = self.get(filename)
+        return body.etag[:12] if body else None
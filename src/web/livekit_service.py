@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future
+from typing import Any, Coroutine, Optional
+
+from livekit import api
+
+from agent.config import get_settings
+
+
+class LiveKitService:
+    """Owns one pooled LiveKitAPI client on a dedicated event loop thread.
+
+    WSGI request threads hand coroutines to the loop with submit() instead of
+    building a client and running their own loop per request, so the
+    underlying HTTP session and its connections are reused across requests.
+    """
+
+    def __init__(self, url: str, api_key: str, api_secret: str):
+        self.url = url
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self._loop = asyncio.new_event_loop()
+        self._client: Optional[api.LiveKitAPI] = None
+        self._thread = threading.Thread(target=self._run, name="livekit-api", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        return self._loop
+
+    @property
+    def client(self) -> api.LiveKitAPI:
+        """The shared client; only use it from coroutines running on the service loop."""
+        if self._client is None:
+            self._client = api.LiveKitAPI(url=self.url, api_key=self.api_key, api_secret=self.api_secret)
+        return self._client
+
+    def submit(self, coro: Coroutine[Any, Any, Any]) -> Future:
+        """Run a coroutine on the service loop from any thread."""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    async def create_room(self, room_name: str, empty_timeout: int = 300) -> Any:
+        return await self.client.room.create_room(
+            api.CreateRoomRequest(name=room_name, empty_timeout=empty_timeout)
+        )
+
+    async def delete_room(self, room_name: str) -> Any:
+        return await self.client.room.delete_room(api.DeleteRoomRequest(room=room_name))
+
+    async def dispatch_agent(self, room_name: str, agent_name: str) -> Any:
+        """Explicitly dispatch a named agent worker to a room."""
+        return await self.client.agent_dispatch.create_dispatch(
+            api.CreateAgentDispatchRequest(agent_name=agent_name, room=room_name)
+        )
+
+    def create_room_in_background(self, room_name: str, agent_name: Optional[str] = None) -> Future:
+        """Start creating a room (and dispatching agent_name to it) without waiting; failures are logged, not raised."""
+
+        async def create_and_dispatch():
+            try:
+                await self.create_room(room_name)
+                print(f"Created room: {room_name}")
+            except Exception as e:
+                # Room might already exist, which is fine
+                print(f"Room creation note for {room_name}: {e}")
+            if agent_name:
+                await self.dispatch_agent(room_name, agent_name)
+
+        return self._in_background(create_and_dispatch(), f"Room setup failed for {room_name}")
+
+    def dispatch_in_background(self, room_name: str, agent_name: str) -> Future:
+        return self._in_background(self.dispatch_agent(room_name, agent_name), f"Agent dispatch failed for {room_name}")
+
+    def _in_background(self, coro: Coroutine[Any, Any, Any], failure: str) -> Future:
+        future = self.submit(coro)
+
+        def report(f: Future):
+            if not f.cancelled() and f.exception() is not None:
+                print(f"{failure}: {f.exception()}")
+
+        future.add_done_callback(report)
+        return future
+
+    def close(self, timeout: float = 5.0):
+        async def shutdown():
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+        if self._loop.is_running():
+            try:
+                self.submit(shutdown()).result(timeout)
+            finally:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._thread.join(timeout)
+
+
+_service: Optional[LiveKitService] = None
+_service_lock = threading.Lock()
+
+
+def get_livekit_service() -> LiveKitService:
+    """Process-wide LiveKit service, created on first use."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            settings = get_settings()
+            if not settings.livekit_api_key or not settings.livekit_api_secret:
+                raise ValueError("LiveKit API key and secret must be configured")
+            _service = LiveKitService(
+                url=settings.livekit_url or os.getenv("LIVEKIT_URL", ""),
+                api_key=settings.livekit_api_key,
+                api_secret=settings.livekit_api_secret,
+            )
+        return _service
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Deque, Dict, Optional
+
+from agent.config import get_settings
+
+from .livekit_service import get_livekit_service
+
+
+@dataclass(slots=True)
+class PooledRoom:
+    name: str
+    created_at: float
+
+
+@dataclass
+class RoomPoolStats:
+    target: int = 0
+    ready: int = 0
+    creating: int = 0
+    hits: int = 0
+    misses: int = 0
+    created: int = 0
+    reaped: int = 0
+    create_failures: int = 0
+    avg_create_ms: float = 0.0
+
+
+class RoomPool:
+    """Keeps pre-created LiveKit rooms ready so a token request never waits on create_room.
+
+    acquire() pops a room under a lock from any WSGI thread; creation,
+    replenishment and reaping of rooms older than the TTL all run as
+    coroutines on the LiveKit service loop. The service only needs
+    ``loop``, ``submit()``, ``create_room()`` and ``delete_room()``, so a
+    stub with those methods can stand in for LiveKit.
+
+    Pooled rooms exist before anyone joins them, so the agent worker must use
+    explicit dispatch (``AGENT_NAME``); with automatic dispatch LiveKit would
+    start an agent job in every pooled room as soon as it is created.
+    """
+
+    def __init__(
+        self,
+        service: Any,
+        size: int,
+        ttl_seconds: float,
+        prefix: str = "shop-",
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.service = service
+        self.size = size
+        self.ttl = ttl_seconds
+        self.prefix = prefix
+        self._clock = clock
+        self._ready: Deque[PooledRoom] = deque()
+        self._lock = threading.Lock()
+        self._creating = 0
+        self._failures = 0
+        self._create_ms_total = 0.0
+        self._stats = RoomPoolStats(target=size)
+        self._reaper: Optional[Future] = None
+        self._closed = False
+
+    def start(self):
+        """Fill the pool and start the reaper on the service loop."""
+        if self._reaper is None:
+            self._reaper = self.service.submit(self._reap_loop())
+            self._schedule_replenish()
+
+    def _schedule_replenish(self):
+        self.service.loop.call_soon_threadsafe(self._replenish)
+
+    def _replenish(self):
+        """Start creating rooms until ready + in-flight reaches the target (runs on the loop)."""
+        with self._lock:
+            missing = self.size - len(self._ready) - self._creating
+            if self._closed or missing <= 0:
+                return
+            self._creating += missing
+        for _ in range(missing):
+            asyncio.ensure_future(self._create_one(), loop=self.service.loop)
+
+    async def _create_one(self):
+        name = f"{self.prefix}{uuid.uuid4().hex[:12]}"
+        started = time.perf_counter()
+        try:
+            # LiveKit removes the room itself a little after our TTL if it is never used
+            await self.service.create_room(name, empty_timeout=int(self.ttl) + 60)
+        except Exception as e:
+            with self._lock:
+                self._creating -= 1
+                self._failures += 1
+                self._stats.create_failures += 1
+                delay = min(30.0, 2.0 ** self._failures)
+            print(f"Room pool: could not create room ({e}); retrying in {delay:.0f}s")
+            self.service.loop.call_later(delay, self._replenish)
+            return
+
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with self._lock:
+            self._creating -= 1
+            self._failures = 0
+            self._stats.created += 1
+            self._create_ms_total += elapsed_ms
+            if self._closed:
+                return
+            self._ready.append(PooledRoom(name, self._clock()))
+
+    def acquire(self) -> Optional[str]:
+        """Take a ready room (oldest first), or None when the pool is empty."""
+        now = self._clock()
+        with self._lock:
+            room = None
+            stale = []
+            while self._ready:
+                candidate = self._ready.popleft()
+                if now - candidate.created_at < self.ttl:
+                    room = candidate
+                    break
+                stale.append(candidate)
+            self._stats.reaped += len(stale)
+            if room is None:
+                self._stats.misses += 1
+            else:
+                self._stats.hits += 1
+        for expired in stale:
+            self.service.submit(self._delete(expired.name))
+        self._schedule_replenish()
+        return room.name if room else None
+
+    async def _delete(self, room_name: str):
+        try:
+            await self.service.delete_room(room_name)
+        except Exception as e:
+            print(f"Room pool: could not delete {room_name}: {e}")
+
+    async def _reap_loop(self):
+        """Delete pooled rooms that outlived the TTL and top the pool back up."""
+        interval = max(1.0, self.ttl / 4)
+        while not self._closed:
+            await asyncio.sleep(interval)
+            now = self._clock()
+            with self._lock:
+                expired = [room for room in self._ready if now - room.created_at >= self.ttl]
+                for room in expired:
+                    self._ready.remove(room)
+                self._stats.reaped += len(expired)
+            for room in expired:
+                await self._delete(room.name)
+            self._replenish()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            self._stats.ready = len(self._ready)
+            self._stats.creating = self._creating
+            created = self._stats.created
+            self._stats.avg_create_ms = round(self._create_ms_total / created, 1) if created else 0.0
+            stats = asdict(self._stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 3) if lookups else 0.0
+        stats["ttl_seconds"] = self.ttl
+        return stats
+
+    def close(self, timeout: float = 5.0):
+        """Stop replenishing and delete rooms nobody took."""
+        with self._lock:
+            self._closed = True
+            rooms = list(self._ready)
+            self._ready.clear()
+        if self._reaper is not None:
+            self._reaper.cancel()
+
+        async def delete_all():
+            await asyncio.gather(*(self.service.delete_room(r.name) for r in rooms), return_exceptions=True)
+
+        if rooms:
+            try:
+                self.service.submit(delete_all()).result(timeout)
+            except Exception as e:
+                print(f"Room pool: cleanup incomplete: {e}")
+
+
+_pool: Optional[RoomPool] = None
+_pool_lock = threading.Lock()
+_pool_checked = False
+
+
+def get_room_pool() -> Optional[RoomPool]:
+    """Process-wide room pool, or None when disabled (ROOM_POOL_SIZE=0 or no AGENT_NAME)."""
+    global _pool, _pool_checked
+    if _pool_checked:
+        return _pool
+    with _pool_lock:
+        if not _pool_checked:
+            settings = get_settings()
+            if settings.room_pool_size > 0 and not settings.agent_name:
+                print("Room pool disabled: set AGENT_NAME so the agent is dispatched explicitly into pooled rooms")
+            elif settings.room_pool_size > 0:
+                try:
+                    service = get_livekit_service()
+                except ValueError as e:
+                    print(f"Room pool disabled: {e}")
+                else:
+                    _pool = RoomPool(service, size=settings.room_pool_size, ttl_seconds=settings.room_pool_ttl_seconds)
+                    _pool.start()
+            _pool_checked = True
+        return _pool
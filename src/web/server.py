@@ -1,24 +1,54 @@
 from __future__ import annotations
 
+import argparse
+import atexit
+
 from dotenv import load_dotenv
 
 from .app import app
+from .livekit_service import get_livekit_service
+from .room_pool import get_room_pool
 from agent.config import get_settings
 
 
 def main():
     """Main entry point for the web server."""
+    parser = argparse.ArgumentParser(description="Zenitheon Shop web server")
+    parser.add_argument("--dev", action="store_true", help="Run the Flask development server with debug reloading")
+    args = parser.parse_args()
+
     load_dotenv()
     settings = get_settings()
-    
+
     print("=" * 60)
     print("Zenitheon Shop - Web Server")
     print("=" * 60)
-    print(f"Starting web server on http://localhost:5000")
+    print(f"Starting web server on http://localhost:{settings.web_port}")
     print(f"LiveKit URL: {settings.livekit_url}")
+    print(f"Mode: {'development' if args.dev else f'production ({settings.web_threads} threads)'}")
     print("=" * 60)
-    
-    app.run(debug=True, host="0.0.0.0", port=5000)
+
+    if args.dev:
+        app.run(debug=True, host=settings.web_host, port=settings.web_port)
+        return
+
+    from waitress import serve
+
+    # Open the shared LiveKit client up front so the first token request
+    # doesn't pay for it.
+    try:
+        atexit.register(get_livekit_service().close)
+    except ValueError as e:
+        print(f"Warning: {e}")
+
+    # Fill the room pool before the first click; registered after the
+    # service so it is closed (and its unused rooms deleted) first.
+    pool = get_room_pool()
+    if pool is not None:
+        atexit.register(pool.close)
+        print(f"Room pool: keeping {pool.size} rooms ready (TTL {pool.ttl:.0f}s)")
+
+    serve(app, host=settings.web_host, port=settings.web_port, threads=settings.web_threads)
 
 
 if __name__ == "__main__":
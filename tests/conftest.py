@@ -0,0 +1,37 @@
+import socket
+
+import pytest
+
+from agent.config import Settings
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def settings(tmp_path) -> Settings:
+    """Settings isolated from the developer's .env, with local file paths."""
+    return Settings(
+        _env_file=None,
+        otp_db_path=str(tmp_path / "otp.db"),
+        orders_db_path=str(tmp_path / "orders.db"),
+        phrase_cache_dir=str(tmp_path / "phrases"),
+    )
+
+
+@pytest.fixture
+def use_settings(monkeypatch):
+    """Make get_settings() return the given Settings for the rest of the test."""
+    from agent import config
+
+    def install(settings: Settings) -> Settings:
+        monkeypatch.setattr(config, "Settings", lambda: settings)
+        config.get_settings.cache_clear()
+        config.get_settings()
+        return settings
+
+    yield install
+    config.get_settings.cache_clear()
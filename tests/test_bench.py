@@ -0,0 +1,39 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+
+def run_bench(tmp_path, *args):
+    """Run the bench in its own process, as CI would, so its process-wide routes start fresh."""
+    env = dict(os.environ, PHRASE_CACHE_DIR=str(tmp_path / "phrases"), OTP_BACKEND="memory")
+    report = tmp_path / "report.json"
+    result = subprocess.run(
+        [sys.executable, "-m", "agent.bench", "--calls", "4", "--concurrency", "4",
+         "--stt-ms", "5", "--llm-ms", "10", "--tts-ms", "5", "--json", str(report), *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=120,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
+    return json.loads(report.read_text())
+
+
+def test_bench_completes_calls(tmp_path):
+    report = run_bench(tmp_path)
+    assert report["completed_calls"] == 4
+    assert report["errors"] == []
+    assert report["turns"] > 0
+    # Per-call memory is taken while the calls are open, over the calls open at once
+    assert report["peak_active_calls"] == 4
+    assert report["rss_kb_per_call"] >= 0
+
+
+@pytest.mark.parametrize("faults, counter", [
+    (["--llm-faults", "down"], "provider_failovers"),
+    (["--tts-faults", "down", "--no-secondary"], "cached_audio_fallbacks"),
+])
+def test_bench_survives_provider_faults(tmp_path, faults, counter):
+    report = run_bench(tmp_path, *faults)
+    assert report["completed_calls"] == 4
+    assert report[counter] > 0
@@ -0,0 +1,87 @@
+import math
+from types import SimpleNamespace
+
+import pytest
+from livekit.agents.worker import _WorkerEnvOption
+
+from agent import capacity
+from agent.capacity import CapacityMonitor, job_processes, make_load_fnc, worker_options_kwargs
+
+MB = 2**20
+
+
+def fake_worker(procs):
+    """A worker whose process pool holds (pid, busy) job processes."""
+    processes = [SimpleNamespace(pid=pid, running_job=object() if busy else None) for pid, busy in procs]
+    return SimpleNamespace(_proc_pool=SimpleNamespace(processes=processes), active_jobs=[p for p in processes if p.running_job])
+
+
+@pytest.fixture
+def proc_stats(monkeypatch):
+    """Replace /proc reads with a table of pid -> (cpu seconds, rss bytes)."""
+    stats = {}
+    monkeypatch.setattr(capacity, "_read_proc_stat", stats.get)
+    return stats
+
+
+@pytest.fixture
+def monitor(settings):
+    return CapacityMonitor(settings.model_copy(update={
+        "worker_max_calls": 100, "worker_memory_budget_mb": 4096, "worker_idle_processes": 1,
+    }))
+
+
+def test_job_processes_come_from_the_pool():
+    worker = fake_worker([(101, True), (102, False)])
+    worker._proc_pool.processes.append(SimpleNamespace(pid=None, running_job=None))
+    assert job_processes(worker) == {101: True, 102: False}
+    assert job_processes(SimpleNamespace()) == {}
+
+
+def test_per_call_cost_ignores_non_job_processes(monitor, proc_stats, monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(capacity, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    monitor.cores = 4
+    # 10 and 11 are the forkserver and inference process; the pool only lists the jobs
+    proc_stats.update({
+        10: (0.0, 20 * MB), 11: (0.0, 900 * MB),
+        101: (1.0, 500 * MB), 102: (1.0, 500 * MB), 103: (0.5, 300 * MB),
+    })
+    load = make_load_fnc(monitor)
+    load(fake_worker([(101, True), (102, True), (103, False)]))
+    monitor.sample()
+    now[0] += 10
+    proc_stats.update({101: (2.0, 500 * MB), 102: (2.0, 500 * MB)})
+    monitor.sample()
+
+    report = monitor.report()
+    assert report.job_processes == 3
+    assert report.active_calls == 2
+    assert report.shared_rss_mb == 300
+    assert report.rss_mb_per_call == 200
+    assert report.cpu_cores_per_call == 0.1
+    # Memory-bound: (4096 MB - 300 MB warm) / (200 + 300) MB per call
+    assert report.estimated_capacity == 7
+
+
+def test_exited_processes_are_skipped(monitor, proc_stats):
+    proc_stats.update({102: (0.0, 300 * MB)})
+    monitor.set_job_processes({101: True, 102: False})
+    monitor.sample()
+    assert monitor.report().job_processes == 1
+
+
+def test_admission_stops_at_capacity(settings):
+    monitor = CapacityMonitor(settings.model_copy(update={"worker_max_calls": 2}))
+    assert monitor.try_reserve() and monitor.try_reserve()
+    assert not monitor.try_reserve()
+    assert monitor.load() == 1.0
+
+
+def test_threshold_and_idle_processes_only_in_production(monitor):
+    kwargs = worker_options_kwargs(monitor)
+    threshold, idle = kwargs["load_threshold"], kwargs["num_idle_processes"]
+    assert _WorkerEnvOption.getvalue(threshold, devmode=False) == monitor.settings.worker_load_threshold
+    assert _WorkerEnvOption.getvalue(idle, devmode=False) == 1
+    assert _WorkerEnvOption.getvalue(threshold, devmode=True) == math.inf
+    assert _WorkerEnvOption.getvalue(idle, devmode=True) == 0
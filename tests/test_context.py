@@ -0,0 +1,79 @@
+import pytest
+from livekit.agents import llm
+
+from agent.context import OTHER, SYSTEM, TOOL, USER, ContextStats, bound_chat_ctx, window
+from agent.session import CallSession
+
+S, U, O, T = SYSTEM, USER, OTHER, TOOL
+
+
+def test_short_history_is_kept_whole():
+    kinds = [S, O, U, O, T, T, O]
+    assert window(kinds, max_turns=6, tool_turns=2) == (list(range(len(kinds))), 0)
+
+
+def test_tool_call_and_output_leave_together_at_the_cut():
+    #        0  1  2  3  4  5  6  7  8  9 10 11 12
+    kinds = [S, U, O, T, T, O, U, T, T, O, U, T, T]
+    keep, folded = window(kinds, max_turns=2, tool_turns=1)
+    # Turn one is folded; turn two keeps its reply but not its call/output pair
+    assert folded == 1
+    assert keep == [0, 6, 9, 10, 11, 12]
+
+
+def test_current_turn_is_kept_whole_even_with_zero_limits():
+    kinds = [S, U, T, T, O, U, T, T]
+    keep, folded = window(kinds, max_turns=0, tool_turns=0)
+    assert keep == [0, 5, 6, 7] and folded == 1
+
+
+def test_tool_turns_beyond_max_turns_keep_nothing_already_folded():
+    kinds = [S, U, T, T, U, T, T, U, T, T]
+    keep, folded = window(kinds, max_turns=1, tool_turns=5)
+    assert keep == [0, 7, 8, 9] and folded == 2
+
+
+def chat_ctx(turns: int) -> llm.ChatContext:
+    ctx = llm.ChatContext()
+    ctx.add_message(role="system", content="You are the shop agent.")
+    for turn in range(turns):
+        ctx.add_message(role="user", content=f"customer line {turn}")
+        ctx.items.append(llm.FunctionCall(call_id=f"c{turn}", name="collect_data", arguments="{}"))
+        ctx.items.append(llm.FunctionCallOutput(call_id=f"c{turn}", output="stored", is_error=False))
+        ctx.add_message(role="assistant", content=f"agent line {turn}")
+    return ctx
+
+
+@pytest.fixture
+def bounded_settings(settings, use_settings):
+    return use_settings(settings.model_copy(update={"context_max_turns": 2, "context_tool_turns": 1}))
+
+
+def test_bound_chat_ctx_puts_the_summary_after_the_system_prompt(bounded_settings):
+    original = chat_ctx(8)
+    items = list(original.items)
+    session = CallSession(customer_name="Ayesha", script_stage="email_collection")
+    stats = ContextStats()
+
+    bounded = bound_chat_ctx(original, session, stats)
+
+    # The session's own history is untouched
+    assert original.items == items
+    assert bounded.items[0] is items[0]
+    summary = bounded.items[1]
+    assert summary.role == "system"
+    assert "after 6 earlier turns" in summary.text_content
+    assert "customer name: Ayesha" in summary.text_content
+    assert [item.type for item in bounded.items[2:]] == [
+        "message", "message",  # turn 7 without its tool pair
+        "message", "function_call", "function_call_output", "message",  # turn 8 whole
+    ]
+    assert bounded.items[2].text_content == "customer line 6"
+    assert stats.trimmed_turns == 1 and stats.tokens_after < stats.tokens_before
+
+
+def test_bound_chat_ctx_leaves_a_short_call_as_is(bounded_settings):
+    original = chat_ctx(1)
+    stats = ContextStats()
+    assert bound_chat_ctx(original, CallSession(), stats) is original
+    assert stats.trimmed_turns == 0 and stats.tokens_after == stats.tokens_before
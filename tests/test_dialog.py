@@ -0,0 +1,68 @@
+import asyncio
+from dataclasses import asdict
+from types import SimpleNamespace
+
+import pytest
+
+from agent import constants
+from agent.catalog import get_catalog
+from agent.dialog import DialogEngine
+from agent.session import SessionManager
+from agent.tools import create_data_collection_tool
+
+
+@pytest.fixture
+def script():
+    original = asdict(constants.get_script_variables())
+    yield constants.update_script_variables
+    # Restore through the update path so anything memoized by script version sees the change
+    constants.update_script_variables(**original)
+
+
+@pytest.fixture
+def product():
+    return get_catalog().products()[0]
+
+
+def test_product_confirmation_comes_from_script(script, product):
+    script(
+        product_confirmation="Lovely, {product_name} at {price} it is.",
+        email_request="What email should the {product_name} receipt go to?",
+    )
+    dialog = DialogEngine(SessionManager(ledger=None))
+    line = dialog.after_collect_data("", product.name, "", "")
+    assert line == (
+        f"Lovely, {product.name} at {product.price_label()} it is. "
+        f"What email should the {product.name} receipt go to?"
+    )
+
+
+def test_unknown_product_goes_to_llm(script):
+    dialog = DialogEngine(SessionManager(ledger=None))
+    assert dialog.after_collect_data("", "Not A Real Product", "", "") is None
+
+
+class RecordingSession:
+    def __init__(self):
+        self.said = []
+
+    def say(self, text):
+        self.said.append(text)
+        return SimpleNamespace(text=text)
+
+
+def test_collect_data_speaks_the_confirmation_itself(script, product):
+    script(product_confirmation="{product_name} for {price}, noted.", email_request="Email for the {product_name}?")
+    sessions = SessionManager(ledger=None)
+    collect_data = create_data_collection_tool(sessions, dialog=DialogEngine(sessions))
+    context = SimpleNamespace(session=RecordingSession())
+
+    output = asyncio.run(collect_data({"product_selection": product.name}, context))
+
+    # No tool output, so the LLM is not asked for a reply that would repeat the line
+    assert output is None
+    assert context.session.said == [
+        f"{product.name} for {product.price_label()}, noted. Email for the {product.name}?"
+    ]
+    assert sessions.session.product_selection == product.name
+
@@ -0,0 +1,141 @@
+import asyncio
+
+import pytest
+
+from agent.lifecycle import CallLifecycle, TimerWheel
+
+
+def ticks(wheel: TimerWheel, seconds: float):
+    """Advance the wheel by hand, as the ticking task would over `seconds`."""
+    for _ in range(round(seconds / wheel.tick)):
+        wheel.advance()
+
+
+def run(coro_fn):
+    return asyncio.run(coro_fn())
+
+
+def test_timer_fires_on_its_tick():
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=8)
+        fired = []
+        wheel.schedule(3, lambda: fired.append("a"))
+        ticks(wheel, 2)
+        assert fired == []
+        ticks(wheel, 1)
+        assert fired == ["a"] and len(wheel) == 0
+
+    run(main)
+
+
+def test_timer_longer_than_one_turn_waits_its_rounds():
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=8)
+        fired = []
+        wheel.schedule(20, lambda: fired.append("late"))
+        ticks(wheel, 19)
+        assert fired == []
+        ticks(wheel, 1)
+        assert fired == ["late"]
+
+    run(main)
+
+
+def test_cancel_removes_the_handle_at_once():
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=8)
+        fired = []
+        handle = wheel.schedule(3, lambda: fired.append("a"))
+        wheel.schedule(3, lambda: fired.append("b"))
+        handle.cancel()
+        handle.cancel()
+        assert len(wheel) == 1
+        ticks(wheel, 3)
+        assert fired == ["b"]
+
+    run(main)
+
+
+def test_ticking_task_stops_when_only_cancelled_timers_were_left():
+    async def main():
+        wheel = TimerWheel(tick_seconds=0.01, slots=8)
+        wheel.schedule(600, lambda: None).cancel()
+        await asyncio.sleep(0.05)
+        return wheel._task.done()
+
+    assert run(main)
+
+
+@pytest.fixture
+def lifecycle_settings(settings, use_settings):
+    return use_settings(settings.model_copy(update={
+        "call_max_seconds": 600, "call_idle_seconds": 180, "call_empty_grace_seconds": 10,
+    }))
+
+
+class Hangups:
+    def __init__(self):
+        self.reasons = []
+
+    async def __call__(self, reason):
+        self.reasons.append(reason)
+
+
+def test_touch_keeps_one_idle_timer(lifecycle_settings):
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=64)
+        lifecycle = CallLifecycle(Hangups(), wheel)
+        for _ in range(1000):
+            lifecycle.touch()
+        # The max-duration timer and a single idle timer
+        assert len(wheel) == 2
+        lifecycle.closed()
+        assert len(wheel) == 0
+
+    run(main)
+
+
+def test_idle_call_hangs_up(lifecycle_settings):
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=64)
+        hangups = Hangups()
+        lifecycle = CallLifecycle(hangups, wheel)
+        ticks(wheel, 100)
+        lifecycle.touch()
+        ticks(wheel, 179)
+        assert hangups.reasons == []
+        ticks(wheel, 1)
+        await lifecycle.wait()
+        return hangups.reasons, len(wheel)
+
+    assert run(main) == (["no activity"], 0)
+
+
+def test_empty_room_grace_is_cancelled_by_a_reconnect(lifecycle_settings):
+    async def main():
+        wheel = TimerWheel(tick_seconds=1.0, slots=64)
+        hangups = Hangups()
+        lifecycle = CallLifecycle(hangups, wheel)
+        lifecycle.participants_changed(0)
+        ticks(wheel, 5)
+        lifecycle.participants_changed(1)
+        ticks(wheel, 10)
+        assert hangups.reasons == [] and not lifecycle.done
+
+        lifecycle.participants_changed(0)
+        ticks(wheel, 10)
+        await lifecycle.wait()
+        return hangups.reasons
+
+    assert run(main) == ["no participants remain"]
+
+
+def test_closed_call_lets_the_wheel_task_exit(lifecycle_settings):
+    async def main():
+        wheel = TimerWheel(tick_seconds=0.01, slots=64)
+        lifecycle = CallLifecycle(Hangups(), wheel)
+        lifecycle.closed()
+        await asyncio.sleep(0.05)
+        return wheel._task.done(), lifecycle.done
+
+    assert run(main) == (True, True)
@@ -0,0 +1,163 @@
+import asyncio
+from typing import List
+
+import pytest
+from aiosmtpd.controller import Controller
+
+from agent.mailer import (
+    ORDER_CONFIRMATION_EMAIL,
+    OTP_EMAIL,
+    Mailer,
+    SmtpConnectionPool,
+    build_order_confirmation_message,
+    build_otp_message,
+)
+
+from .conftest import free_port
+
+
+class Sink:
+    """aiosmtpd handler that records deliveries and can reject the first N of them."""
+
+    def __init__(self, reject: int = 0):
+        self.reject = reject
+        self.received: List[str] = []
+        self.sessions = set()
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        if self.reject:
+            self.reject -= 1
+            return "451 Try again later"
+        self.received.extend(envelope.rcpt_tos)
+        return "250 OK"
+
+
+@pytest.fixture
+def smtp_sink():
+    sinks = []
+
+    def start(reject: int = 0):
+        sink = Sink(reject)
+        controller = Controller(sink, hostname="127.0.0.1", port=free_port())
+        controller.start()
+        sinks.append(controller)
+        return sink, controller.port
+
+    yield start
+    for controller in sinks:
+        controller.stop()
+
+
+def mail_settings(settings, port, **overrides):
+    return settings.model_copy(update={
+        "smtp_server": "127.0.0.1",
+        "smtp_port": port,
+        "smtp_use_tls": False,
+        "smtp_username": None,
+        "smtp_password": None,
+        "smtp_pool_size": 1,
+        "email_retry_base_seconds": 0.01,
+        **overrides,
+    })
+
+
+def order_email(n: int):
+    return build_order_confirmation_message(f"c{n}@example.com", "Ayesha", "Hoodie", f"ORD{n}", f"TRK{n}", "shop@example.com")
+
+
+def test_delivers_otp_over_pooled_connection(smtp_sink, settings):
+    sink, port = smtp_sink()
+    s = mail_settings(settings, port)
+
+    async def run():
+        mailer = Mailer(SmtpConnectionPool(s), s)
+        mailer.enqueue(OTP_EMAIL, build_otp_message("a@example.com", "123456", "shop@example.com"))
+        mailer.enqueue(OTP_EMAIL, build_otp_message("b@example.com", "654321", "shop@example.com"))
+        await mailer.close()
+        mailer.transport.close()
+        return mailer
+
+    mailer = asyncio.run(run())
+    assert sink.received == ["a@example.com", "b@example.com"]
+    assert mailer.sent == 2 and mailer.failed == 0
+    # The second message reused the first one's connection
+    assert len(sink.sessions) == 1
+
+
+def test_batches_order_confirmations(settings):
+    class Recorder:
+        def __init__(self):
+            self.batches: List[int] = []
+
+        def send_batch(self, messages):
+            self.batches.append(len(messages))
+            return [None] * len(messages)
+
+        def warm(self):
+            pass
+
+        def close(self):
+            pass
+
+    s = settings.model_copy(update={"smtp_pool_size": 1, "email_batch_size": 4, "email_batch_window_ms": 100})
+    transport = Recorder()
+
+    async def run():
+        mailer = Mailer(transport, s)
+        for n in range(6):
+            mailer.enqueue(ORDER_CONFIRMATION_EMAIL, order_email(n))
+        await mailer.close()
+        return mailer
+
+    mailer = asyncio.run(run())
+    assert transport.batches == [4, 2]
+    assert mailer.sent == 6
+
+
+def test_retries_transient_smtp_errors(smtp_sink, settings):
+    sink, port = smtp_sink(reject=2)
+    s = mail_settings(settings, port, email_max_retries=3)
+
+    async def run():
+        mailer = Mailer(SmtpConnectionPool(s), s)
+        mailer.enqueue(ORDER_CONFIRMATION_EMAIL, order_email(1))
+        await mailer.close()
+        mailer.transport.close()
+        return mailer
+
+    mailer = asyncio.run(run())
+    assert sink.received == ["c1@example.com"]
+    assert mailer.sent == 1 and mailer.failed == 0
+
+
+def test_gives_up_after_max_retries(smtp_sink, settings):
+    sink, port = smtp_sink(reject=100)
+    s = mail_settings(settings, port, email_max_retries=2)
+
+    async def run():
+        mailer = Mailer(SmtpConnectionPool(s), s)
+        mailer.enqueue(OTP_EMAIL, build_otp_message("a@example.com", "123456", "shop@example.com"))
+        await mailer.close()
+        mailer.transport.close()
+        return mailer
+
+    mailer = asyncio.run(run())
+    assert sink.received == []
+    assert mailer.sent == 0 and mailer.failed == 1
+    # The first attempt plus two retries
+    assert sink.reject == 100 - 3
+
+
+def test_full_queue_rejects(settings):
+    s = settings.model_copy(update={"email_queue_size": 1})
+
+    async def run():
+        mailer = Mailer(SmtpConnectionPool(s), s)
+        results = [mailer.enqueue(OTP_EMAIL, build_otp_message("a@example.com", "1", "x")) for _ in range(3)]
+        for task in mailer._workers:
+            task.cancel()
+        await asyncio.gather(*mailer._workers, return_exceptions=True)
+        return results
+
+    assert asyncio.run(run()) == [True, False, False]
@@ -0,0 +1,61 @@
+import concurrent.futures
+import sqlite3
+
+import pytest
+
+from agent.orders import OrderLedger
+from agent.types import OrderResult
+
+
+def order(order_id: str, email: str = "a@example.com") -> OrderResult:
+    return OrderResult("2025-01-01 10:00:00", "Ayesha", "Hoodie", email, order_id, f"TRK{order_id}", "")
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = OrderLedger(str(tmp_path / "orders.db"), commit_interval_ms=100)
+    yield ledger
+    ledger.close()
+
+
+def test_group_commit(ledger):
+    futures = [ledger.append(order(f"ORD{n}")) for n in range(20)]
+    concurrent.futures.wait(futures, timeout=5)
+    assert [f.result().order_id for f in futures] == [f"ORD{n}" for n in range(20)]
+    assert ledger.find("ORD7").email == "a@example.com"
+    assert len(ledger.by_email("a@example.com")) == 20
+
+
+def test_duplicate_fails_only_its_own_order(ledger):
+    ledger.append(order("DUP")).result(timeout=5)
+    futures = [ledger.append(order("OK1")), ledger.append(order("DUP", "b@example.com")), ledger.append(order("OK2"))]
+    concurrent.futures.wait(futures, timeout=5)
+    assert futures[0].result().order_id == "OK1"
+    assert futures[2].result().order_id == "OK2"
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result()
+    assert [o.order_id for o in ledger.by_email("a@example.com")] == ["DUP", "OK1", "OK2"]
+    assert ledger.by_email("b@example.com") == []
+
+
+def test_schema_exists_before_first_order(tmp_path):
+    path = tmp_path / "orders.db"
+    ledger = OrderLedger(str(path))
+    try:
+        tables = sqlite3.connect(path).execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall()
+        assert ("orders",) in tables
+    finally:
+        ledger.close()
+
+
+def test_close_commits_queued_orders(tmp_path):
+    path = str(tmp_path / "orders.db")
+    ledger = OrderLedger(path, commit_interval_ms=1000)
+    futures = [ledger.append(order(f"ORD{n}")) for n in range(3)]
+    ledger.close()
+    assert all(f.done() and f.exception() is None for f in futures)
+    reopened = OrderLedger(path)
+    try:
+        assert len(reopened.by_email("a@example.com")) == 3
+    finally:
+        reopened.close()
@@ -0,0 +1,126 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from agent.otp import MemoryOtpStore, OtpStatus, SqliteOtpStore
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryOtpStore(ttl_seconds=60, max_attempts=3)
+    return SqliteOtpStore(str(tmp_path / "otp.db"), ttl_seconds=60, max_attempts=3)
+
+
+def test_verify_once(store):
+    store.issue("a@example.com", "123456")
+    assert store.verify("a@example.com", "123456") == OtpStatus.VERIFIED
+    assert store.verify("a@example.com", "123456") == OtpStatus.NOT_FOUND
+
+
+def test_locks_after_max_attempts(store):
+    store.issue("a@example.com", "123456")
+    assert store.verify("a@example.com", "000000") == OtpStatus.INVALID
+    assert store.verify("a@example.com", "000000") == OtpStatus.INVALID
+    assert store.verify("a@example.com", "000000") == OtpStatus.LOCKED
+    # Even the right code is refused once locked
+    assert store.verify("a@example.com", "123456") == OtpStatus.LOCKED
+
+
+def test_resend_keeps_attempts(store):
+    store.issue("a@example.com", "111111")
+    assert store.verify("a@example.com", "000000") == OtpStatus.INVALID
+    assert store.verify("a@example.com", "000000") == OtpStatus.INVALID
+    assert store.issue("a@example.com", "222222")
+    assert store.verify("a@example.com", "000000") == OtpStatus.LOCKED
+
+
+def test_locked_email_gets_no_new_code(store):
+    store.issue("a@example.com", "111111")
+    for _ in range(3):
+        store.verify("a@example.com", "000000")
+    assert store.issue("a@example.com", "333333") is False
+    assert store.verify("a@example.com", "333333") == OtpStatus.LOCKED
+
+
+@pytest.mark.parametrize("backend", ["memory", "sqlite"])
+def test_resend_does_not_extend_a_lock(backend, tmp_path):
+    if backend == "memory":
+        store = MemoryOtpStore(ttl_seconds=0.2, max_attempts=1)
+    else:
+        store = SqliteOtpStore(str(tmp_path / "otp.db"), ttl_seconds=0.2, max_attempts=1)
+    store.issue("a@example.com", "111111")
+    assert store.verify("a@example.com", "000000") == OtpStatus.LOCKED
+    assert not store.issue("a@example.com", "222222")
+    time.sleep(0.25)
+    # The lock ended with the original code, so a fresh one can be issued
+    assert store.issue("a@example.com", "333333")
+    assert store.verify("a@example.com", "333333") == OtpStatus.VERIFIED
+
+
+def test_send_otp_tool_reports_a_lock_without_emailing(store, monkeypatch):
+    from agent import tools
+
+    sent = []
+    monkeypatch.setattr(tools, "get_otp_store", lambda: store)
+    monkeypatch.setattr(tools, "queue_otp_email", lambda email, code: sent.append(email))
+    send_otp = tools.create_send_otp_tool()
+    store.issue("a@example.com", "111111")
+    for _ in range(3):
+        store.verify("a@example.com", "000000")
+
+    output = asyncio.run(send_otp({"email": "a@example.com"}, None))
+    assert output == "Error: Too many incorrect attempts. Please try again later."
+    assert sent == []
+
+
+def test_resend_replaces_code(store):
+    store.issue("a@example.com", "111111")
+    store.issue("a@example.com", "222222")
+    assert store.verify("a@example.com", "111111") == OtpStatus.INVALID
+    assert store.verify("a@example.com", "222222") == OtpStatus.VERIFIED
+
+
+def test_expired_code_starts_over(tmp_path):
+    store = SqliteOtpStore(str(tmp_path / "otp.db"), ttl_seconds=-1, max_attempts=3)
+    store.issue("a@example.com", "123456")
+    assert store.verify("a@example.com", "123456") == OtpStatus.EXPIRED
+
+
+def test_verify_tool_does_not_block_event_loop(tmp_path, monkeypatch):
+    """A verify waiting on another process's write lock must not stall the call's other tasks."""
+    from agent import tools
+
+    path = str(tmp_path / "otp.db")
+    store = SqliteOtpStore(path, ttl_seconds=60, max_attempts=3)
+    store.issue("a@example.com", "123456")
+    monkeypatch.setattr(tools, "get_otp_store", lambda: store)
+    verify_otp = tools.create_verify_otp_tool()
+
+    other = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+    other.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.5, lambda: other.execute("COMMIT"))
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        release.start()
+        output = await verify_otp({"email": "a@example.com", "otp_code": "123456"}, None)
+        task.cancel()
+        return output, ticks
+
+    output, ticks = asyncio.run(run())
+    other.close()
+    assert output == "OTP verified successfully"
+    # The loop kept running while the store waited for the lock
+    assert ticks > 10
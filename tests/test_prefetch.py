@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from agent import prefetch
+from agent.mailer import Mailer
+from agent.prefetch import SEND_OTP, Prefetcher
+
+
+class WarmTransport:
+    """Transport whose warm() takes `delay` seconds and fails when `fail` is set."""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.warmed = 0
+
+    def warm(self):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionRefusedError("smtp down")
+        self.warmed += 1
+
+    def send_batch(self, messages):
+        return [None] * len(messages)
+
+
+@pytest.fixture
+def use_transport(settings, monkeypatch):
+    def install(transport):
+        mailer = Mailer(transport, settings)
+        monkeypatch.setattr(prefetch, "smtp_configured", lambda: True)
+        monkeypatch.setattr(prefetch, "get_mailer", lambda: mailer)
+        return transport
+
+    return install
+
+
+def run_send_otp_after(prefetcher: Prefetcher, wait: float):
+    async def run():
+        prefetcher.observe_stage("email_collection")
+        await asyncio.sleep(wait)
+        return prefetcher.take(SEND_OTP, "")
+
+    return asyncio.run(run())
+
+
+def test_finished_warm_up_is_a_hit(use_transport):
+    transport = use_transport(WarmTransport())
+    prefetcher = Prefetcher()
+    assert run_send_otp_after(prefetcher, 0.1) is True
+    assert transport.warmed == 1
+    assert (prefetcher.stats.hits, prefetcher.stats.misses) == (1, 0)
+
+
+def test_failed_warm_up_is_a_miss(use_transport):
+    use_transport(WarmTransport(fail=True))
+    prefetcher = Prefetcher()
+    assert run_send_otp_after(prefetcher, 0.1) is None
+    assert (prefetcher.stats.hits, prefetcher.stats.misses) == (0, 1)
+    assert prefetcher.stats.hit_rate == 0.0
+
+
+def test_warm_up_still_connecting_is_a_miss(use_transport):
+    use_transport(WarmTransport(delay=0.3))
+    prefetcher = Prefetcher()
+    assert run_send_otp_after(prefetcher, 0.0) is None
+    assert prefetcher.stats.misses == 1
+
+
+def test_unused_warm_up_is_wasted(use_transport):
+    use_transport(WarmTransport())
+    prefetcher = Prefetcher()
+
+    async def run():
+        prefetcher.observe_transcript("it's jane at example dot com, jane@example.com")
+        prefetcher.observe_stage("email_collection")
+        await asyncio.sleep(0.05)
+        return prefetcher.close()
+
+    stats = asyncio.run(run())
+    assert stats.issued == 1 and stats.wasted == 1
@@ -0,0 +1,158 @@
+import asyncio
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+import pytest
+from aiohttp import web
+from livekit import rtc
+from livekit.agents import APIConnectOptions
+from livekit.plugins import deepgram
+
+from agent.providers.pool import ProviderPool, close_provider_pool, get_provider_pool
+from agent.providers.stt import create_deepgram_stt
+
+from .conftest import free_port
+
+
+class MockProviders:
+    """One local HTTP/WebSocket server standing in for Deepgram, OpenAI and Cartesia."""
+
+    def __init__(self):
+        self.port = free_port()
+        self.requests = []
+        self.sockets = []
+        self.socket_opened = asyncio.Event()
+        self._runner = None
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests.append((request.method, request.path))
+        if request.headers.get("Upgrade", "").lower() != "websocket":
+            return web.Response(status=200)
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.append(request.path_qs)
+        self.socket_opened.set()
+        # Recording the handshake is enough; hang up so clients close without waiting
+        await ws.close()
+        return ws
+
+    async def __aenter__(self):
+        app = web.Application()
+        app.router.add_route("*", "/{tail:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._runner.cleanup()
+
+
+@pytest.fixture
+def settings(settings):
+    return settings.model_copy(update={
+        "deepgram_api_key": "dg-test", "openai_api_key": "sk-test", "cartesia_api_key": "ca-test",
+        "cartesia_voice_id": "voice",
+    })
+
+
+def test_deepgram_defaults_to_the_listen_endpoint(settings, use_settings):
+    use_settings(settings)
+    stt = create_deepgram_stt()
+    assert settings.deepgram_base_url == "https://api.deepgram.com/v1/listen"
+    assert stt._opts.endpoint_url == "https://api.deepgram.com/v1/listen"
+
+
+def test_deepgram_stream_connects_to_the_configured_url(settings, use_settings):
+    async def run():
+        async with MockProviders() as mock, aiohttp.ClientSession() as session:
+            use_settings(settings.model_copy(update={"deepgram_base_url": mock.url("/v1/listen")}))
+            # The mock hangs up after the handshake; don't reconnect
+            stream = create_deepgram_stt(http_session=session).stream(conn_options=APIConnectOptions(max_retry=0))
+            stream.push_frame(rtc.AudioFrame(b"\0\0" * 160, 16000, 1, 160))
+            try:
+                await asyncio.wait_for(mock.socket_opened.wait(), 5)
+            finally:
+                await stream.aclose()
+            return mock.sockets
+
+    (path_qs,) = asyncio.run(run())
+    url = urlsplit(path_qs)
+    assert url.path == "/v1/listen"
+    assert parse_qs(url.query)["model"] == ["nova-3"]
+
+
+def test_pool_warms_every_endpoint_on_one_session(settings, use_settings):
+    async def run():
+        async with MockProviders() as mock:
+            s = use_settings(settings.model_copy(update={
+                "deepgram_base_url": mock.url("/v1/listen"),
+                "openai_base_url": mock.url("/v1"),
+                "cartesia_base_url": mock.url("/cartesia"),
+            }))
+            pool = ProviderPool(s)
+            try:
+                await pool.warm_up()
+                lease = pool.lease()
+                return mock, lease, pool.report(), pool.lease()
+            finally:
+                await pool.aclose()
+
+    mock, lease, report, second = asyncio.run(run())
+    assert lease.warm and second.warm
+    assert second.stt is lease.stt and second.llm is lease.llm
+    assert isinstance(lease.stt, deepgram.STT)
+    by_name = {e["name"]: e for e in report.endpoints}
+    assert set(by_name) == {"deepgram", "openai", "cartesia"}
+    for endpoint in by_name.values():
+        assert endpoint["healthy"] and endpoint["checks"] == 2
+        assert endpoint["cold_ms"] > 0 and endpoint["warm_ms"] > 0
+    assert ("HEAD", "/v1/listen") in mock.requests
+    assert report.warm_leases == 2
+
+
+def test_pool_reports_an_unreachable_endpoint(settings, use_settings):
+    async def run():
+        async with MockProviders() as mock:
+            s = use_settings(settings.model_copy(update={
+                "deepgram_base_url": mock.url("/v1/listen"),
+                "openai_base_url": mock.url("/v1"),
+                "cartesia_base_url": f"http://127.0.0.1:{free_port()}",
+            }))
+            pool = ProviderPool(s)
+            try:
+                await pool.warm_up()
+                return pool.lease(), pool.report()
+            finally:
+                await pool.aclose()
+
+    lease, report = asyncio.run(run())
+    assert not lease.warm and lease.est_handshake_saved_ms == 0.0
+    by_name = {e["name"]: e for e in report.endpoints}
+    assert by_name["deepgram"]["healthy"] and by_name["openai"]["healthy"]
+    assert not by_name["cartesia"]["healthy"]
+    assert by_name["cartesia"]["failures"] == 1 and by_name["cartesia"]["last_error"]
+    assert report.warm_leases == 0
+
+
+def test_closing_the_job_pool_closes_its_connections(settings, use_settings):
+    async def run():
+        async with MockProviders() as mock:
+            use_settings(settings.model_copy(update={
+                "deepgram_base_url": mock.url("/v1/listen"),
+                "openai_base_url": mock.url("/v1"),
+                "cartesia_base_url": mock.url("/cartesia"),
+            }))
+            pool = get_provider_pool()
+            assert get_provider_pool() is pool
+            await pool.warm_up()
+            await close_provider_pool()
+            await close_provider_pool()
+            return pool, get_provider_pool()
+
+    pool, after = asyncio.run(run())
+    assert pool._session.closed and pool._keepalive.cancelled()
+    assert after is not pool
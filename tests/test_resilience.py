@@ -0,0 +1,306 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+from livekit.agents import ModelSettings, llm
+
+from agent import voice
+from agent.constants import get_script_variables
+from agent.providers.fake import FaultProfile, LatencyProfile
+from agent.providers.llm import create_fallback_llm, create_tier_fallback_llms, create_tier_llms
+from agent.providers.resilience import (
+    CLOSED, HALF_OPEN, OPEN, CircuitBreaker, ProviderRoute, ProviderTimeout, ProviderUnavailable,
+)
+from agent.providers.tts import create_fallback_tts
+from agent.routing import LLMRouter, ModelTier, RoutingStats, get_llm_router
+from agent.voice import ShopVoiceAgent
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def breaker(clock=None, **kwargs) -> CircuitBreaker:
+    options = dict(window=10, min_requests=4, error_rate=0.5, latency_factor=2.0, cooldown_seconds=10.0)
+    options.update(kwargs)
+    return CircuitBreaker("test", 100.0, clock=clock or FakeClock(), **options)
+
+
+def route(budget_ms=50.0, first_timeout=1.0) -> ProviderRoute:
+    return ProviderRoute("llm", first_timeout, budget_ms, 1.0, (breaker(), breaker()))
+
+
+class Side:
+    """One side of a route: answers after its injected latency, or fails or stalls per its faults."""
+
+    def __init__(self, name, latency_ms=0.0, faults=None):
+        self.name = name
+        self.latency = LatencyProfile(latency_ms)
+        self.faults = faults or FaultProfile()
+        self.rng = random.Random(0)
+        self.calls = 0
+        self.cancelled = 0
+
+    async def __call__(self):
+        self.calls += 1
+        try:
+            await self.faults.inject(self.rng)
+            await asyncio.sleep(self.latency.sample(self.rng))
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return self.name
+
+
+def test_breaker_opens_on_error_rate_and_closes_after_a_probe():
+    clock = FakeClock()
+    b = breaker(clock)
+    for ok in (True, False, True):
+        b.record(ok, 10)
+    assert b.state == CLOSED
+    b.record(False, 10)
+    assert b.state == OPEN and b.trips == 1
+    assert not b.allow()
+
+    clock.now += 10
+    assert b.state == HALF_OPEN
+    assert b.allow()
+    # Only one probe at a time
+    assert not b.allow()
+    b.record(True, 10)
+    assert b.state == CLOSED and b.allow()
+
+
+def test_breaker_reopens_when_the_probe_fails():
+    clock = FakeClock()
+    b = breaker(clock)
+    for _ in range(4):
+        b.record(False, 10)
+    clock.now += 10
+    assert b.allow()
+    b.record(False, 10)
+    assert b.state == OPEN and b.trips == 2
+    clock.now += 9
+    assert not b.allow()
+
+
+def test_breaker_opens_on_p95_latency_over_the_budget():
+    b = breaker()
+    for _ in range(3):
+        b.record(True, 150)
+    assert b.state == CLOSED
+    # p95 of 250 ms against a 100 ms budget x 2
+    b.record(True, 250)
+    assert b.state == OPEN
+
+
+def test_breaker_release_frees_a_probe_that_lost_a_hedge():
+    clock = FakeClock()
+    b = breaker(clock)
+    for _ in range(4):
+        b.record(False, 10)
+    clock.now += 10
+    assert b.allow()
+    b.release(5)
+    assert b.state == HALF_OPEN and b.allow()
+
+
+def test_fast_primary_is_not_hedged():
+    r = route()
+    primary, secondary = Side("primary", 5), Side("secondary", 5)
+    assert asyncio.run(r.call(primary, secondary)) == "primary"
+    assert secondary.calls == 0
+    assert r.stats.hedged == 0 and r.stats.primary_wins == 1
+
+
+def test_slow_primary_is_hedged_and_the_loser_cancelled():
+    r = route(budget_ms=50)
+    primary, secondary = Side("primary", 500), Side("secondary", 10)
+    assert asyncio.run(r.call(primary, secondary)) == "secondary"
+    assert primary.cancelled == 1
+    assert r.stats.hedged == 1 and r.stats.secondary_wins == 1
+    # The cancelled primary counts as a slow success, not an error
+    assert r.breakers[0].failure_rate() == 0.0
+
+
+def test_slow_primary_without_a_secondary_is_not_sent_twice():
+    r = route(budget_ms=50)
+    primary = Side("primary", 120)
+    assert asyncio.run(r.call(primary)) == "primary"
+    assert primary.calls == 1
+    assert r.stats.hedged == 0
+
+
+def test_failing_primary_fails_over_before_the_hedge_budget():
+    r = route(budget_ms=5000)
+    primary, secondary = Side("primary", faults=FaultProfile(down=True)), Side("secondary", 5)
+    assert asyncio.run(r.call(primary, secondary)) == "secondary"
+    assert r.stats.failovers == 1 and r.stats.hedged == 0
+    assert r.breakers[0].failure_rate() == 1.0
+
+
+def test_open_primary_breaker_sends_requests_straight_to_the_secondary():
+    r = route()
+    for _ in range(4):
+        r.breakers[0].record(False, 10)
+    primary, secondary = Side("primary"), Side("secondary")
+    assert asyncio.run(r.call(primary, secondary)) == "secondary"
+    assert primary.calls == 0
+
+
+def test_stalled_sides_time_out():
+    r = route(budget_ms=10, first_timeout=0.1)
+    stall = FaultProfile(stall_rate=1.0, stall_ms=5000)
+    primary, secondary = Side("primary", faults=stall), Side("secondary", faults=stall)
+    with pytest.raises(ProviderTimeout):
+        asyncio.run(r.call(primary, secondary))
+    assert primary.cancelled == secondary.cancelled == 1
+    assert r.stats.timeouts == 1
+    assert all(b.failure_rate() == 1.0 for b in r.breakers)
+
+
+def test_no_usable_side_raises_unavailable():
+    r = route()
+    down = FaultProfile(down=True)
+    with pytest.raises(ProviderUnavailable, match="InjectedFault"):
+        asyncio.run(r.call(Side("primary", faults=down), Side("secondary", faults=down)))
+
+
+def test_stream_hedges_on_the_first_item():
+    r = route(budget_ms=30)
+
+    def stream(name, first_ms):
+        async def items():
+            await asyncio.sleep(first_ms / 1000)
+            for i in range(3):
+                yield f"{name}-{i}"
+        return items
+
+    async def collect():
+        return [item async for item in r.stream(stream("primary", 500), stream("secondary", 5))]
+
+    assert asyncio.run(collect()) == ["secondary-0", "secondary-1", "secondary-2"]
+    assert r.stats.hedged == 1
+
+
+@pytest.fixture
+def routed_settings(settings, use_settings):
+    def install(**update):
+        get_llm_router.cache_clear()
+        return use_settings(settings.model_copy(update={"openai_api_key": "sk-test", **update}))
+
+    yield install
+    get_llm_router.cache_clear()
+
+
+def test_no_fallback_model_means_no_hedge_target(routed_settings):
+    routed_settings(openai_fallback_model=None)
+    assert create_fallback_llm() is None
+    assert create_tier_fallback_llms() == {}
+    assert create_fallback_tts() is None
+
+    s = routed_settings(openai_fallback_model="gpt-4o-mini", openai_model="gpt-4o-mini")
+    assert create_fallback_llm() is None
+    assert s.openai_fallback_model == s.openai_model
+
+
+def test_tier_fallbacks_keep_the_tier_limits(routed_settings):
+    routed_settings(openai_model="gpt-4o-mini", openai_fallback_model="gpt-4.1-mini")
+    fallbacks = create_tier_fallback_llms()
+    # The "smart" tier already runs on the fallback model, so it has no hedge target
+    assert set(fallbacks) == {"fast", "standard"}
+    for name, fallback in fallbacks.items():
+        tier = get_llm_router().tier(name)
+        assert fallback.model == "gpt-4.1-mini"
+        assert fallback._opts.max_completion_tokens == tier.max_tokens
+        assert fallback._opts.temperature == tier.temperature
+    assert create_tier_llms()["fast"]._opts.max_completion_tokens == 150
+
+
+class StubLLM:
+    def __init__(self, name, first_ms):
+        self.name = self.model = name
+        self.first_ms = first_ms
+        self.calls = 0
+
+    def chat(self, **kwargs):
+        self.calls += 1
+
+        async def chunks():
+            await asyncio.sleep(self.first_ms / 1000)
+            yield f"from {self.name}"
+        return chunks()
+
+
+class BrokenLLM(StubLLM):
+    """Fails after sending `chunks` chunks."""
+
+    def __init__(self, name, chunks):
+        super().__init__(name, 0)
+        self.chunks = chunks
+
+    def chat(self, **kwargs):
+        self.calls += 1
+
+        async def chunks():
+            for i in range(self.chunks):
+                yield f"{self.name}-{i}"
+            raise RuntimeError("connection reset")
+        return chunks()
+
+
+def run_llm_node(agent, monkeypatch, r):
+    tiers = [ModelTier("fast", "small", 0.2, 150), ModelTier("standard", "big", 0.3, 300)]
+    router = LLMRouter(tiers, {"intro": "fast"}, "standard", degrade_ttft_ms=10_000, degrade_seconds=60)
+    monkeypatch.setattr(voice, "get_llm_router", lambda: router)
+    monkeypatch.setattr(voice, "get_route", lambda name: r)
+
+    async def collect():
+        return [c async for c in agent.llm_node(llm.ChatContext(), [], ModelSettings())]
+
+    return asyncio.run(collect())
+
+
+@pytest.fixture
+def call(settings, use_settings):
+    use_settings(settings.model_copy(update={"context_trim_enabled": False}))
+    return SimpleNamespace(session=SimpleNamespace(script_stage="intro"), routing=RoutingStats())
+
+
+def test_llm_node_hedges_to_the_routed_tier_fallback(call, monkeypatch):
+    untiered = StubLLM("untiered-fallback", 5)
+    fast, fast_fallback = StubLLM("fast", 500), StubLLM("fast-fallback", 5)
+    agent = ShopVoiceAgent(
+        call=call, instructions="test", tier_llms={"fast": fast, "standard": StubLLM("standard", 5)},
+        tier_fallback_llms={"fast": fast_fallback}, fallback_llm=untiered,
+    )
+    r = route(budget_ms=30)
+    assert run_llm_node(agent, monkeypatch, r) == ["from fast-fallback"]
+    assert untiered.calls == 0 and r.stats.hedged == 1
+    usage = call.routing.stages["intro"]
+    assert usage.tiers == {"fast": 1} and usage.fallback_turns == 1
+
+
+def test_llm_node_without_a_tier_fallback_does_not_hedge(call, monkeypatch):
+    fast = StubLLM("fast", 100)
+    agent = ShopVoiceAgent(call=call, instructions="test", tier_llms={"fast": fast}, fallback_llm=StubLLM("fb", 5))
+    r = route(budget_ms=30)
+    assert run_llm_node(agent, monkeypatch, r) == ["from fast"]
+    assert fast.calls == 1 and r.stats.hedged == 0
+
+
+def test_llm_node_apologises_only_when_nothing_was_said(call, monkeypatch):
+    agent = ShopVoiceAgent(call=call, instructions="test", tier_llms={"fast": BrokenLLM("fast", 0)})
+    assert run_llm_node(agent, monkeypatch, route(first_timeout=2.0)) == [get_script_variables().provider_apology]
+    # The failed turn is sampled at the deadline
+    usage = call.routing.stages["intro"]
+    assert usage.failed_turns == 1 and usage.avg_ttft_ms == 2000
+
+    agent = ShopVoiceAgent(call=call, instructions="test", tier_llms={"fast": BrokenLLM("fast", 2)})
+    assert run_llm_node(agent, monkeypatch, route()) == ["fast-0", "fast-1"]
+    assert usage.turns == 2 and usage.failed_turns == 1
@@ -0,0 +1,61 @@
+from pathlib import Path
+
+import pytest
+
+from agent.catalog import build_snapshot
+from agent.resolver import ProductResolver, benchmark, synthetic_catalog
+
+INVENTORY = Path(__file__).resolve().parents[1] / "inventory.json"
+
+
+@pytest.fixture(scope="module")
+def resolver():
+    return ProductResolver(build_snapshot(INVENTORY.read_bytes()).products)
+
+
+@pytest.mark.parametrize("spoken, category, expected", [
+    # Typo
+    ("the stelth bomber hoody", "Hoodie", "The Stealth Bomber Hoodie"),
+    # Transcription spelling
+    ("zenithion classic tee", None, "The Zenitheon Classic T-Shirt"),
+    # A word split in two by the transcriber
+    ("zenith eon classic hoodie", None, "The Zenitheon Classic Hoodie"),
+    ("the urban windbreaker", None, "The Urban Windbreaker"),
+])
+def test_spoken_references_resolve(resolver, spoken, category, expected):
+    result = resolver.resolve(spoken, category)
+    assert result.resolved is not None and result.resolved.name == expected
+
+
+def test_category_filter_narrows_a_shared_name(resolver):
+    assert resolver.resolve("stealth bomber").ambiguous
+    result = resolver.resolve("stealth bomber", "Jacket")
+    assert result.resolved.name == "The Stealth Bomber Jacket"
+    assert all(m.product.category == "Jacket" for m in result.matches)
+
+
+def test_equally_good_matches_are_left_ambiguous(resolver):
+    result = resolver.resolve("the urban comfort one")
+    assert result.resolved is None and result.ambiguous
+    assert {m.product.name for m in result.matches} == {"The Urban Comfort Hoodie", "The Urban Comfort T-Shirt"}
+
+
+def test_sku_and_exact_name_resolve_directly(resolver):
+    assert resolver.resolve("zn-hd-002").resolved.name == "The Zenitheon Classic Hoodie"
+    assert resolver.resolve("The Urban Comfort T-Shirt").matches[0].score == 1.0
+
+
+def test_unrelated_words_match_nothing(resolver):
+    assert resolver.resolve("a pair of running shoes").matches == []
+
+
+def test_synthetic_names_are_distinct_without_model_numbers():
+    names = [p.name for p in synthetic_catalog(5000)]
+    assert len(set(names)) == len(names)
+    assert not any(ch.isdigit() for name in names for ch in name)
+
+
+def test_benchmark_resolves_misspelled_names():
+    report = benchmark(2000, queries=200)
+    assert report.accuracy + report.ambiguous_rate >= 0.99
+    assert report.accuracy >= 0.9
@@ -0,0 +1,194 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from web.room_pool import RoomPool
+
+
+class FakeRoomService:
+    """Stands in for LiveKitService: its own loop thread, rooms kept in a set."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.rooms = set()
+        self.deleted = []
+        self.create_calls = 0
+        self.fail_creates = False
+        self.gate = threading.Event()
+        self.gate.set()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    async def create_room(self, room_name, empty_timeout=300):
+        self.create_calls += 1
+        while not self.gate.is_set():
+            await asyncio.sleep(0.005)
+        if self.fail_creates:
+            raise RuntimeError("create_room refused")
+        self.rooms.add(room_name)
+
+    async def delete_room(self, room_name):
+        self.rooms.discard(room_name)
+        self.deleted.append(room_name)
+
+    def close(self):
+        async def drain():
+            # Let cancelled coroutines such as the pool's reaper finish before the loop stops
+            tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        self.submit(drain()).result(1)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(1)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def wait_for(predicate, timeout=3.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def service():
+    service = FakeRoomService()
+    yield service
+    service.close()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_pool(service, clock):
+    pools = []
+
+    def make(size=3, ttl_seconds=60.0):
+        pool = RoomPool(service, size=size, ttl_seconds=ttl_seconds, clock=clock)
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        pool.close()
+
+
+def test_start_fills_the_pool(service, make_pool):
+    pool = make_pool(size=3)
+    pool.start()
+    wait_for(lambda: pool.stats()["ready"] == 3)
+
+    stats = pool.stats()
+    assert stats["created"] == 3 and stats["creating"] == 0
+    assert len(service.rooms) == 3
+    assert all(name.startswith("shop-") for name in service.rooms)
+
+
+def test_acquire_takes_the_oldest_room_and_replenishes(service, clock, make_pool):
+    pool = make_pool(size=2)
+    pool.start()
+    wait_for(lambda: pool.stats()["ready"] == 2)
+    oldest = pool._ready[0].name
+
+    assert pool.acquire() == oldest
+    wait_for(lambda: pool.stats()["ready"] == 2)
+
+    stats = pool.stats()
+    assert stats["hits"] == 1 and stats["misses"] == 0
+    assert stats["created"] == 3
+    assert oldest not in {room.name for room in pool._ready}
+
+
+def test_acquire_misses_while_rooms_are_still_being_created(service, make_pool):
+    service.gate.clear()
+    pool = make_pool(size=2)
+    pool.start()
+    wait_for(lambda: service.create_calls == 2)
+
+    assert pool.acquire() is None
+    stats = pool.stats()
+    assert stats["misses"] == 1 and stats["hit_rate"] == 0.0
+    assert stats["creating"] == 2
+
+    # The miss must not queue rooms beyond the target while creation is in flight
+    service.gate.set()
+    wait_for(lambda: pool.stats()["ready"] == 2)
+    assert service.create_calls == 2
+    assert pool.acquire() is not None
+
+
+def test_acquire_skips_and_deletes_expired_rooms(service, clock, make_pool):
+    pool = make_pool(size=2, ttl_seconds=60.0)
+    pool.start()
+    wait_for(lambda: pool.stats()["ready"] == 2)
+    expired = {room.name for room in pool._ready}
+
+    clock.now += 61
+    assert pool.acquire() is None
+    wait_for(lambda: expired <= set(service.deleted))
+    wait_for(lambda: pool.stats()["ready"] == 2)
+
+    stats = pool.stats()
+    assert stats["reaped"] == 2 and stats["misses"] == 1
+    fresh = pool.acquire()
+    assert fresh is not None and fresh not in expired
+
+
+def test_reaper_replaces_rooms_past_the_ttl(service, clock, make_pool):
+    # The reaper wakes every max(1s, ttl / 4)
+    pool = make_pool(size=1, ttl_seconds=4.0)
+    pool.start()
+    wait_for(lambda: pool.stats()["ready"] == 1)
+    (expired,) = [room.name for room in pool._ready]
+
+    clock.now += 5
+    wait_for(lambda: expired in service.deleted)
+    wait_for(lambda: pool.stats()["ready"] == 1)
+
+    assert pool.stats()["reaped"] == 1
+    assert pool._ready[0].name != expired
+    assert service.rooms == {pool._ready[0].name}
+
+
+def test_failed_creates_are_counted_and_retried_later(service, make_pool):
+    service.fail_creates = True
+    pool = make_pool(size=1)
+    pool.start()
+    wait_for(lambda: pool.stats()["create_failures"] == 1)
+
+    stats = pool.stats()
+    assert stats["ready"] == 0 and stats["creating"] == 0
+    # The retry is scheduled with a backoff instead of hammering the API
+    assert service.create_calls == 1
+
+
+def test_close_deletes_unused_rooms_and_stops_replenishing(service, make_pool):
+    pool = make_pool(size=2)
+    pool.start()
+    wait_for(lambda: pool.stats()["ready"] == 2)
+
+    pool.close()
+    assert service.rooms == set()
+    assert len(service.deleted) == 2
+
+    assert pool.acquire() is None
+    time.sleep(0.05)
+    assert service.create_calls == 2
@@ -0,0 +1,126 @@
+import pytest
+
+from agent.routing import MIN_SAMPLES, LLMRouter, ModelTier, RoutingStats, tiers_from_settings
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+TIERS = [
+    ModelTier("fast", "nano", 0.2, 150, input_cost=0.1, output_cost=0.4),
+    ModelTier("standard", "mini", 0.3, 300, input_cost=0.15, output_cost=0.6),
+    ModelTier("smart", "large", 0.3, 400, input_cost=0.4, output_cost=1.6),
+]
+STAGES = {"intro": "fast", "product_selection": "standard", "needs_assessment": "smart"}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def router(clock):
+    return LLMRouter(TIERS, STAGES, "standard", degrade_ttft_ms=1000, degrade_seconds=60, clock=clock)
+
+
+def slow_turns(router, stage, count=MIN_SAMPLES, ttft_ms=2000):
+    for _ in range(count):
+        router.record(router.choose(stage), ttft_ms)
+
+
+def test_stages_use_their_configured_tier(router):
+    assert router.choose("intro").tier.name == "fast"
+    assert router.choose("needs_assessment").tier.name == "smart"
+    assert router.choose("unmapped").tier.name == "standard"
+    assert not router.choose("needs_assessment").degraded
+
+
+def test_slow_tier_degrades_to_the_next_faster_one(router):
+    slow_turns(router, "needs_assessment", count=MIN_SAMPLES - 1)
+    assert router.choose("needs_assessment").tier.name == "smart"
+
+    slow_turns(router, "needs_assessment", count=1)
+    choice = router.choose("needs_assessment")
+    assert choice.tier.name == "standard" and choice.degraded
+    # Stages already on faster tiers are unaffected
+    assert router.choose("product_selection").tier.name == "standard"
+    assert router.report()[2]["degraded_for_s"] == 60
+
+
+def test_degraded_tiers_are_skipped_down_to_the_fastest(router):
+    slow_turns(router, "needs_assessment")
+    slow_turns(router, "product_selection")
+    assert router.choose("needs_assessment").tier.name == "fast"
+
+
+def test_fastest_tier_never_degrades(router):
+    slow_turns(router, "intro", count=MIN_SAMPLES * 2)
+    choice = router.choose("intro")
+    assert choice.tier.name == "fast" and not choice.degraded
+
+
+def test_tier_recovers_after_the_cool_down_and_is_re_measured(router, clock):
+    slow_turns(router, "needs_assessment")
+    clock.now += 59
+    assert router.choose("needs_assessment").tier.name == "standard"
+
+    clock.now += 1
+    choice = router.choose("needs_assessment")
+    assert choice.tier.name == "smart" and not choice.degraded
+    assert router.p95_ms("smart") == 0.0
+
+    # Fresh fast samples keep it in service; it takes MIN_SAMPLES slow ones to trip again
+    for _ in range(MIN_SAMPLES):
+        router.record(router.choose("needs_assessment"), 300)
+    assert router.choose("needs_assessment").tier.name == "smart"
+
+
+def test_record_accounts_cost_per_stage(router):
+    stats = RoutingStats()
+    router.record(router.choose("intro"), 200, prompt_tokens=1_000_000, completion_tokens=0, stats=stats)
+    router.record(router.choose("needs_assessment"), 400, prompt_tokens=0, completion_tokens=1_000_000, stats=stats)
+    assert stats.turns == 2
+    assert stats.cost_usd == pytest.approx(0.1 + 1.6)
+    assert stats.stages["intro"].tiers == {"fast": 1}
+    assert stats.stages["needs_assessment"].avg_ttft_ms == 400
+
+
+def test_turns_served_by_the_fallback_are_priced_at_its_model(router):
+    stats = RoutingStats()
+    # "large" is the smart tier's model, so its prices are known
+    router.record(router.choose("intro"), 200, prompt_tokens=1_000_000, stats=stats, fallback_model="large")
+    # An unlisted model can only be estimated at the routed tier's prices
+    router.record(router.choose("intro"), 200, prompt_tokens=1_000_000, stats=stats, fallback_model="other")
+    router.record(router.choose("intro"), 200, prompt_tokens=1_000_000, stats=stats)
+    assert stats.cost_usd == pytest.approx(0.4 + 0.1 + 0.1)
+    usage = stats.stages["intro"]
+    assert usage.fallback_turns == 2 and usage.tiers == {"fast": 3}
+    assert router.fallback_tier(router.tier("fast"), "large").max_tokens == 150
+
+
+def test_failed_turns_count_against_the_tier(router):
+    stats = RoutingStats()
+    for _ in range(MIN_SAMPLES):
+        router.record(router.choose("needs_assessment"), 6000, stats=stats, failed=True)
+    assert router.choose("needs_assessment").tier.name == "standard"
+    assert stats.stages["needs_assessment"].failed_turns == MIN_SAMPLES
+    assert "5 failed" in str(stats)
+
+
+def test_unknown_tiers_are_rejected():
+    with pytest.raises(ValueError, match="default"):
+        LLMRouter(TIERS, STAGES, "huge", 1000, 60)
+    with pytest.raises(ValueError, match="huge"):
+        LLMRouter(TIERS, {"intro": "huge"}, "fast", 1000, 60)
+
+
+def test_tiers_without_a_model_use_the_openai_model(settings):
+    tiers = {t.name: t for t in tiers_from_settings(settings.model_copy(update={"openai_model": "gpt-test"}))}
+    assert tiers["standard"].model == "gpt-test"
+    assert tiers["fast"].max_tokens == 150
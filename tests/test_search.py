@@ -0,0 +1,110 @@
+import asyncio
+import time
+
+import pytest
+
+from agent.catalog import Product
+from agent.search import HashingEmbedder, IvfIndex, ProductSearchIndex, parse_price_filter, sparse, synthetic_products
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("something warm under 4000 rupees", ("something warm", None, 4000)),
+    ("between 1k and 3000 rupees", ("", 1000, 3000)),
+    ("cozy hoodie between 3000 and 1000", ("cozy hoodie", 1000, 3000)),
+    ("hoodie over Rs. 2000", ("hoodie", 2000, None)),
+    ("jacket under 2.5k", ("jacket", None, 2500)),
+    ("a rain jacket", ("a rain jacket", None, None)),
+])
+def test_parse_price_filter(query, expected):
+    assert parse_price_filter(query) == expected
+
+
+def vectors(products):
+    embedder = HashingEmbedder(64)
+    return {p.sku: sparse(v) for p, v in zip(products, embedder.embed([p.name for p in products]))}
+
+
+def test_ivf_files_every_vector_and_finds_it_again():
+    found = vectors(synthetic_products(400))
+    ivf = IvfIndex(64, probes=2)
+    assert ivf.needs_training(400)
+    ivf.train(found)
+    assert not ivf.needs_training(1000) and ivf.needs_training(1601) and ivf.needs_training(99)
+    assert sum(len(keys) for keys in ivf._lists) == 400
+
+    sku, vector = next(iter(found.items()))
+    assert sku in ivf.candidates(ivf._dense(vector))
+    ivf.remove(sku)
+    assert sku not in ivf.candidates(ivf._dense(vector))
+
+
+class CountingEmbedder(HashingEmbedder):
+    def __init__(self, delay=0.0):
+        super().__init__(64)
+        self.delay = delay
+        self.embedded = 0
+
+    def embed(self, texts):
+        time.sleep(self.delay)
+        self.embedded += len(texts)
+        return super().embed(texts)
+
+
+def product(sku, name, description="Warm fleece lining", price=2000):
+    return Product(sku=sku, name=name, description=description, category="Hoodie", price=price)
+
+
+@pytest.fixture
+def index(settings, use_settings):
+    use_settings(settings)
+    return ProductSearchIndex(CountingEmbedder(), exact_threshold=1000)
+
+
+def test_incremental_sync_re_embeds_only_changed_text(index):
+    products = [product("A", "Stealth Hoodie"), product("B", "Urban Hoodie"), product("C", "Classic Hoodie")]
+    stats = index.sync(products, "v1")
+    assert (stats.added, index.embedder.embedded) == (3, 3)
+
+    changed = [
+        product("A", "Stealth Hoodie", price=5000),
+        product("B", "Urban Hoodie", description="Breathable cotton"),
+        product("D", "Midnight Hoodie"),
+    ]
+    stats = index.sync(changed, "v2")
+    assert (stats.added, stats.updated, stats.removed, stats.reused) == (1, 1, 1, 1)
+    assert index.embedder.embedded == 5 and len(index) == 3 and index.version == "v2"
+    # The reused entry still picks up its new price
+    hits = index.search("stealth hoodie over 4000").hits
+    assert [(h.product.sku, h.product.price) for h in hits] == [("A", 5000)]
+
+
+def test_search_tool_syncs_off_the_event_loop(index, monkeypatch):
+    from agent import tools
+
+    index.embedder.delay = 0.3
+
+    def changed_catalog():
+        index.sync([product("A", "Stealth Hoodie")], "v1")
+        return index
+
+    monkeypatch.setattr(tools, "get_search_index", changed_catalog)
+    search = tools.create_search_products_tool()
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        output = await search({"query": "warm hoodie"}, None)
+        task.cancel()
+        return output, ticks
+
+    output, ticks = asyncio.run(run())
+    assert "Stealth Hoodie" in output
+    # The loop kept running while the index re-embedded the catalog
+    assert ticks > 10
@@ -0,0 +1,183 @@
+import asyncio
+from typing import List
+
+import pytest
+
+from agent.streaming import SentenceChunker
+from agent.types import AgentPipeline, Transcript
+
+
+class StubSTT:
+    def __init__(self, partials: List[str], final: str):
+        self.partials = partials
+        self.final = final
+
+    async def transcribe(self, audio, sample_rate):
+        return self.final
+
+    async def transcribe_stream(self, audio, sample_rate):
+        async for _ in audio:
+            pass
+        for text in self.partials:
+            yield Transcript(text)
+        yield Transcript(self.final, is_final=True)
+
+
+class StubLLM:
+    def __init__(self, tokens: List[str], delay: float = 0.0):
+        self.tokens = tokens
+        self.delay = delay
+        self.finished = False
+        self.closed = False
+        self.prompts: List[str] = []
+
+    async def generate(self, prompt, history=None):
+        self.prompts.append(prompt)
+        return "".join(self.tokens)
+
+    async def generate_stream(self, prompt, history=None):
+        self.prompts.append(prompt)
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield token
+            self.finished = True
+        finally:
+            self.closed = True
+
+
+class StubTTS:
+    """Audio is the sentence itself; the first sentence is synthesized slowest."""
+
+    def __init__(self, delays: List[float]):
+        self.delays = delays
+        self.started: List[str] = []
+        self.cancelled: List[str] = []
+
+    async def synthesize(self, text, sample_rate):
+        return text.encode()
+
+    async def synthesize_stream(self, text, sample_rate):
+        index = len(self.started)
+        self.started.append(text)
+        try:
+            await asyncio.sleep(self.delays[index] if index < len(self.delays) else 0)
+            yield text.encode()
+        except asyncio.CancelledError:
+            self.cancelled.append(text)
+            raise
+
+
+async def audio_frames(n: int = 3):
+    for _ in range(n):
+        yield b"\0" * 320
+
+
+REPLY = ["Hello Ayesha, welcome back. ", "We have three hoodies today. ", "Which one would you like?"]
+
+
+def test_audio_in_sentence_order():
+    tts = StubTTS(delays=[0.1, 0.0, 0.0])
+    pipeline = AgentPipeline(StubSTT(["I want"], "I want a hoodie"), StubLLM(REPLY), tts)
+
+    async def run():
+        turn = pipeline.stream_audio(audio_frames())
+        return turn, [chunk async for chunk in turn]
+
+    turn, chunks = asyncio.run(run())
+    assert [c.decode() for c in chunks] == [s.strip() for s in REPLY]
+    assert turn.transcript == "I want a hoodie"
+    assert turn.reply == "".join(REPLY).strip()
+    assert turn.latency.stt_first_partial_ms is not None
+    assert turn.latency.response_ms is not None
+
+
+def test_first_audio_before_llm_finishes():
+    llm = StubLLM(REPLY, delay=0.05)
+    pipeline = AgentPipeline(StubSTT([], "hoodie"), llm, StubTTS(delays=[]))
+
+    async def run():
+        turn = pipeline.stream_audio(audio_frames())
+        async for _ in turn:
+            return llm.finished
+
+    assert asyncio.run(run()) is False
+
+
+def test_barge_in_stops_generation_and_synthesis():
+    llm = StubLLM(REPLY + ["More text. "] * 20, delay=0.02)
+    tts = StubTTS(delays=[0.0, 1.0, 1.0])
+    pipeline = AgentPipeline(StubSTT([], "hoodie"), llm, tts)
+
+    async def run():
+        turn = pipeline.stream_audio(audio_frames())
+        chunks = []
+        async for chunk in turn:
+            chunks.append(chunk)
+            await asyncio.sleep(0.05)
+            turn.cancel()
+        return turn, chunks
+
+    turn, chunks = asyncio.run(run())
+    assert len(chunks) == 1
+    assert turn.cancelled
+    assert not llm.finished and llm.closed
+    assert tts.cancelled
+
+
+def test_cancel_event_before_reply():
+    cancel = asyncio.Event()
+    llm = StubLLM(REPLY)
+    pipeline = AgentPipeline(StubSTT([], "hoodie"), llm, StubTTS(delays=[]))
+
+    async def run():
+        cancel.set()
+        return [chunk async for chunk in pipeline.stream_audio(audio_frames(), cancel=cancel)]
+
+    assert asyncio.run(run()) == []
+
+
+def test_one_shot_providers_fall_back():
+    class OneShotSTT:
+        async def transcribe(self, audio, sample_rate):
+            return f"{len(audio)} bytes"
+
+    class OneShotLLM:
+        async def generate(self, prompt, history=None):
+            return f"You said {prompt}."
+
+    class OneShotTTS:
+        async def synthesize(self, text, sample_rate):
+            return text.encode()
+
+    pipeline = AgentPipeline(OneShotSTT(), OneShotLLM(), OneShotTTS())
+
+    async def run():
+        return [chunk async for chunk in pipeline.stream_audio(audio_frames(2))]
+
+    assert asyncio.run(run()) == [b"You said 640 bytes."]
+
+
+def test_tts_error_propagates():
+    class FailingTTS(StubTTS):
+        async def synthesize_stream(self, text, sample_rate):
+            raise ConnectionError("tts down")
+            yield b""
+
+    pipeline = AgentPipeline(StubSTT([], "hoodie"), StubLLM(REPLY), FailingTTS(delays=[]))
+
+    async def run():
+        async for _ in pipeline.stream_audio(audio_frames()):
+            pass
+
+    with pytest.raises(ConnectionError, match="tts down"):
+        asyncio.run(run())
+
+
+def test_sentence_chunker():
+    chunker = SentenceChunker(min_chars=5, max_chars=40)
+    chunks = []
+    for token in ["Hi. ", "Great ", "choice! ", "Your order, ", "number one two three, ", "is confirmed"]:
+        chunks.extend(chunker.push(token))
+    chunks.append(chunker.flush())
+    assert chunks == ["Hi. Great choice!", "Your order, number one two three,", "is confirmed"]